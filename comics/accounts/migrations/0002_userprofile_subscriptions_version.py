@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+import comics.accounts.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='subscriptions_version',
+            field=models.CharField(
+                default=comics.accounts.models.make_version,
+                help_text=b'Replaced when the subscriptions change',
+                max_length=32, editable=False),
+            preserve_default=True,
+        ),
+    ]
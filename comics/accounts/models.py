@@ -4,6 +4,7 @@ from django.contrib.auth.models import User
 from django.db import models
 from django.dispatch import receiver
 
+from comics.accounts.subscriptions import invalidate_subscriptions
 from comics.core.models import Comic
 
 
@@ -17,11 +18,18 @@ def make_secret_key():
     return uuid.uuid4().hex
 
 
+def make_version():
+    return uuid.uuid4().hex
+
+
 class UserProfile(models.Model):
     user = models.OneToOneField(User, related_name='comics_profile')
     secret_key = models.CharField(
         max_length=32, blank=False, default=make_secret_key,
         help_text='Secret key for feed and API access')
+    subscriptions_version = models.CharField(
+        max_length=32, default=make_version, editable=False,
+        help_text='Replaced when the subscriptions change')
     comics = models.ManyToManyField(Comic, through='Subscription')
 
     class Meta:
@@ -45,3 +53,9 @@ class Subscription(models.Model):
     def __unicode__(self):
         return u'Subscription for %s to %s' % (
             self.userprofile.user.email, self.comic.slug)
+
+
+@receiver(models.signals.post_save, sender=Subscription)
+@receiver(models.signals.post_delete, sender=Subscription)
+def invalidate_user_subscriptions(sender, instance, **kwargs):
+    invalidate_subscriptions(instance.userprofile_id)
@@ -0,0 +1,41 @@
+"""Cached ids of the comics each user is subscribed to
+
+The ids are cached under a version stored in the user's profile, which is
+replaced when a subscription is saved or deleted. As the version is read from
+the database, every process sees changes at once, whichever cache backend is
+used.
+"""
+
+from django.core.cache import cache
+
+from comics.core.registry import comic_registry
+
+IDS_KEY = 'comics.accounts.subscriptions.ids.%d.%s'
+
+
+def get_subscribed_comic_ids(user):
+    from comics.accounts.models import Subscription, UserProfile
+    versions = UserProfile.objects.filter(user_id=user.id).values_list(
+        'subscriptions_version', flat=True)
+    if not versions:
+        return []
+    ids_key = IDS_KEY % (user.id, versions[0])
+    comic_ids = cache.get(ids_key)
+    if comic_ids is None:
+        comic_ids = sorted(Subscription.objects.filter(
+            userprofile__user_id=user.id).values_list('comic_id', flat=True))
+        cache.set(ids_key, comic_ids)
+    return comic_ids
+
+
+def get_subscribed_comics(user):
+    """The comics the user is subscribed to, sorted by name"""
+
+    comic_ids = set(get_subscribed_comic_ids(user))
+    return [comic for comic in comic_registry.all() if comic.id in comic_ids]
+
+
+def invalidate_subscriptions(userprofile_id):
+    from comics.accounts.models import UserProfile, make_version
+    UserProfile.objects.filter(pk=userprofile_id).update(
+        subscriptions_version=make_version())
@@ -1,6 +1,13 @@
 from django.contrib.auth.models import User
+from django.db import connection
 from django.test.client import Client
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from comics.accounts.models import Subscription, UserProfile
+from comics.accounts.subscriptions import (
+    get_subscribed_comic_ids, get_subscribed_comics)
+from comics.core.models import Comic
 
 
 def create_user():
@@ -42,3 +49,69 @@ class LoginTest(TestCase):
         self.assertEquals(response.status_code, 200)
         self.assertIn(
             'Please enter a correct username and password.', response.content)
+
+
+class SubscriptionsTest(TestCase):
+    def setUp(self):
+        self.user = create_user()
+        self.xkcd = Comic.objects.create(slug='xkcd', name='xkcd')
+        self.geekandpoke = Comic.objects.create(
+            slug='geekandpoke', name='Geek and Poke')
+        self.client = Client()
+        self.client.login(username='alice', password='secret')
+
+    def test_subscribed_comic_ids_are_cached(self):
+        Subscription.objects.create(
+            userprofile=self.user.comics_profile, comic=self.xkcd)
+        get_subscribed_comic_ids(self.user)
+
+        # Only the version is read from the user's profile
+        with self.assertNumQueries(1):
+            self.assertEquals(
+                get_subscribed_comic_ids(self.user), [self.xkcd.id])
+
+    def test_subscribed_comic_ids_follow_the_version_in_the_database(self):
+        get_subscribed_comic_ids(self.user)
+        # As if the subscription was made by another process, with another
+        # cache, the signal is not sent
+        Subscription.objects.bulk_create([Subscription(
+            userprofile=self.user.comics_profile, comic=self.xkcd)])
+        UserProfile.objects.filter(user=self.user).update(
+            subscriptions_version='changed')
+
+        self.assertEquals(get_subscribed_comic_ids(self.user), [self.xkcd.id])
+
+    def test_deleting_subscriptions_reads_no_users(self):
+        Subscription.objects.create(
+            userprofile=self.user.comics_profile, comic=self.xkcd)
+        Subscription.objects.create(
+            userprofile=self.user.comics_profile, comic=self.geekandpoke)
+
+        with CaptureQueriesContext(connection) as queries:
+            Subscription.objects.filter(
+                userprofile=self.user.comics_profile).delete()
+
+        for query in queries.captured_queries:
+            self.assertNotIn('FROM "comics_user_profile" ', query['sql'])
+        self.assertEquals(get_subscribed_comic_ids(self.user), [])
+
+    def test_toggling_a_comic_changes_the_subscribed_comics(self):
+        self.assertEquals(get_subscribed_comics(self.user), [])
+
+        self.client.post(
+            '/account/toggle-comic/',
+            {'comic': 'geekandpoke', 'add_comic': '1'})
+        self.assertEquals(
+            get_subscribed_comics(self.user), [self.geekandpoke])
+
+        self.client.post(
+            '/account/toggle-comic/',
+            {'comic': 'geekandpoke', 'remove_comic': '1'})
+        self.assertEquals(get_subscribed_comics(self.user), [])
+
+    def test_my_comics_without_subscriptions_is_empty(self):
+        for url in ('/my/', '/my/today/'):
+            response = self.client.get(url)
+
+            self.assertEquals(response.status_code, 200)
+            self.assertEquals(len(response.context['object_list']), 0)
@@ -1,11 +1,13 @@
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.core.urlresolvers import reverse
-from django.http import HttpResponse, HttpResponseRedirect
-from django.shortcuts import get_object_or_404, render
+from django.http import Http404, HttpResponse, HttpResponseRedirect
+from django.shortcuts import render
 
 from comics.accounts.models import Subscription
-from comics.core.models import Comic
+from comics.accounts.subscriptions import (
+    get_subscribed_comic_ids, get_subscribed_comics)
+from comics.core.registry import comic_registry
 from comics.sets.models import Set
 
 
@@ -47,7 +49,9 @@ def mycomics_toggle_comic(request):
         response['Allowed'] = 'POST'
         return response
 
-    comic = get_object_or_404(Comic, slug=request.POST['comic'])
+    comic = comic_registry.get_by_slug(request.POST['comic'])
+    if comic is None:
+        raise Http404
 
     if 'add_comic' in request.POST:
         subscription = Subscription(
@@ -77,7 +81,7 @@ def mycomics_edit_comics(request):
         response['Allowed'] = 'POST'
         return response
 
-    my_comics = request.user.comics_profile.comics.all()
+    my_comics = get_subscribed_comics(request.user)
 
     for comic in my_comics:
         if comic.slug not in request.POST:
@@ -88,7 +92,7 @@ def mycomics_edit_comics(request):
                 messages.info(
                     request, 'Removed "%s" from my comics' % comic.name)
 
-    for comic in Comic.objects.all():
+    for comic in comic_registry.all():
         if comic.slug in request.POST and comic not in my_comics:
             subscription = Subscription(
                 userprofile=request.user.comics_profile, comic=comic)
@@ -117,12 +121,12 @@ def mycomics_import_named_set(request):
                 'No comic set named "%s" found.' % request.POST['namedset'])
             return HttpResponseRedirect(reverse('import_named_set'))
 
-        count_before = len(request.user.comics_profile.comics.all())
+        count_before = len(get_subscribed_comic_ids(request.user))
         for comic in named_set.comics.all():
             Subscription.objects.get_or_create(
                 userprofile=request.user.comics_profile,
                 comic=comic)
-        count_after = len(request.user.comics_profile.comics.all())
+        count_after = len(get_subscribed_comic_ids(request.user))
         count_added = count_after - count_before
         messages.info(
             request,
@@ -0,0 +1,55 @@
+from django.contrib import admin
+
+from comics.aggregator import models
+
+
+@admin.register(models.CrawlJob)
+class CrawlJobAdmin(admin.ModelAdmin):
+    list_display = (
+        '__unicode__', 'comic', 'pub_date', 'state', 'attempts', 'worker',
+        'lease_expires', 'not_before')
+    list_filter = ['state', 'comic']
+    date_hierarchy = 'pub_date'
+    readonly_fields = (
+        'comic', 'pub_date', 'attempts', 'lease_expires', 'not_before',
+        'worker', 'error', 'created')
+
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(models.ImageSource)
+class ImageSourceAdmin(admin.ModelAdmin):
+    list_display = ('url', 'comic', 'checksum', 'etag', 'last_fetched')
+    list_filter = ['comic']
+    search_fields = ['url', 'checksum']
+    readonly_fields = (
+        'comic', 'url', 'url_hash', 'checksum', 'etag', 'last_modified',
+        'content_length', 'last_fetched')
+
+    def has_add_permission(self, request):
+        return False
+
+
+class CrawlFailureInline(admin.TabularInline):
+    model = models.CrawlFailure
+    extra = 0
+    readonly_fields = ('pub_date', 'error')
+
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(models.CrawlProgress)
+class CrawlProgressAdmin(admin.ModelAdmin):
+    list_display = (
+        '__unicode__', 'comic', 'from_date', 'to_date', 'last_pub_date',
+        'finished', 'updated')
+    list_filter = ['finished', 'comic']
+    readonly_fields = (
+        'comic', 'from_date', 'to_date', 'last_pub_date', 'finished',
+        'started', 'updated')
+    inlines = [CrawlFailureInline]
+
+    def has_add_permission(self, request):
+        return False
@@ -1,16 +1,35 @@
 """Aggregator which fetches comic releases from the web"""
 
+import collections
 import datetime
 import logging
 import socket
+import threading
+import time
+from multiprocessing.pool import ThreadPool
 
-from comics.aggregator.downloader import ReleaseDownloader
+from django.conf import settings
+from django.db import connection
+
+from comics.aggregator.downloader import ImagePrefetcher, ReleaseDownloader
+from comics.aggregator.exceptions import (
+    ImageAlreadyExists, NotHistoryCapable, ReleaseAlreadyExists)
+from comics.aggregator.hosts import circuit_breaker
+from comics.aggregator.httpclient import http_client
+from comics.aggregator.models import CrawlProgress
+from comics.aggregator.planner import CrawlPlan
+from comics.aggregator.progress import ProgressTracker
 from comics.core.exceptions import ComicsError
 from comics.comics import get_comic_module
 
 logger = logging.getLogger('comics.aggregator.command')
 socket.setdefaulttimeout(10)
 
+# Errors which mean there is nothing to crawl for a date, and thus are not
+# failures to crawl again when resuming
+NOTHING_TO_DO_ERRORS = (
+    ReleaseAlreadyExists, NotHistoryCapable, ImageAlreadyExists)
+
 
 def log_errors(func):
     def inner(*args, **kwargs):
@@ -18,8 +37,10 @@ def log_errors(func):
             return func(*args, **kwargs)
         except ComicsError, error:
             logger.info(error)
+            args[0].record_error(error)
         except Exception, error:
             logger.exception(u'%s: %s', args[0].identifier, error)
+            args[0].record_error(error)
     return inner
 
 
@@ -30,33 +51,316 @@ class Aggregator(object):
         else:
             assert isinstance(config, AggregatorConfig)
             self.config = config
+        self._local = threading.local()
+        self._pool = None
+        self._pool_result = None
+        self._prefetcher = None
+        self._crawl_prefetcher = None
+        # Time when the run must stop crawling, if any
+        self._deadline = None
+        self._stopped = threading.Event()
+        # Counts for the summary logged when crawling completes
+        self.stats = collections.Counter()
+        self._stats_lock = threading.Lock()
+
+    @property
+    def identifier(self):
+        # Used by log_errors(), and thus kept per thread when aggregating
+        # multiple comics concurrently
+        return getattr(self._local, 'identifier', None)
+
+    @identifier.setter
+    def identifier(self, value):
+        self._local.identifier = value
+
+    def record_error(self, error):
+        # Called by log_errors(), to save failed dates of a date range
+        progress = getattr(self._local, 'progress', None)
+        pub_date = getattr(self._local, 'pub_date', None)
+        if (progress is not None and pub_date is not None and
+                not isinstance(error, NOTHING_TO_DO_ERRORS)):
+            # Failing to save the date must not stop crawling the others
+            try:
+                progress.fail(pub_date, unicode(error))
+            except Exception, save_error:
+                logger.exception(
+                    u'%s: Failed to save the failed date: %s',
+                    self.identifier, save_error)
 
     def start(self):
         start_time = datetime.datetime.now()
-        for comic in self.config.comics:
-            self.identifier = comic.slug
-            self._aggregate_one_comic(comic)
+        if self.config.deadline is not None:
+            self._deadline = time.time() + self.config.deadline
+        circuit_breaker.reset()
+        self.aggregate(self.config.comics)
+        if self._prefetcher is not None:
+            self._prefetcher.close()
+            self._prefetcher = None
+        if self._crawl_prefetcher is not None:
+            self._crawl_prefetcher.close()
+            self._crawl_prefetcher = None
+        self.prune_http_cache()
         ellapsed_time = datetime.datetime.now() - start_time
-        logger.info('Crawling completed in %s', ellapsed_time)
+        logger.info(
+            'Crawling completed in %s, skipped %d dates already crawled '
+            'and %d dates not in the schedule', ellapsed_time,
+            self.stats['dates_skipped'], self.stats['dates_unscheduled'])
+        if self.stats['comics_out_of_time']:
+            logger.warning(
+                'Crawling of %d comics was stopped because it ran out of '
+                'time', self.stats['comics_out_of_time'])
+
+    def aggregate(self, comics):
+        if (self._prefetcher is None and
+                settings.COMICS_IMAGE_PREFETCH_THREADS > 0):
+            self._prefetcher = ImagePrefetcher(
+                settings.COMICS_IMAGE_PREFETCH_THREADS)
+        if (self._crawl_prefetcher is None and
+                settings.COMICS_CRAWLER_PREFETCH_DATES > 0):
+            self._crawl_prefetcher = ThreadPool(
+                settings.COMICS_CRAWLER_PREFETCH_DATES)
+        if self.config.workers > 1:
+            self._aggregate_concurrently(comics)
+        else:
+            for comic in comics:
+                self.identifier = comic.slug
+                self._aggregate_one_comic(comic)
 
     def stop(self):
-        pass
+        self._stopped.set()
+        if self._pool is not None:
+            # The workers stop after the date they are crawling, and save the
+            # progress of their crawls, which is lost if the command exits
+            # before they are done. The prefetchers are still needed until
+            # then, to finish the downloads the workers wait for.
+            logger.info('Waiting for the workers to stop')
+            self._wait_for_workers()
+        if self._prefetcher is not None:
+            self._prefetcher.terminate()
+            self._prefetcher = None
+        if self._crawl_prefetcher is not None:
+            self._crawl_prefetcher.terminate()
+            self._crawl_prefetcher = None
+
+    def _aggregate_concurrently(self, comics):
+        logger.debug('Crawling with %d workers', self.config.workers)
+        self._pool = ThreadPool(self.config.workers)
+        self._pool_result = self._pool.map_async(
+            self._aggregate_one_comic_in_worker, comics, chunksize=1)
+        self._wait_for_workers().get()
+
+    def _wait_for_workers(self):
+        # Waiting with a timeout keeps the main thread responsive to
+        # KeyboardInterrupt, which makes the command call stop()
+        result = self._pool_result
+        while not result.ready():
+            result.wait(1)
+        self._pool.close()
+        self._pool.join()
+        self._pool = None
+        self._pool_result = None
+        return result
+
+    def _add_stats(self, **counts):
+        with self._stats_lock:
+            self.stats.update(counts)
+
+    def prune_http_cache(self):
+        try:
+            num_removed = http_client.prune_cache()
+            logger.debug('Removed %d unused HTTP cache entries', num_removed)
+        except EnvironmentError as error:
+            logger.warning('Failed to prune HTTP cache: %s', error)
+
+    def _aggregate_one_comic_in_worker(self, comic):
+        self.identifier = comic.slug
+        try:
+            self._aggregate_one_comic(comic)
+        finally:
+            # Each worker thread gets its own database connection
+            connection.close()
 
     @log_errors
     def _aggregate_one_comic(self, comic):
         crawler = self._get_crawler(comic)
-        from_date = self._get_valid_date(crawler, self.config.from_date)
-        to_date = self._get_valid_date(crawler, self.config.to_date)
+        resumed_progress = None
+        if self.config.resume:
+            resumed_progress = CrawlProgress.objects.get_unfinished(comic)
+            if resumed_progress is None:
+                logger.debug('%s: No crawl to resume', comic.slug)
+                return
+        from_date, to_date = self._get_date_range(crawler, resumed_progress)
         if from_date != to_date:
             logger.info(
                 '%s: Crawling from %s to %s', comic.slug, from_date, to_date)
-        pub_date = from_date
-        while pub_date <= to_date:
-            self.identifier = u'%s/%s' % (comic.slug, pub_date)
-            crawler_release = self._crawl_one_comic_one_date(crawler, pub_date)
-            if crawler_release:
-                self._download_release(crawler_release)
-            pub_date += datetime.timedelta(days=1)
+        plan = self._get_crawl_plan(crawler, from_date, to_date)
+        if len(plan) > 1:
+            self._crawl_range(crawler, plan)
+        progress = self._get_progress_tracker(
+            comic, from_date, to_date, plan, resumed_progress)
+        self._local.progress = progress
+        # Images are downloaded in the background while the following dates
+        # are crawled, and saved in order as they complete
+        in_flight = collections.deque()
+        max_in_flight = 0
+        if self._prefetcher is not None:
+            max_in_flight = settings.COMICS_IMAGE_PREFETCH_THREADS
+        stop_time = self._get_stop_time(crawler)
+        finished = False
+        last_date = None
+        try:
+            for pub_date in self._prefetch_ahead(crawler, plan):
+                self.identifier = u'%s/%s' % (comic.slug, pub_date)
+                if self._stopped.is_set():
+                    logger.info('%s: Stopped crawling', self.identifier)
+                    break
+                if stop_time is not None and time.time() > stop_time:
+                    logger.warning(
+                        '%s: Out of time, stopped crawling', self.identifier)
+                    self._add_stats(comics_out_of_time=1)
+                    break
+                self._local.pub_date = pub_date
+                crawler_release = self._crawl_one_comic_one_date(
+                    crawler, pub_date)
+                if crawler_release:
+                    in_flight.append(self._prefetch_release(crawler_release))
+                while len(in_flight) > max_in_flight:
+                    self._download_release(*in_flight.popleft())
+                last_date = pub_date
+                if progress is not None:
+                    progress.date_done()
+                    progress.advance(self._get_checkpoint(pub_date, in_flight))
+            else:
+                finished = True
+            while in_flight:
+                self._download_release(*in_flight.popleft())
+            if progress is not None and last_date is not None:
+                progress.advance(last_date)
+        finally:
+            self._local.pub_date = None
+            self._local.progress = None
+            if progress is not None:
+                # Also when interrupted, so that the crawl can be resumed
+                progress.save(finished=finished)
+                logger.info('%s: %s', comic.slug, progress.get_report())
+        self._add_stats(
+            dates_skipped=plan.num_existing,
+            dates_unscheduled=plan.num_unscheduled)
+        if plan.num_existing or plan.num_unscheduled:
+            logger.debug(
+                '%s: Skipped %d dates already crawled and %d dates not in '
+                'the schedule', comic.slug, plan.num_existing,
+                plan.num_unscheduled)
+        logger.debug(
+            '%s: Page cache had %d hits and %d misses', comic.slug,
+            crawler.pages.hits, crawler.pages.misses)
+
+    def _get_progress_tracker(
+            self, comic, from_date, to_date, plan, resumed_progress=None):
+        # Only crawls of a date range are worth resuming
+        if resumed_progress is not None:
+            return ProgressTracker.resume(resumed_progress, len(plan))
+        if from_date == to_date or self.config.daemon:
+            return None
+        return ProgressTracker.start(comic, from_date, to_date, len(plan))
+
+    def _get_checkpoint(self, pub_date, in_flight):
+        # Releases are saved in date order, so all dates before the oldest
+        # release still being downloaded are done
+        if in_flight:
+            crawler_release = in_flight[0][0]
+            return crawler_release.pub_date - datetime.timedelta(days=1)
+        return pub_date
+
+    @log_errors
+    def _crawl_range(self, crawler, plan):
+        # Crawlers which support it crawl all the dates in one pass. If this
+        # fails, each date is crawled on its own.
+        first_date, last_date = plan.pub_dates[0], plan.pub_dates[-1]
+        if crawler.prepare_range(first_date, last_date):
+            logger.debug(
+                '%s: Crawled from %s to %s in one pass', crawler.comic.slug,
+                first_date, last_date)
+
+    def _prefetch_ahead(self, crawler, pub_dates):
+        # Yields the dates to crawl, while the crawler prefetches what it
+        # needs for the following dates in the background
+        pending = collections.deque()
+        for pub_date in pub_dates:
+            if self._crawl_prefetcher is None:
+                pending.append((pub_date, None))
+            else:
+                pending.append((pub_date, self._crawl_prefetcher.apply_async(
+                    self._prefetch_one_date, (crawler, pub_date))))
+            if len(pending) > settings.COMICS_CRAWLER_PREFETCH_DATES:
+                yield self._wait_for_prefetch(*pending.popleft())
+        while pending:
+            yield self._wait_for_prefetch(*pending.popleft())
+
+    def _wait_for_prefetch(self, pub_date, result):
+        # Stop waiting if stop() terminates the prefetching
+        while (result is not None and not result.ready() and
+                self._crawl_prefetcher is not None):
+            result.wait(1)
+        return pub_date
+
+    def _prefetch_one_date(self, crawler, pub_date):
+        try:
+            crawler.prefetch(pub_date)
+        except Exception as error:
+            logger.debug(
+                '%s/%s: Prefetch failed: %s', crawler.comic.slug, pub_date,
+                error)
+
+    def _get_stop_time(self, crawler):
+        # The run-wide deadline or the crawler's time budget, if any
+        stop_times = []
+        if self._deadline is not None:
+            stop_times.append(self._deadline)
+        time_budget = crawler.time_budget
+        if time_budget is None:
+            time_budget = settings.COMICS_CRAWLER_TIME_BUDGET
+        if time_budget is not None:
+            stop_times.append(time.time() + time_budget)
+        if stop_times:
+            return min(stop_times)
+
+    def _get_date_range(self, crawler, resumed_progress=None):
+        from_date = self.config.from_date
+        to_date = self.config.to_date
+        if resumed_progress is not None:
+            from_date = resumed_progress.get_resume_date()
+            to_date = resumed_progress.to_date
+        elif self.config.fill_gaps and from_date is None:
+            from_date = self._get_latest_pub_date(crawler.comic)
+        return (
+            self._get_valid_date(crawler, from_date),
+            self._get_valid_date(crawler, to_date))
+
+    def _get_crawl_plan(self, crawler, from_date, to_date):
+        existing_pub_dates = None
+        if self.config.fill_gaps or not crawler.multiple_releases_per_day:
+            existing_pub_dates = self._get_existing_pub_dates(
+                crawler.comic, from_date, to_date)
+        if not crawler.multiple_releases_per_day:
+            crawler.existing_pub_dates = existing_pub_dates
+        schedule = None
+        if self.config.fill_gaps:
+            schedule = crawler.schedule
+        return CrawlPlan(from_date, to_date, existing_pub_dates, schedule)
+
+    def _get_latest_pub_date(self, comic):
+        # Filling gaps defaults to catching up since the latest release
+        try:
+            return comic.release_set.latest().pub_date
+        except comic.release_set.model.DoesNotExist:
+            return None
+
+    def _get_existing_pub_dates(self, comic, from_date, to_date):
+        # One query for the whole date range instead of one per date
+        return set(comic.release_set.filter(
+            pub_date__range=(from_date, to_date)).values_list(
+            'pub_date', flat=True))
 
     @log_errors
     def _crawl_one_comic_one_date(self, crawler, pub_date):
@@ -70,11 +374,26 @@ class Aggregator(object):
                 logger.debug('Image text: %s', image.text)
         return crawler_release
 
+    def _prefetch_release(self, crawler_release):
+        if self._prefetcher is None:
+            return crawler_release, None
+        logger.debug('Prefetching %s', crawler_release.identifier)
+        return crawler_release, self._prefetcher.prefetch(crawler_release)
+
+    def _download_release(self, crawler_release, prefetched_release=None):
+        self.identifier = crawler_release.identifier
+        self._local.pub_date = crawler_release.pub_date
+        self._download_one_release(crawler_release, prefetched_release)
+
     @log_errors
-    def _download_release(self, crawler_release):
+    def _download_one_release(self, crawler_release, prefetched_release):
         logger.debug('Downloading %s', crawler_release.identifier)
         downloader = self._get_downloader()
-        downloader.download(crawler_release)
+        if prefetched_release is None:
+            downloader.download(crawler_release)
+        else:
+            downloader.download(
+                crawler_release, prefetched_release.get_fetched_images())
         logger.info('%s: Release saved', crawler_release.identifier)
 
     def _get_downloader(self):
@@ -110,6 +429,11 @@ class AggregatorConfig(object):
         self.comics = []
         self.from_date = None
         self.to_date = None
+        self.workers = 1
+        self.fill_gaps = False
+        self.daemon = False
+        self.deadline = None
+        self.resume = False
         if options is not None:
             self.setup(options)
 
@@ -118,6 +442,11 @@ class AggregatorConfig(object):
         self.set_date_interval(
             options.get('from_date', None),
             options.get('to_date', None))
+        self.set_workers(options.get('workers', None))
+        self.set_fill_gaps(options.get('fill_gaps', None))
+        self.set_daemon(options.get('daemon', None))
+        self.set_deadline(options.get('deadline', None))
+        self.set_resume(options.get('resume', None))
 
     def set_comics_to_crawl(self, comic_slugs):
         from comics.core.models import Comic
@@ -141,6 +470,52 @@ class AggregatorConfig(object):
             raise ComicsError(error_msg)
         return comic
 
+    def set_workers(self, workers):
+        if workers is not None:
+            self.workers = int(workers)
+        if self.workers < 1:
+            error_msg = 'Number of workers (%d) must be at least 1' % (
+                self.workers)
+            logger.error(error_msg)
+            raise ComicsError(error_msg)
+        logger.debug('Workers: %d', self.workers)
+
+    def set_fill_gaps(self, fill_gaps):
+        self.fill_gaps = bool(fill_gaps)
+        logger.debug('Fill gaps: %s', self.fill_gaps)
+
+    def set_daemon(self, daemon):
+        self.daemon = bool(daemon)
+        if self.daemon and (self.from_date or self.to_date):
+            error_msg = 'Dates can not be given when running as a daemon'
+            logger.error(error_msg)
+            raise ComicsError(error_msg)
+        logger.debug('Daemon: %s', self.daemon)
+
+    def set_deadline(self, deadline):
+        if deadline is not None:
+            self.deadline = int(deadline)
+            if self.deadline < 1:
+                error_msg = 'Deadline (%d seconds) must be at least 1' % (
+                    self.deadline)
+                logger.error(error_msg)
+                raise ComicsError(error_msg)
+            if self.daemon:
+                error_msg = (
+                    'A deadline can not be given when running as a daemon')
+                logger.error(error_msg)
+                raise ComicsError(error_msg)
+        logger.debug('Deadline: %s seconds', self.deadline)
+
+    def set_resume(self, resume):
+        self.resume = bool(resume)
+        if self.resume and (self.from_date or self.to_date or self.daemon):
+            error_msg = (
+                'Dates can not be given, nor run as a daemon, when resuming')
+            logger.error(error_msg)
+            raise ComicsError(error_msg)
+        logger.debug('Resume: %s', self.resume)
+
     def set_date_interval(self, from_date, to_date):
         self._set_from_date(from_date)
         self._set_to_date(to_date)
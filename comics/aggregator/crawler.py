@@ -1,8 +1,5 @@
 import datetime
-import httplib
-import socket
 import time
-import urllib2
 import xml.sax._exceptions
 
 import pytz
@@ -13,7 +10,10 @@ from comics.aggregator.exceptions import (
     CrawlerHTTPError, ImageURLNotFound, NotHistoryCapable,
     ReleaseAlreadyExists)
 from comics.aggregator.feedparser import FeedParser
+from comics.aggregator.httpclient import HttpClientError, http_client
 from comics.aggregator.lxmlparser import LxmlParser
+from comics.aggregator.models import ImageSource
+from comics.aggregator.pagecache import PageCache
 
 # For testability
 now = timezone.now
@@ -71,6 +71,9 @@ class CrawlerBase(object):
     time_zone = 'UTC'
     # Whether to allow multiple releases per day
     multiple_releases_per_day = False
+    # Max number of seconds to spend crawling in one run, if not the default
+    # COMICS_CRAWLER_TIME_BUDGET
+    time_budget = None
 
     ### Downloader settings
     # Whether the comic reruns old images as new releases
@@ -83,11 +86,17 @@ class CrawlerBase(object):
     # Feed object which is reused when crawling multiple dates
     feed = None
 
-    # Page objects mapped against URL for use when crawling multiple dates
-    pages = {}
-
     def __init__(self, comic):
         self.comic = comic
+        # Page objects mapped against URL for use when crawling multiple dates
+        self.pages = PageCache()
+        # Set of dates known to have a release, set by the aggregator when
+        # crawling a date range to avoid a query per date
+        self.existing_pub_dates = None
+        # Results of crawl_range() mapped against date, and the first and last
+        # date they cover
+        self._range_results = None
+        self._range = None
 
     def get_crawler_release(self, pub_date=None):
         """Get meta data for release at pub_date, or the latest release"""
@@ -97,15 +106,9 @@ class CrawlerBase(object):
             self.comic, pub_date, has_rerun_releases=self.has_rerun_releases)
 
         try:
-            results = self.crawl(pub_date)
-        except urllib2.HTTPError as error:
-            raise CrawlerHTTPError(release.identifier, error.code)
-        except urllib2.URLError as error:
-            raise CrawlerHTTPError(release.identifier, error.reason)
-        except httplib.BadStatusLine:
-            raise CrawlerHTTPError(release.identifier, 'BadStatusLine')
-        except socket.error as error:
-            raise CrawlerHTTPError(release.identifier, error)
+            results = self._get_results(pub_date)
+        except HttpClientError as error:
+            raise CrawlerHTTPError(release.identifier, error.value)
         except xml.sax._exceptions.SAXException as error:
             raise CrawlerHTTPError(release.identifier, str(error))
 
@@ -122,6 +125,38 @@ class CrawlerBase(object):
 
         return release
 
+    def prepare_range(self, from_date, to_date):
+        """Crawl a date range in one pass, if the crawler supports it
+
+        Returns whether crawl_range() was used. If so, get_crawler_release()
+        uses its results for the dates in the range instead of calling
+        crawl() for each of them.
+        """
+
+        identifier = u'%s/%s..%s' % (self.comic.slug, from_date, to_date)
+        self._range_results = None
+        try:
+            results = self.crawl_range(from_date, to_date)
+            if results is None:
+                return False
+            range_results = {}
+            for pub_date, result in results:
+                if from_date <= pub_date <= to_date:
+                    range_results.setdefault(pub_date, result)
+        except HttpClientError as error:
+            raise CrawlerHTTPError(identifier, error.value)
+        except xml.sax._exceptions.SAXException as error:
+            raise CrawlerHTTPError(identifier, str(error))
+        self._range_results = range_results
+        self._range = (from_date, to_date)
+        return True
+
+    def _get_results(self, pub_date):
+        if (self._range_results is not None and
+                self._range[0] <= pub_date <= self._range[1]):
+            return self._range_results.get(pub_date)
+        return self.crawl(pub_date)
+
     def _get_date_to_crawl(self, pub_date):
         identifier = u'%s/%s' % (self.comic.slug, pub_date)
 
@@ -132,7 +167,12 @@ class CrawlerBase(object):
             raise NotHistoryCapable(identifier, self.history_capable)
 
         if self.multiple_releases_per_day is False:
-            if self.comic.release_set.filter(pub_date=pub_date).count() > 0:
+            if self.existing_pub_dates is not None:
+                release_exists = pub_date in self.existing_pub_dates
+            else:
+                release_exists = self.comic.release_set.filter(
+                    pub_date=pub_date).exists()
+            if release_exists:
                 raise ReleaseAlreadyExists(identifier)
 
         return pub_date
@@ -169,6 +209,33 @@ class CrawlerBase(object):
 
         raise NotImplementedError
 
+    def crawl_range(self, from_date, to_date):
+        """
+        May be overridden to crawl many dates from one fetch and parse
+
+        Input:
+            from_date -- a datetime.date object for the first date to crawl
+            to_date -- a datetime.date object for the last date to crawl
+
+        Output:
+            an iterable of (pub_date, result) pairs, where result is what
+            crawl() would return for pub_date. Dates without a pair get no
+            release. Return None to crawl each date with crawl() instead.
+        """
+
+        return None
+
+    def prefetch(self, pub_date):
+        """
+        May be overridden to fetch what crawl() needs ahead of time
+
+        Called by the aggregator from background threads for the next dates
+        it will crawl, and thus must not use the database. Errors are ignored,
+        so that crawl() gets the chance to report them.
+        """
+
+        pass
+
     ### Helpers for the crawl() implementations
 
     def parse_feed(self, feed_url):
@@ -177,9 +244,11 @@ class CrawlerBase(object):
         return self.feed
 
     def parse_page(self, page_url):
-        if page_url not in self.pages:
-            self.pages[page_url] = LxmlParser(page_url, headers=self.headers)
-        return self.pages[page_url]
+        page = self.pages.get(page_url)
+        if page is None:
+            page = LxmlParser(page_url, headers=self.headers)
+            self.pages.set(page_url, page)
+        return page
 
     def string_to_date(self, *args, **kwargs):
         return datetime.datetime.strptime(*args, **kwargs).date()
@@ -191,6 +260,102 @@ class CrawlerBase(object):
         return int(time.mktime(local_midnight.utctimetuple()))
 
 
+class TemplateCrawlerBase(CrawlerBase):
+    """Base crawler for comics with URLs given by the publication date
+
+    Instead of implementing crawl(), set either ``image_url`` to the URL of
+    the image, or ``page_url`` to the URL of a page and ``image_selector`` to
+    the CSS selector of the image on the page. The URLs are formatted with
+    ``pub_date.strftime()``. Images at ``image_url`` are probed with a HEAD
+    request, so that dates without an image give no release, unless the image
+    of the latest release was downloaded from ``image_url``.
+    """
+
+    ### Template settings
+    # URL of the image (example: "http://example.com/strips/%Y-%m-%d.png")
+    image_url = None
+    # URL of the page with the image (example: "http://example.com/%Y/%m/%d/")
+    page_url = None
+    # CSS selector for the image on the page (example: "img.strip")
+    image_selector = None
+
+    # Status codes of HEAD requests which tell there is no image
+    MISSING_CODES = (404, 410)
+    # Status codes of HEAD requests which tell the server doesn't support them
+    UNSUPPORTED_CODES = (405, 501)
+
+    def __init__(self, comic):
+        super(TemplateCrawlerBase, self).__init__(comic)
+        # Results of HEAD requests made by prefetch(), mapped against URL
+        self._probed_urls = {}
+        # Whether the image of the latest release was downloaded from
+        # image_url, looked up by the first call to crawl()
+        self._image_url_confirmed = None
+
+    def crawl(self, pub_date):
+        if self.image_url is None and (
+                self.page_url is None or self.image_selector is None):
+            raise NotImplementedError(
+                '%s must set image_url, or page_url and image_selector' %
+                type(self).__name__)
+        if self.image_url is not None:
+            url = pub_date.strftime(self.image_url)
+            if not self.is_image_url_confirmed() and (
+                    not self._probed_urls.pop(url, None)) and (
+                    not self.probe_image(url)):
+                return
+            return CrawlerImage(url)
+        page = self.parse_page(pub_date.strftime(self.page_url))
+        return CrawlerImage(page.src(self.image_selector))
+
+    def is_image_url_confirmed(self):
+        """Whether images are known to be at ``image_url``
+
+        If the image of the latest release was downloaded from ``image_url``,
+        images are fetched without probing them first, and a missing image
+        fails its download instead of giving no release.
+        """
+
+        if self._image_url_confirmed is None:
+            latest_pub_dates = self.comic.release_set.order_by(
+                '-pub_date').values_list('pub_date', flat=True)[:1]
+            self._image_url_confirmed = bool(latest_pub_dates) and (
+                ImageSource.objects.lookup(
+                    self.comic, latest_pub_dates[0].strftime(self.image_url))
+                is not None)
+        return self._image_url_confirmed
+
+    def prefetch(self, pub_date):
+        if self.image_url is not None:
+            if self._image_url_confirmed:
+                return
+            url = pub_date.strftime(self.image_url)
+            # Only existing images are remembered, so that crawl() repeats
+            # the request to report errors
+            if self.probe_image(url):
+                self._probed_urls[url] = True
+        else:
+            url = pub_date.strftime(self.page_url)
+            if url not in self.pages:
+                self.parse_page(url)
+
+    def probe_image(self, url):
+        """Whether the image at ``url`` exists, without downloading it"""
+
+        try:
+            response = http_client.open(url, self.headers, method='HEAD')
+            with response:
+                # Lets the connection be reused
+                response.read()
+            return True
+        except HttpClientError as error:
+            if error.value in self.MISSING_CODES:
+                return False
+            if error.value in self.UNSUPPORTED_CODES:
+                return True
+            raise
+
+
 class ArcaMaxCrawlerBase(CrawlerBase):
     """Base comic crawler for all comics hosted at arcamax.com"""
 
@@ -0,0 +1,188 @@
+"""Long-running aggregator which polls each comic around its release time"""
+
+import datetime
+import heapq
+import logging
+import threading
+
+import pytz
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+from comics.aggregator.hosts import circuit_breaker
+from comics.aggregator.imagehash import image_hash_index
+from comics.aggregator.planner import get_weekday
+from comics.aggregator.utils import parse_schedule
+from comics.comics import get_comic_module
+
+logger = logging.getLogger('comics.aggregator.daemon')
+
+# For testability
+now = timezone.now
+
+# Number of recent releases to learn the release window of a comic from
+HISTORY_SIZE = 30
+
+# Minimum number of releases needed to learn the release window of a comic
+MIN_HISTORY_SIZE = 5
+
+# Releases fetched this long after their publication date were crawled
+# later, e.g. by a backfill, and tell nothing about the release time
+MAX_RELEASE_DELAY = datetime.timedelta(days=2)
+
+# Added to both ends of a learned release window
+WINDOW_MARGIN = datetime.timedelta(minutes=30)
+
+# Max number of seconds to sleep at a time, so that stop() is noticed
+MAX_SLEEP = 60
+
+
+class ReleaseWindow(object):
+    """The time of day a comic's releases usually show up
+
+    The window is given as offsets from midnight at the publication date, in
+    the comic's time zone. It is learned from when earlier releases were
+    fetched, ignoring the earliest and latest tenth of them.
+    """
+
+    def __init__(self, start, end):
+        self.start = start
+        self.end = end
+
+    @classmethod
+    def learn(cls, releases, time_zone):
+        """Learn from ``(pub_date, fetched)`` pairs, or return None"""
+
+        tz = pytz.timezone(time_zone)
+        offsets = []
+        for pub_date, fetched in releases:
+            local_fetched = fetched.astimezone(tz).replace(tzinfo=None)
+            offset = local_fetched - datetime.datetime.combine(
+                pub_date, datetime.time())
+            if -datetime.timedelta(days=1) < offset < MAX_RELEASE_DELAY:
+                offsets.append(offset)
+        if len(offsets) < MIN_HISTORY_SIZE:
+            return None
+        offsets.sort()
+        return cls(
+            offsets[len(offsets) // 10] - WINDOW_MARGIN,
+            offsets[len(offsets) * 9 // 10] + WINDOW_MARGIN)
+
+    def get_times(self, pub_date, time_zone):
+        """The start and end of the window for ``pub_date`` as UTC times"""
+
+        tz = pytz.timezone(time_zone)
+        midnight = datetime.datetime.combine(pub_date, datetime.time())
+        return tuple(
+            tz.localize(midnight + offset).astimezone(pytz.utc)
+            for offset in (self.start, self.end))
+
+
+class AggregatorDaemon(object):
+    """Keeps polling comics with an aggregator until stopped
+
+    Each comic is kept in a queue ordered by when it should be polled next.
+    Comics are polled every ``COMICS_DAEMON_ACTIVE_INTERVAL`` seconds during
+    their release window, and otherwise at the start of the next window, but
+    at least every ``COMICS_DAEMON_IDLE_INTERVAL`` seconds. Comics with too
+    few releases to learn a window from are polled every
+    ``COMICS_DAEMON_DEFAULT_INTERVAL`` seconds.
+    """
+
+    def __init__(self, aggregator):
+        self.aggregator = aggregator
+        self._queue = []
+        self._stopped = threading.Event()
+        self._last_pruned = None
+
+    def start(self):
+        start_time = now()
+        for comic in self.aggregator.config.comics:
+            heapq.heappush(self._queue, (start_time, comic.pk, comic))
+        logger.info('Polling %d comics', len(self._queue))
+
+        while self._queue and not self._stopped.is_set():
+            self._sleep_until(self._queue[0][0])
+            if self._stopped.is_set():
+                break
+            comics = self._pop_due_comics()
+            # Give hosts which failed during the last poll a new chance, and
+            # see images saved or deleted by others since
+            circuit_breaker.reset()
+            image_hash_index.reset()
+            self.aggregator.aggregate(comics)
+            for comic in comics:
+                self._schedule(comic)
+            self._prune_http_cache()
+            # Don't keep a connection open for hours between polls
+            connection.close()
+            logger.debug('Next poll at %s', self._queue[0][0])
+
+    def stop(self):
+        self._stopped.set()
+        self.aggregator.stop()
+
+    def _sleep_until(self, poll_time):
+        while not self._stopped.is_set():
+            seconds = (poll_time - now()).total_seconds()
+            if seconds <= 0:
+                return
+            self._stopped.wait(min(seconds, MAX_SLEEP))
+
+    def _pop_due_comics(self):
+        current_time = now()
+        comics = []
+        while self._queue and self._queue[0][0] <= current_time:
+            comics.append(heapq.heappop(self._queue)[2])
+        return comics
+
+    def _schedule(self, comic):
+        try:
+            poll_time = self.get_next_poll_time(comic, now())
+        except Exception as error:
+            logger.exception(u'%s: %s', comic.slug, error)
+            poll_time = now() + datetime.timedelta(
+                seconds=settings.COMICS_DAEMON_IDLE_INTERVAL)
+        heapq.heappush(self._queue, (poll_time, comic.pk, comic))
+
+    def get_next_poll_time(self, comic, current_time):
+        crawler = get_comic_module(comic.slug).Crawler(comic)
+        releases = list(comic.release_set.order_by(
+            '-pub_date').values_list('pub_date', 'fetched')[:HISTORY_SIZE])
+        window = ReleaseWindow.learn(releases, crawler.time_zone)
+        if window is None:
+            return current_time + datetime.timedelta(
+                seconds=settings.COMICS_DAEMON_DEFAULT_INTERVAL)
+
+        idle_poll_time = current_time + datetime.timedelta(
+            seconds=settings.COMICS_DAEMON_IDLE_INTERVAL)
+        latest_pub_date = releases[0][0]
+        weekdays = parse_schedule(crawler.schedule)
+        tz = pytz.timezone(crawler.time_zone)
+        local_today = current_time.astimezone(tz).date()
+
+        # Find the window of the next release we don't have yet. Windows may
+        # extend past midnight, so yesterday's window may still be open.
+        for days in range(-1, 8):
+            pub_date = local_today + datetime.timedelta(days=days)
+            if pub_date <= latest_pub_date:
+                continue
+            if weekdays and get_weekday(pub_date) not in weekdays:
+                continue
+            start, end = window.get_times(pub_date, crawler.time_zone)
+            if end < current_time:
+                continue
+            if start <= current_time:
+                return current_time + datetime.timedelta(
+                    seconds=settings.COMICS_DAEMON_ACTIVE_INTERVAL)
+            return min(start, idle_poll_time)
+        return idle_poll_time
+
+    def _prune_http_cache(self):
+        current_time = now()
+        if (self._last_pruned is None or
+                current_time - self._last_pruned > datetime.timedelta(1)):
+            self.aggregator.prune_http_cache()
+            self._last_pruned = current_time
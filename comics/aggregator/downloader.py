@@ -1,9 +1,8 @@
-import contextlib
+import errno
 import hashlib
-import httplib
-import socket
+import os
 import tempfile
-import urllib2
+from multiprocessing.pool import ThreadPool
 
 try:
     from PIL import Image as PILImage
@@ -12,11 +11,16 @@ except ImportError:
 
 from django.conf import settings
 from django.core.files import File
+from django.core.files.storage import FileSystemStorage
 from django.db import transaction
 
 from comics.aggregator.exceptions import (
     DownloaderHTTPError, ImageTypeError, ImageIsCorrupt, ImageAlreadyExists,
-    ImageIsBlacklisted)
+    ImageIsBlacklisted, ImageTooLarge)
+from comics.aggregator.httpclient import HttpClientError, http_client
+from comics.aggregator.imagehash import (
+    get_distance, get_image_hash, image_hash_index, parse_hash)
+from comics.aggregator.models import ImageSource
 from comics.core.models import Release, Image
 
 
@@ -27,16 +31,42 @@ IMAGE_FORMATS = {
     'PNG': '.png',
 }
 
+# Magic bytes at the start of the image types we accept
+IMAGE_SIGNATURES = (
+    'GIF87a',
+    'GIF89a',
+    '\xff\xd8\xff',
+    '\x89PNG\r\n\x1a\n',
+)
+
+# Number of bytes read from the network at a time when downloading images
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+# Mode of committed image files when FILE_UPLOAD_PERMISSIONS isn't set, equal
+# to what the storage would create with the umask set in comics.core.models
+DEFAULT_FILE_MODE = 0664
+
 
 class ReleaseDownloader(object):
-    def download(self, crawler_release):
-        images = self._download_images(crawler_release)
+    def download(self, crawler_release, fetched_images=None):
+        images = self._download_images(crawler_release, fetched_images)
         return self._create_new_release(
             crawler_release.comic, crawler_release.pub_date, images)
 
-    def _download_images(self, crawler_release):
+    def _download_images(self, crawler_release, fetched_images=None):
         image_downloader = ImageDownloader(crawler_release)
-        return map(image_downloader.download, crawler_release.images)
+        if fetched_images is None:
+            return map(image_downloader.download, crawler_release.images)
+        try:
+            return [
+                image_downloader.store(crawler_image, fetched_image)
+                for crawler_image, fetched_image
+                in zip(crawler_release.images, fetched_images)]
+        finally:
+            # Remove the temporary files of images not stored because of an
+            # error with another image
+            for fetched_image in fetched_images:
+                fetched_image.close()
 
     @transaction.atomic
     def _create_new_release(self, comic, pub_date, images):
@@ -47,79 +77,260 @@ class ReleaseDownloader(object):
         return release
 
 
+class ImagePrefetcher(object):
+    """Downloads the images of releases in background threads
+
+    Only the network transfer happens in the background. The images are
+    validated and saved by :meth:`ReleaseDownloader.download` when given the
+    fetched images.
+    """
+
+    def __init__(self, num_threads):
+        self._pool = ThreadPool(num_threads)
+
+    def prefetch(self, crawler_release):
+        # One image downloader per image, as they keep state while working.
+        # The sources are looked up here, as fetch() doesn't use the database.
+        return PrefetchedRelease(crawler_release, [
+            self._pool.apply_async(
+                ImageDownloader(crawler_release).fetch, (
+                    crawler_image,
+                    ImageSource.objects.lookup(
+                        crawler_release.comic, crawler_image.url)))
+            for crawler_image in crawler_release.images])
+
+    def close(self):
+        self._pool.close()
+        self._pool.join()
+
+    def terminate(self):
+        self._pool.terminate()
+
+
+class PrefetchedRelease(object):
+    def __init__(self, crawler_release, results):
+        self.crawler_release = crawler_release
+        self._results = results
+
+    @property
+    def identifier(self):
+        return self.crawler_release.identifier
+
+    def get_fetched_images(self):
+        """Wait for the images, and raise the first error if any failed"""
+
+        fetched_images = []
+        error = None
+        for result in self._results:
+            try:
+                fetched_images.append(result.get())
+            except Exception as e:
+                if error is None:
+                    error = e
+        if error is not None:
+            for fetched_image in fetched_images:
+                fetched_image.close()
+            raise error
+        return fetched_images
+
+
+class FetchedImage(object):
+    """An image fetched by :meth:`ImageDownloader.fetch`
+
+    If the server said the image is unchanged since it was fetched from the
+    same URL before, there is no file, and the checksum is the one of the
+    earlier download.
+    """
+
+    def __init__(self, checksum, image_file=None, headers=None):
+        self.checksum = checksum
+        self.image_file = image_file
+        self.headers = headers or {}
+
+    @property
+    def unchanged(self):
+        return self.image_file is None
+
+    def close(self):
+        if self.image_file is not None:
+            self.image_file.close()
+
+
 class ImageDownloader(object):
     def __init__(self, crawler_release):
         self.crawler_release = crawler_release
 
     def download(self, crawler_image):
+        source = ImageSource.objects.lookup(
+            self.crawler_release.comic, crawler_image.url)
+        return self.store(crawler_image, self.fetch(crawler_image, source))
+
+    def fetch(self, crawler_image, source=None):
+        """Download the image to a temporary file
+
+        If the image has been downloaded from the same URL before, given as
+        ``source``, a conditional request is made. Doesn't use the database,
+        so it may be called from other threads.
+        """
+
         self.identifier = self.crawler_release.identifier
+        return self._download_image(
+            crawler_image.url, crawler_image.request_headers, source)
+
+    def store(self, crawler_image, fetched_image):
+        """Validate and save the image fetched by :meth:`fetch`"""
+
+        self.identifier = self.crawler_release.identifier
+        comic = self.crawler_release.comic
+        checksum = fetched_image.checksum
+
+        if fetched_image.unchanged:
+            self.identifier = '%s/%s' % (self.identifier, checksum[:6])
+            self._check_if_blacklisted(checksum)
+            existing_image = self._get_existing_image(
+                comic=comic,
+                has_rerun_releases=self.crawler_release.has_rerun_releases,
+                checksum=checksum)
+            if existing_image is not None:
+                return existing_image
+            # The image we got earlier wasn't kept, so we need the file
+            self.identifier = self.crawler_release.identifier
+            fetched_image = self._download_image(
+                crawler_image.url, crawler_image.request_headers)
+            checksum = fetched_image.checksum
+
+        with fetched_image.image_file as image_file:
+            ImageSource.objects.record(
+                comic, crawler_image.url, fetched_image.headers, checksum)
 
-        with self._download_image(
-                crawler_image.url, crawler_image.request_headers
-                ) as image_file:
-            checksum = self._get_sha256sum(image_file)
             self.identifier = '%s/%s' % (self.identifier, checksum[:6])
 
             self._check_if_blacklisted(checksum)
 
             existing_image = self._get_existing_image(
-                comic=self.crawler_release.comic,
+                comic=comic,
                 has_rerun_releases=self.crawler_release.has_rerun_releases,
                 checksum=checksum)
             if existing_image is not None:
                 return existing_image
 
             image = self._validate_image(image_file)
+            image_hash = self._get_image_hash(image_file)
+
+            self._check_if_hash_blacklisted(image_hash)
+
+            similar_image = self._get_similar_image(
+                comic=comic,
+                has_rerun_releases=self.crawler_release.has_rerun_releases,
+                image_hash=image_hash)
+            if similar_image is not None:
+                # Let the next conditional request resolve to this image
+                ImageSource.objects.record(
+                    comic, crawler_image.url, fetched_image.headers,
+                    similar_image.checksum)
+                return similar_image
 
             file_extension = self._get_file_extension(image)
             file_name = self._get_file_name(checksum, file_extension)
 
             return self._create_new_image(
-                comic=self.crawler_release.comic,
+                comic=comic,
                 title=crawler_image.title,
                 text=crawler_image.text,
                 image_file=image_file,
                 file_name=file_name,
-                checksum=checksum)
+                checksum=checksum,
+                width=image.size[0],
+                height=image.size[1],
+                dhash=image_hash)
 
-    def _download_image(self, url, request_headers):
+    def _download_image(self, url, request_headers, source=None):
+        headers = dict(request_headers)
+        if source is not None:
+            headers.update(source.get_conditional_headers())
         try:
-            if isinstance(url, unicode):
-                # Ideally, we should keep the URLs in the original encoding or
-                # URI encoded all the way through the system. If we get Unicode
-                # strings here, our best guess is to encode them as UTF-8 so
-                # urllib2 can URI encode them properly.
-                url = url.encode('utf-8')
-            request = urllib2.Request(url, None, request_headers)
-            with contextlib.closing(urllib2.urlopen(request)) as http_file:
-                temp_file = tempfile.NamedTemporaryFile(suffix='comics')
-                temp_file.write(http_file.read())
+            with http_client.open(url, headers) as http_file:
+                if source is not None and source.is_unchanged(
+                        http_file.status, http_file.headers):
+                    return FetchedImage(source.checksum)
+                self._check_content_type(
+                    http_file.headers.get('content-type'))
+                self._check_content_length(
+                    http_file.headers.get('content-length'))
+                temp_file = tempfile.NamedTemporaryFile(
+                    suffix='comics', dir=self._get_incoming_dir())
+                try:
+                    checksum = self._write_image_file(http_file, temp_file)
+                except Exception:
+                    temp_file.close()
+                    raise
                 temp_file.seek(0)
-                return temp_file
-        except urllib2.HTTPError as error:
-            raise DownloaderHTTPError(self.identifier, error.code)
-        except urllib2.URLError as error:
-            raise DownloaderHTTPError(self.identifier, error.reason)
-        except httplib.BadStatusLine:
-            raise DownloaderHTTPError(self.identifier, 'BadStatusLine')
-        except socket.error as error:
-            raise DownloaderHTTPError(self.identifier, error)
-
-    def _get_sha256sum(self, file_handle):
-        original_position = file_handle.tell()
+                return FetchedImage(checksum, temp_file, http_file.headers)
+        except HttpClientError as error:
+            raise DownloaderHTTPError(self.identifier, error.value)
+
+    def _write_image_file(self, http_file, temp_file):
+        # Stream the image to disk in chunks, hashing it on the way, so that
+        # we never keep the full image in memory or read it twice
         hash = hashlib.sha256()
+        size = 0
         while True:
-            data = file_handle.read(8096)
+            data = http_file.read(DOWNLOAD_CHUNK_SIZE)
             if not data:
                 break
+            if size == 0:
+                self._check_image_signature(data)
+            size += len(data)
+            if size > settings.COMICS_MAX_IMAGE_SIZE:
+                raise ImageTooLarge(self.identifier, '> %d bytes' % (
+                    settings.COMICS_MAX_IMAGE_SIZE))
             hash.update(data)
-        file_handle.seek(original_position)
+            temp_file.write(data)
+        temp_file.flush()
         return hash.hexdigest()
 
+    def _get_incoming_dir(self):
+        # Download to the same filesystem as the image storage if possible,
+        # or else to the default temporary directory
+        incoming_dir = settings.COMICS_INCOMING_DIR
+        if not incoming_dir:
+            return None
+        try:
+            os.makedirs(incoming_dir)
+        except OSError as error:
+            if error.errno != errno.EEXIST:
+                return None
+        return incoming_dir
+
+    def _check_content_type(self, content_type):
+        # Servers are often sloppy with the content type of images, so we only
+        # stop early if we're sure this isn't an image
+        if content_type and content_type.lower().startswith('text/'):
+            raise ImageTypeError(self.identifier, content_type)
+
+    def _check_content_length(self, content_length):
+        try:
+            content_length = int(content_length)
+        except (TypeError, ValueError):
+            return
+        if content_length > settings.COMICS_MAX_IMAGE_SIZE:
+            raise ImageTooLarge(self.identifier, '%d bytes' % content_length)
+
+    def _check_image_signature(self, data):
+        if not data.startswith(IMAGE_SIGNATURES):
+            raise ImageTypeError(self.identifier, 'Unknown')
+
     def _check_if_blacklisted(self, checksum):
         if checksum in settings.COMICS_IMAGE_BLACKLIST:
             raise ImageIsBlacklisted(self.identifier)
 
+    def _check_if_hash_blacklisted(self, image_hash):
+        value = parse_hash(image_hash)
+        for blacklisted_hash in settings.COMICS_IMAGE_HASH_BLACKLIST:
+            if get_distance(value, parse_hash(blacklisted_hash)) <= (
+                    settings.COMICS_IMAGE_HASH_MAX_DISTANCE):
+                raise ImageIsBlacklisted(self.identifier)
+
     def _get_existing_image(self, comic, has_rerun_releases, checksum):
         try:
             image = Image.objects.get(comic=comic, checksum=checksum)
@@ -129,15 +340,50 @@ class ImageDownloader(object):
         except Image.DoesNotExist:
             return None
 
+    def _get_similar_image(self, comic, has_rerun_releases, image_hash):
+        # Only comics with reruns are expected to publish the same image
+        # again. For other comics, strips which look the same may differ in
+        # details the hash doesn't see, like the text in a speech bubble.
+        if not has_rerun_releases:
+            return None
+        image_pks = image_hash_index.find(
+            comic, image_hash, settings.COMICS_IMAGE_HASH_MAX_DISTANCE)
+        for image_pk in image_pks:
+            try:
+                return Image.objects.get(pk=image_pk)
+            except Image.DoesNotExist:
+                continue
+        return None
+
     def _validate_image(self, image_file):
+        # Only the image headers are read, to learn the format and size of the
+        # image. verify() checks the integrity of the file without decoding
+        # the pixels. After verify(), the image object can't be used for
+        # anything but its metadata.
         try:
             image = PILImage.open(image_file)
-            image.load()
+            width, height = image.size
+            if width * height > settings.COMICS_MAX_IMAGE_PIXELS:
+                raise ImageTooLarge(
+                    self.identifier, '%dx%d pixels' % (width, height))
+            image.verify()
             return image
         except IndexError:
             raise ImageIsCorrupt(self.identifier)
-        except IOError as error:
-            raise ImageIsCorrupt(self.identifier, error.message)
+        except (IOError, SyntaxError) as error:
+            raise ImageIsCorrupt(self.identifier, str(error))
+        finally:
+            image_file.seek(0)
+
+    def _get_image_hash(self, image_file):
+        # Unlike _validate_image(), this decodes the pixels, though only at a
+        # reduced size for JPEG images
+        try:
+            return get_image_hash(image_file)
+        except (IOError, SyntaxError) as error:
+            raise ImageIsCorrupt(self.identifier, str(error))
+        finally:
+            image_file.seek(0)
 
     def _get_file_extension(self, image):
         if image.format not in IMAGE_FORMATS:
@@ -150,12 +396,71 @@ class ImageDownloader(object):
 
     @transaction.atomic
     def _create_new_image(
-            self, comic, title, text, image_file, file_name, checksum):
-        image = Image(comic=comic, checksum=checksum)
-        image.file.save(file_name, File(image_file))
+            self, comic, title, text, image_file, file_name, checksum,
+            width, height, dhash=''):
+        image = Image(
+            comic=comic, checksum=checksum, width=width, height=height,
+            dhash=dhash)
+        # Save the file directly to the storage instead of through
+        # image.file.save(), which would open the image again to update the
+        # width and height fields we already know
+        file_field = image._meta.get_field('file')
+        image.file.name = self._store_image_file(
+            image.file.storage, file_field.generate_filename(image, file_name),
+            image_file)
         if title is not None:
             image.title = title
         if text is not None:
             image.text = text
         image.save()
+        if dhash:
+            image_hash_index.add(comic, dhash, image.pk)
         return image
+
+    def _store_image_file(self, storage, name, image_file):
+        if (isinstance(storage, FileSystemStorage) and
+                getattr(image_file, 'name', None) and
+                self._link_image_file(storage, name, image_file.name)):
+            return name
+        return storage.save(name, File(image_file))
+
+    def _link_image_file(self, storage, name, temp_path):
+        # Hard link the downloaded file into place instead of copying it. The
+        # file name is derived from the checksum, so an existing file with the
+        # same name has the same content, or is a leftover from a crash, and
+        # may be atomically replaced. Returns False if the file must be copied,
+        # e.g. because the temporary file is on another filesystem.
+        path = storage.path(name)
+        try:
+            self._make_dirs(storage, os.path.dirname(path))
+            os.chmod(
+                temp_path, storage.file_permissions_mode or DEFAULT_FILE_MODE)
+            try:
+                os.link(temp_path, path)
+            except OSError as error:
+                if error.errno != errno.EEXIST:
+                    raise
+                replace_path = '%s.%s' % (path, os.path.basename(temp_path))
+                os.link(temp_path, replace_path)
+                os.rename(replace_path, path)
+        except (AttributeError, OSError):
+            # AttributeError if the platform lacks os.link()
+            return False
+        return True
+
+    def _make_dirs(self, storage, directory):
+        if os.path.isdir(directory):
+            return
+        try:
+            if storage.directory_permissions_mode is not None:
+                # As in FileSystemStorage, don't let the umask interfere
+                old_umask = os.umask(0)
+                try:
+                    os.makedirs(directory, storage.directory_permissions_mode)
+                finally:
+                    os.umask(old_umask)
+            else:
+                os.makedirs(directory)
+        except OSError as error:
+            if error.errno != errno.EEXIST:
+                raise
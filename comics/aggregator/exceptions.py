@@ -23,7 +23,7 @@ class CrawlerError(AggregatorError):
 
 
 class CrawlerHTTPError(CrawlerError):
-    """Exception used to wrap urllib2.HTTPError from the crawler"""
+    """Exception used to wrap HTTP client errors from the crawler"""
 
     def __str__(self):
         return '%s: Crawler HTTP Error (%s)' % (
@@ -64,7 +64,7 @@ class DownloaderError(AggregatorError):
 
 
 class DownloaderHTTPError(DownloaderError):
-    """Exception used to wrap urllib2.HTTPError from the downloader"""
+    """Exception used to wrap HTTP client errors from the downloader"""
 
     def __str__(self):
         return '%s: Downloader HTTP Error (%s)' % (
@@ -78,6 +78,13 @@ class ImageTypeError(DownloaderError):
         return '%s: Invalid image type (%s)' % (self.identifier, self.value)
 
 
+class ImageTooLarge(DownloaderError):
+    """Exception raised when the image is larger than we accept"""
+
+    def __str__(self):
+        return '%s: Image is too large (%s)' % (self.identifier, self.value)
+
+
 class ImageIsCorrupt(DownloaderError):
     """Exception raised when the fetched image is corrupt"""
 
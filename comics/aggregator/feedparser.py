@@ -4,40 +4,78 @@ import datetime
 import feedparser
 import warnings
 
+from comics.aggregator.httpclient import http_client
 from comics.aggregator.lxmlparser import LxmlParser
 
 
 class FeedParser(object):
     def __init__(self, url):
-        self.raw_feed = feedparser.parse(url)
+        response = http_client.fetch(url)
+        # Parsing feeds is slow, so reuse the previous run's parse of the
+        # feed if it is unchanged
+        self.raw_feed = http_client.load_parsed(response)
+        if self.raw_feed is None:
+            self.raw_feed = feedparser.parse(
+                response.content, response_headers={
+                    'content-location': response.geturl(),
+                    'content-type': response.headers.get('content-type', ''),
+                })
+            http_client.store_parsed(response, self.raw_feed)
         self.encoding = None
         if hasattr(self.raw_feed, 'encoding') and self.raw_feed.encoding:
             self.encoding = self.raw_feed.encoding
+        self._entries = None
+        self._entries_by_date = None
 
     def for_date(self, date):
+        return list(self._get_entries_by_date().get(date, []))
+
+    def for_date_range(self, from_date, to_date):
+        """``(date, entries)`` pairs for the dates in the range with entries"""
+
+        return sorted(
+            (date, list(entries))
+            for date, entries in self._get_entries_by_date().items()
+            if from_date <= date <= to_date)
+
+    def all(self):
+        return list(self._get_entries())
+
+    def _get_entries(self):
+        if self._entries is None:
+            self._entries = [
+                Entry(e, self.encoding) for e in self.raw_feed.entries]
+        return self._entries
+
+    def _get_entries_by_date(self):
+        # Index the entries by date once, instead of scanning all entries for
+        # every date crawled
+        if self._entries_by_date is None:
+            entries_by_date = {}
+            for entry in self._get_entries():
+                for date in self._get_dates(entry.raw_entry):
+                    entries_by_date.setdefault(date, []).append(entry)
+            self._entries_by_date = entries_by_date
+        return self._entries_by_date
+
+    def _get_dates(self, e):
+        dates = []
         with warnings.catch_warnings():
             # feedparser 5.1.2 issues a warning whenever we use updated_parsed
             warnings.simplefilter('ignore')
-            return [
-                Entry(e, self.encoding) for e in self.raw_feed.entries
-                if (hasattr(e, 'published_parsed') and e.published_parsed and
-                    datetime.date(*e.published_parsed[:3]) == date)
-                or (hasattr(e, 'updated_parsed') and e.updated_parsed and
-                    datetime.date(*e.updated_parsed[:3]) == date)
-            ]
-
-    def all(self):
-        return [Entry(e, self.encoding) for e in self.raw_feed.entries]
+            if hasattr(e, 'published_parsed') and e.published_parsed:
+                dates.append(datetime.date(*e.published_parsed[:3]))
+            if hasattr(e, 'updated_parsed') and e.updated_parsed:
+                date = datetime.date(*e.updated_parsed[:3])
+                if date not in dates:
+                    dates.append(date)
+        return dates
 
 
 class Entry(object):
     def __init__(self, entry, encoding=None):
         self.raw_entry = entry
         self.encoding = encoding
-        if 'summary' in entry:
-            self.summary = self.html(entry.summary)
-        if 'content' in entry:
-            self.content0 = self.html(entry.content[0].value)
 
     def __getattr__(self, name):
         attr = getattr(self.raw_entry, name)
@@ -45,6 +83,20 @@ class Entry(object):
             attr = attr.decode(self.encoding)
         return attr
 
+    @property
+    def summary(self):
+        # The HTML fields are parsed on first use, as most crawlers only use
+        # one of them, if any
+        if '_summary' not in self.__dict__:
+            self._summary = self.html(self.raw_entry.summary)
+        return self._summary
+
+    @property
+    def content0(self):
+        if '_content0' not in self.__dict__:
+            self._content0 = self.html(self.raw_entry.content[0].value)
+        return self._content0
+
     def html(self, string):
         if isinstance(string, str) and self.encoding is not None:
             string = string.decode(self.encoding)
@@ -0,0 +1,84 @@
+import threading
+import urlparse
+
+from django.conf import settings
+
+
+def get_hostname(url):
+    """The lowercased hostname of ``url``, or an empty string"""
+    if isinstance(url, unicode):
+        url = url.encode('utf-8')
+    return (urlparse.urlsplit(url).hostname or '').lower()
+
+
+class HostLimiter(object):
+    """Caps the number of simultaneous requests to any single hostname"""
+
+    def __init__(self, max_requests_per_host=None):
+        self._max_requests_per_host = max_requests_per_host
+        self._semaphores = {}
+        self._lock = threading.Lock()
+
+    @property
+    def max_requests_per_host(self):
+        if self._max_requests_per_host is None:
+            return settings.COMICS_MAX_REQUESTS_PER_HOST
+        return self._max_requests_per_host
+
+    def _get_semaphore(self, hostname):
+        with self._lock:
+            if hostname not in self._semaphores:
+                self._semaphores[hostname] = threading.BoundedSemaphore(
+                    self.max_requests_per_host)
+            return self._semaphores[hostname]
+
+    def acquire(self, url):
+        semaphore = self._get_semaphore(get_hostname(url))
+        semaphore.acquire()
+        return semaphore
+
+
+class CircuitBreaker(object):
+    """Stops requests to hosts which keep failing
+
+    After ``max_failures`` requests in a row to a host have failed, the
+    circuit for the host is open, and requests to it should be skipped until
+    :meth:`reset` is called, e.g. at the start of the next crawl.
+    """
+
+    def __init__(self, max_failures=None):
+        self._max_failures = max_failures
+        self._failures = {}
+        self._lock = threading.Lock()
+
+    @property
+    def max_failures(self):
+        if self._max_failures is None:
+            return settings.COMICS_HOST_MAX_FAILURES
+        return self._max_failures
+
+    def is_open(self, url):
+        with self._lock:
+            return self._failures.get(
+                get_hostname(url), 0) >= self.max_failures
+
+    def record_success(self, url):
+        with self._lock:
+            self._failures.pop(get_hostname(url), None)
+
+    def record_failure(self, url):
+        """Count a failed request, and return True if the circuit opened"""
+
+        hostname = get_hostname(url)
+        with self._lock:
+            self._failures[hostname] = self._failures.get(hostname, 0) + 1
+            return self._failures[hostname] == self.max_failures
+
+    def reset(self):
+        with self._lock:
+            self._failures.clear()
+
+
+# Shared by all crawlers and downloaders in the process
+host_limiter = HostLimiter()
+circuit_breaker = CircuitBreaker()
@@ -0,0 +1,182 @@
+"""On-disk cache of fetched pages and feeds, used for conditional requests"""
+
+import cPickle as pickle
+import errno
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+
+logger = logging.getLogger('comics.aggregator.httpcache')
+
+# Minimum number of seconds between each time the cache is pruned
+PRUNE_INTERVAL = 24 * 60 * 60
+
+# File in the cache directory whose modification time is when the cache was
+# last pruned
+PRUNED_FILENAME = '.pruned'
+
+
+class CacheEntry(object):
+    def __init__(self, cache, key, meta):
+        self.cache = cache
+        self.key = key
+        self.url = meta['url']
+        self.etag = meta.get('etag')
+        self.last_modified = meta.get('last_modified')
+        self.checksum = meta['checksum']
+
+    def get_conditional_headers(self):
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+    def read_body(self):
+        return self.cache._read(self.key, '.body')
+
+
+class HttpCache(object):
+    """Stores response bodies with their validators and checksums
+
+    Every URL is stored as a ``.json`` file with the ``ETag`` and
+    ``Last-Modified`` validators and the SHA-256 of the body, and a ``.body``
+    file with the body itself. In addition, objects parsed from a body may be
+    stored as a ``.parsed`` pickle so that they can be reused without parsing
+    the body again as long as the body doesn't change.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def get(self, url):
+        try:
+            key = self._get_key(url)
+            meta = json.loads(self._read(key, '.json'))
+            if meta['url'] != url:
+                return None
+            # Touch the entry so that prune() keeps entries in use
+            os.utime(self._get_path(key, '.json'), None)
+            return CacheEntry(self, key, meta)
+        except (IOError, OSError, ValueError, KeyError):
+            return None
+
+    def store(self, url, headers, body):
+        key = self._get_key(url)
+        checksum = hashlib.sha256(body).hexdigest()
+        meta = {
+            'url': url,
+            'etag': headers.get('etag'),
+            'last_modified': headers.get('last-modified'),
+            'checksum': checksum,
+        }
+        try:
+            self._write(key, '.body', body)
+            self._write(key, '.json', json.dumps(meta))
+        except (IOError, OSError) as error:
+            logger.warning('Failed to cache %s: %s', url, error)
+        return checksum
+
+    def load_parsed(self, url, checksum):
+        try:
+            checksum_and_parsed = pickle.loads(
+                self._read(self._get_key(url), '.parsed'))
+        except (IOError, OSError, pickle.UnpicklingError, EOFError):
+            return None
+        except Exception:
+            logger.debug('Failed to load parsed %s', url, exc_info=True)
+            return None
+        if checksum_and_parsed[0] != checksum:
+            return None
+        return checksum_and_parsed[1]
+
+    def store_parsed(self, url, checksum, parsed):
+        try:
+            data = pickle.dumps((checksum, parsed), pickle.HIGHEST_PROTOCOL)
+            self._write(self._get_key(url), '.parsed', data)
+        except (IOError, OSError, pickle.PicklingError, TypeError) as error:
+            logger.debug('Failed to cache parsed %s: %s', url, error)
+
+    def prune(self, max_age, interval=PRUNE_INTERVAL):
+        """Remove entries which have not been used for ``max_age`` seconds
+
+        As this walks the whole cache, nothing is done if the cache has been
+        pruned by any process in the last ``interval`` seconds.
+        """
+
+        if not self._start_pruning(interval):
+            return 0
+        oldest_allowed = time.time() - max_age
+        num_removed = 0
+        for dir_path, _, file_names in os.walk(self.directory):
+            for file_name in file_names:
+                key, suffix = os.path.splitext(file_name)
+                if suffix != '.json':
+                    continue
+                path = os.path.join(dir_path, file_name)
+                try:
+                    if os.path.getmtime(path) >= oldest_allowed:
+                        continue
+                except OSError:
+                    continue
+                for suffix in ('.json', '.body', '.parsed'):
+                    self._remove(self._get_path(key, suffix))
+                num_removed += 1
+        return num_removed
+
+    def _start_pruning(self, interval):
+        path = os.path.join(self.directory, PRUNED_FILENAME)
+        try:
+            if os.path.getmtime(path) > time.time() - interval:
+                return False
+        except OSError:
+            pass
+        try:
+            with open(path, 'a'):
+                pass
+            os.utime(path, None)
+        except IOError as error:
+            # Nothing has been cached yet
+            if error.errno == errno.ENOENT:
+                return False
+            raise
+        return True
+
+    def _get_key(self, url):
+        return hashlib.sha1(url).hexdigest()
+
+    def _get_path(self, key, suffix):
+        return os.path.join(self.directory, key[:2], key + suffix)
+
+    def _read(self, key, suffix):
+        with open(self._get_path(key, suffix), 'rb') as fh:
+            return fh.read()
+
+    def _write(self, key, suffix, data):
+        # Write to a temporary file and rename it into place, so that other
+        # processes never see a partially written file
+        path = self._get_path(key, suffix)
+        dir_path = os.path.dirname(path)
+        try:
+            os.makedirs(dir_path)
+        except OSError as error:
+            if error.errno != errno.EEXIST:
+                raise
+        fd, temp_path = tempfile.mkstemp(dir=dir_path, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as fh:
+                fh.write(data)
+            os.rename(temp_path, path)
+        except (IOError, OSError):
+            self._remove(temp_path)
+            raise
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
@@ -0,0 +1,497 @@
+"""HTTP client with persistent connections used by all of the aggregator"""
+
+import base64
+import hashlib
+import httplib
+import logging
+import socket
+import threading
+import time
+import urllib
+import urllib2
+import urlparse
+import zlib
+
+from django.conf import settings
+
+from comics.aggregator.hosts import (
+    circuit_breaker, get_hostname, host_limiter)
+from comics.aggregator.httpcache import HttpCache
+from comics.core.exceptions import ComicsError
+
+logger = logging.getLogger('comics.aggregator.httpclient')
+
+REDIRECT_CODES = (301, 302, 303, 307, 308)
+MAX_REDIRECTS = 10
+
+# Status codes which may go away if the request is retried
+TRANSIENT_CODES = (500, 502, 503, 504)
+
+DEFAULT_HEADERS = {
+    'Accept-Encoding': 'gzip, deflate',
+    'User-Agent': 'Python-urllib/%s' % urllib2.__version__,
+}
+
+
+class HttpClientError(ComicsError):
+    """Exception raised when a request fails
+
+    The value is the HTTP status code if a response was received, or else the
+    reason the request failed. ``transient`` tells if the request may succeed
+    if retried, e.g. after a timeout or a 503 response.
+    """
+
+    def __init__(self, value, transient=False):
+        self.value = value
+        self.transient = transient
+
+    def __str__(self):
+        return 'HTTP client error (%s)' % self.value
+
+
+class Proxy(object):
+    """A proxy server, as given by e.g. the ``http_proxy`` environment variable
+
+    Requests for http URLs are sent to the proxy with the full URL. Requests
+    for https URLs are tunnelled through the proxy with ``CONNECT``.
+    """
+
+    def __init__(self, url):
+        if '://' not in url:
+            url = 'http://' + url
+        parts = urlparse.urlsplit(url)
+        self.netloc = '%s:%d' % (parts.hostname, parts.port or 80)
+        self.headers = {}
+        if parts.username:
+            credentials = '%s:%s' % (
+                urllib.unquote(parts.username),
+                urllib.unquote(parts.password or ''))
+            self.headers['Proxy-Authorization'] = (
+                'Basic ' + base64.b64encode(credentials))
+
+    @classmethod
+    def from_environment(cls, scheme, netloc):
+        """The proxy to use for ``netloc``, or None to connect directly
+
+        Like urllib2, the ``http_proxy``, ``https_proxy`` and ``no_proxy``
+        environment variables are used.
+        """
+
+        proxy_url = urllib.getproxies().get(scheme)
+        if not proxy_url or urllib.proxy_bypass(netloc):
+            return None
+        return cls(proxy_url)
+
+
+class DnsCache(object):
+    """Caches the results of hostname lookups for ``ttl`` seconds"""
+
+    ttl = 300
+
+    def __init__(self):
+        self._addresses = {}
+        self._lock = threading.Lock()
+
+    def getaddrinfo(self, host, port):
+        key = (host, port)
+        with self._lock:
+            if key in self._addresses:
+                addresses, expires = self._addresses[key]
+                if expires > time.time():
+                    return addresses
+        addresses = socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM)
+        with self._lock:
+            self._addresses[key] = (addresses, time.time() + self.ttl)
+        return addresses
+
+    def create_connection(
+            self, address, timeout=socket._GLOBAL_DEFAULT_TIMEOUT,
+            source_address=None):
+        # Same as socket.create_connection(), but with cached lookups
+        host, port = address
+        error = None
+        for af, socktype, proto, _, sa in self.getaddrinfo(host, port):
+            sock = None
+            try:
+                sock = socket.socket(af, socktype, proto)
+                if timeout is not socket._GLOBAL_DEFAULT_TIMEOUT:
+                    sock.settimeout(timeout)
+                if source_address:
+                    sock.bind(source_address)
+                sock.connect(sa)
+                return sock
+            except socket.error as error:
+                if sock is not None:
+                    sock.close()
+        if error is not None:
+            raise error
+        raise socket.error('getaddrinfo returns an empty list')
+
+
+class Response(object):
+    """A response which returns its connection to the pool when closed
+
+    The body is transparently decompressed if the server used gzip or deflate
+    content encoding.
+    """
+
+    def __init__(self, client, pool_key, connection, raw, url, release_host):
+        self.status = raw.status
+        # Populated by HttpClient.fetch()
+        self.request_url = None
+        self.content = None
+        self.checksum = None
+        self.unchanged = False
+        self.headers = dict(
+            (name.lower(), value) for (name, value) in raw.getheaders())
+        self._client = client
+        self._pool_key = pool_key
+        self._connection = connection
+        self._raw = raw
+        self._url = url
+        self._release_host = release_host
+        self._decompressor = self._get_decompressor(
+            self.headers.get('content-encoding', ''))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def geturl(self):
+        return self._url
+
+    def read(self, amt=None):
+        try:
+            if self._decompressor is None:
+                return self._read_raw(amt)
+            if amt is None:
+                data = self._decompressor.decompress(self._read_raw())
+                return data + self._decompressor.flush()
+            while True:
+                chunk = self._read_raw(amt)
+                if not chunk:
+                    return self._decompressor.flush()
+                data = self._decompressor.decompress(chunk)
+                if data:
+                    return data
+        except (httplib.HTTPException, socket.error) as error:
+            self._abort()
+            raise HttpClientError(_get_reason(error), transient=True)
+        except zlib.error as error:
+            self._abort()
+            raise HttpClientError('Content decoding failed: %s' % error)
+
+    def _read_raw(self, amt=None):
+        data = self._raw.read(amt)
+        self._client.add_bytes_read(len(data))
+        return data
+
+    def close(self):
+        if self._connection is None:
+            return
+        if self._raw.isclosed() and not self._raw.will_close:
+            self._client._release_connection(
+                self._pool_key, self._connection)
+        else:
+            self._connection.close()
+        self._connection = None
+        self._release_host()
+
+    def _abort(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+            self._release_host()
+
+    def _get_decompressor(self, content_encoding):
+        if content_encoding == 'gzip':
+            return zlib.decompressobj(16 + zlib.MAX_WBITS)
+        elif content_encoding == 'deflate':
+            return _DeflateDecompressor()
+
+
+class _DeflateDecompressor(object):
+    # Servers disagree on whether "deflate" means a zlib stream or a raw
+    # deflate stream, so fall back to the latter if the first chunk isn't a
+    # valid zlib stream
+    def __init__(self):
+        self._decompressor = zlib.decompressobj()
+        self._first_chunk = True
+
+    def decompress(self, data):
+        if self._first_chunk and data:
+            self._first_chunk = False
+            try:
+                return self._decompressor.decompress(data)
+            except zlib.error:
+                self._decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+        return self._decompressor.decompress(data)
+
+    def flush(self):
+        return self._decompressor.flush()
+
+
+class HttpClient(object):
+    """Keeps a pool of idle keep-alive connections per scheme, host and port
+
+    The client is thread safe and meant to be shared by everything in the
+    aggregator that talks HTTP, so that e.g. a page and the image it links to
+    are fetched over the same connection.
+    """
+
+    max_idle_connections_per_host = 4
+
+    def __init__(self, timeout=socket._GLOBAL_DEFAULT_TIMEOUT, cache=None):
+        self.timeout = timeout
+        self._cache = cache
+        self.dns_cache = DnsCache()
+        self._idle_connections = {}
+        self._lock = threading.Lock()
+        # Number of bytes received in response bodies, for reporting progress
+        self.bytes_read = 0
+
+    def add_bytes_read(self, num_bytes):
+        with self._lock:
+            self.bytes_read += num_bytes
+
+    def open(self, url, headers=None, method='GET'):
+        """Send a request and return a streaming :class:`Response`
+
+        Redirects are followed. Raises :class:`HttpClientError` on network
+        errors and HTTP error status codes. Transient errors are retried, and
+        requests to hosts which keep failing are not sent at all.
+        """
+
+        url = _encode_url(url)
+        return self._retry(url, self._open, url, headers, method)
+
+    def _open(self, url, headers, method='GET'):
+        for _ in range(MAX_REDIRECTS + 1):
+            response = self._request(url, headers, method)
+            if response.status not in REDIRECT_CODES:
+                break
+            location = response.headers.get('location')
+            self._discard(response)
+            if not location:
+                raise HttpClientError(response.status)
+            url = urlparse.urljoin(url, _encode_url(location))
+        else:
+            raise HttpClientError('Too many redirects')
+
+        if response.status >= 400:
+            self._discard(response)
+            raise HttpClientError(
+                response.status,
+                transient=response.status in TRANSIENT_CODES)
+        return response
+
+    def fetch(self, url, headers=None):
+        """Get the full body of ``url``, returned as a read :class:`Response`
+
+        The body is available as ``response.content`` and its SHA-256 as
+        ``response.checksum``. If the HTTP cache is enabled, a conditional
+        request is made for previously fetched URLs, and
+        ``response.unchanged`` tells if the body is the same as last time.
+        """
+
+        url = _encode_url(url)
+        cache = self.get_cache()
+        entry = None
+        request_headers = dict(headers or {})
+        if cache is not None:
+            entry = cache.get(url)
+            if entry is not None:
+                request_headers.update(entry.get_conditional_headers())
+
+        response = self._read(url, request_headers)
+        if response.status == 304 and entry is not None:
+            try:
+                response.content = entry.read_body()
+                response.checksum = entry.checksum
+                response.unchanged = True
+                return response
+            except IOError:
+                # The cached body is gone, so fetch it unconditionally
+                entry = None
+                response = self._read(url, headers)
+
+        if cache is not None:
+            response.checksum = cache.store(
+                url, response.headers, response.content)
+            response.unchanged = (
+                entry is not None and entry.checksum == response.checksum)
+        else:
+            response.checksum = hashlib.sha256(response.content).hexdigest()
+        return response
+
+    def _read(self, url, headers):
+        return self._retry(url, self._read_once, url, headers)
+
+    def _read_once(self, url, headers):
+        with self._open(url, headers) as response:
+            response.content = response.read()
+        response.request_url = url
+        return response
+
+    def _retry(self, url, func, *args):
+        # Call func, retrying with exponential backoff on transient errors
+        for attempt in range(settings.COMICS_HTTP_MAX_RETRIES + 1):
+            if circuit_breaker.is_open(url):
+                raise HttpClientError(
+                    'Skipped, %s keeps failing' % get_hostname(url))
+            try:
+                result = func(*args)
+            except HttpClientError as error:
+                if not error.transient:
+                    circuit_breaker.record_success(url)
+                    raise
+                if attempt == settings.COMICS_HTTP_MAX_RETRIES:
+                    if circuit_breaker.record_failure(url):
+                        logger.warning(
+                            'Skipping %s for the rest of the run after %d '
+                            'failed requests', get_hostname(url),
+                            circuit_breaker.max_failures)
+                    raise
+                delay = settings.COMICS_HTTP_RETRY_BACKOFF * 2 ** attempt
+                logger.debug(
+                    'Retrying %s in %s seconds: %s', url, delay, error)
+                time.sleep(delay)
+            else:
+                circuit_breaker.record_success(url)
+                return result
+
+    def get_cache(self):
+        if self._cache is None and settings.COMICS_HTTP_CACHE_DIR:
+            self._cache = HttpCache(settings.COMICS_HTTP_CACHE_DIR)
+        return self._cache
+
+    def load_parsed(self, response):
+        """Get the object previously parsed from an unchanged response"""
+
+        cache = self.get_cache()
+        if cache is None or not response.unchanged:
+            return None
+        return cache.load_parsed(response.request_url, response.checksum)
+
+    def store_parsed(self, response, parsed):
+        """Store the object parsed from a response for use by later runs"""
+
+        cache = self.get_cache()
+        if cache is not None:
+            cache.store_parsed(response.request_url, response.checksum, parsed)
+
+    def prune_cache(self):
+        cache = self.get_cache()
+        if cache is not None:
+            return cache.prune(settings.COMICS_HTTP_CACHE_MAX_AGE * 86400)
+        return 0
+
+    def _request(self, url, headers, method):
+        scheme, netloc, path, query, _ = urlparse.urlsplit(url)
+        if scheme not in ('http', 'https'):
+            raise HttpClientError('Unsupported URL scheme: %s' % scheme)
+        pool_key = (scheme, netloc.lower())
+        request_path = urlparse.urlunsplit(('', '', path or '/', query, ''))
+        request_headers = dict(DEFAULT_HEADERS)
+        request_headers.update(headers or {})
+        proxy = Proxy.from_environment(scheme, netloc)
+        if proxy is not None and scheme == 'http':
+            request_path = urlparse.urlunsplit(
+                (scheme, netloc, path or '/', query, ''))
+            request_headers.update(proxy.headers)
+
+        semaphore = host_limiter.acquire(url)
+        try:
+            raw, connection = self._send(
+                pool_key, method, request_path, request_headers)
+        except Exception:
+            semaphore.release()
+            raise
+        return Response(
+            self, pool_key, connection, raw, url, semaphore.release)
+
+    def _send(self, pool_key, method, path, headers):
+        connection, reused = self._get_connection(pool_key)
+        try:
+            connection.request(method, path, headers=headers)
+            return connection.getresponse(), connection
+        except (httplib.HTTPException, socket.error) as error:
+            connection.close()
+            if not reused:
+                raise HttpClientError(_get_reason(error), transient=True)
+
+        # The server may have closed an idle keep-alive connection, so retry
+        # once on a fresh connection
+        connection = self._create_connection(pool_key)
+        try:
+            connection.request(method, path, headers=headers)
+            return connection.getresponse(), connection
+        except (httplib.HTTPException, socket.error) as error:
+            connection.close()
+            raise HttpClientError(_get_reason(error), transient=True)
+
+    def _get_connection(self, pool_key):
+        with self._lock:
+            idle_connections = self._idle_connections.get(pool_key)
+            if idle_connections:
+                return idle_connections.pop(), True
+        return self._create_connection(pool_key), False
+
+    def _create_connection(self, pool_key):
+        scheme, netloc = pool_key
+        proxy = Proxy.from_environment(scheme, netloc)
+        host = netloc if proxy is None else proxy.netloc
+        if scheme == 'https':
+            connection = httplib.HTTPSConnection(host, timeout=self.timeout)
+            if proxy is not None:
+                connection.set_tunnel(netloc, headers=proxy.headers)
+        else:
+            connection = httplib.HTTPConnection(host, timeout=self.timeout)
+        connection._create_connection = self.dns_cache.create_connection
+        return connection
+
+    def _release_connection(self, pool_key, connection):
+        with self._lock:
+            idle_connections = self._idle_connections.setdefault(pool_key, [])
+            if len(idle_connections) < self.max_idle_connections_per_host:
+                idle_connections.append(connection)
+                return
+        connection.close()
+
+    def _discard(self, response):
+        # Read the body of responses we don't care about, so that the
+        # connection can be reused
+        try:
+            response.read()
+        except HttpClientError:
+            pass
+        response.close()
+
+    def close(self):
+        with self._lock:
+            idle_connections = self._idle_connections
+            self._idle_connections = {}
+        for connections in idle_connections.values():
+            for connection in connections:
+                connection.close()
+
+
+def _encode_url(url):
+    # Ideally, we should keep the URLs in the original encoding or URI encoded
+    # all the way through the system. If we get Unicode strings here, our best
+    # guess is to encode them as UTF-8 before URI encoding them.
+    if isinstance(url, unicode):
+        url = url.encode('utf-8')
+    return urllib.quote(url.strip(), safe="%/:=&?~#+!$,;'@()*[]")
+
+
+def _get_reason(error):
+    if isinstance(error, httplib.BadStatusLine):
+        return 'BadStatusLine'
+    return error
+
+
+# Shared by all crawlers and downloaders in the process
+http_client = HttpClient()
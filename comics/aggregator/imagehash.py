@@ -0,0 +1,133 @@
+"""Perceptual image hashes for finding images which look the same
+
+The difference hash of an image stays the same, or differs by only a few bits,
+when the image is re-encoded, resized or slightly altered, unlike its
+checksum.
+"""
+
+import threading
+
+try:
+    from PIL import Image as PILImage
+except ImportError:
+    import Image as PILImage  # noqa
+
+from comics.core.models import Image
+
+# Width and height of the grayscale thumbnail the hash is computed from. Each
+# row gives one bit per pair of neighbouring pixels, making a 64 bit hash.
+HASH_SIZE = 8
+
+
+def get_image_hash(image_file):
+    """The difference hash of an image file as a hex string"""
+
+    image = PILImage.open(image_file)
+    # Let JPEG images decode at a reduced size, which is much faster
+    image.draft('L', (HASH_SIZE * 8, HASH_SIZE * 8))
+    image = image.convert('L').resize(
+        (HASH_SIZE + 1, HASH_SIZE), PILImage.ANTIALIAS)
+    pixels = list(image.getdata())
+    value = 0
+    for row in range(HASH_SIZE):
+        for col in range(HASH_SIZE):
+            offset = row * (HASH_SIZE + 1) + col
+            value = (value << 1) | (pixels[offset] > pixels[offset + 1])
+    return format_hash(value)
+
+
+def format_hash(value):
+    return '%016x' % value
+
+
+def parse_hash(image_hash):
+    return int(image_hash, 16)
+
+
+def get_distance(a, b):
+    """The number of bits which differ between two hashes given as ints"""
+    return bin(a ^ b).count('1')
+
+
+class BKTree(object):
+    """Finds the values within a Hamming distance of a hash
+
+    Each node's children are keyed by their distance to the node, so that
+    the triangle inequality rules out most of the tree for small distances.
+    """
+
+    def __init__(self):
+        self._root = None
+
+    def add(self, key, value):
+        if self._root is None:
+            self._root = (key, [value], {})
+            return
+        node = self._root
+        while True:
+            node_key, values, children = node
+            distance = get_distance(key, node_key)
+            if distance == 0:
+                values.append(value)
+                return
+            if distance not in children:
+                children[distance] = (key, [value], {})
+                return
+            node = children[distance]
+
+    def find(self, key, max_distance):
+        """``(distance, value)`` pairs for ``key``, closest first"""
+
+        found = []
+        nodes = [self._root] if self._root is not None else []
+        while nodes:
+            node_key, values, children = nodes.pop()
+            distance = get_distance(key, node_key)
+            if distance <= max_distance:
+                found.extend((distance, value) for value in values)
+            for child_distance, child in children.items():
+                if abs(child_distance - distance) <= max_distance:
+                    nodes.append(child)
+        found.sort()
+        return found
+
+
+class ImageHashIndex(object):
+    """The hashes of each comic's images, loaded on first use"""
+
+    def __init__(self):
+        self._trees = {}
+        self._lock = threading.Lock()
+
+    def _get_tree(self, comic):
+        if comic.pk not in self._trees:
+            tree = BKTree()
+            images = Image.objects.filter(comic=comic).exclude(
+                dhash='').values_list('dhash', 'pk')
+            for image_hash, image_pk in images.iterator():
+                tree.add(parse_hash(image_hash), image_pk)
+            self._trees[comic.pk] = tree
+        return self._trees[comic.pk]
+
+    def find(self, comic, image_hash, max_distance):
+        """Primary keys of images close to ``image_hash``, closest first"""
+
+        with self._lock:
+            tree = self._get_tree(comic)
+            return [
+                image_pk for _, image_pk
+                in tree.find(parse_hash(image_hash), max_distance)]
+
+    def add(self, comic, image_hash, image_pk):
+        with self._lock:
+            if comic.pk in self._trees:
+                self._trees[comic.pk].add(parse_hash(image_hash), image_pk)
+
+    def reset(self):
+        """Forget all hashes, so that images saved by others are seen"""
+
+        with self._lock:
+            self._trees.clear()
+
+
+image_hash_index = ImageHashIndex()
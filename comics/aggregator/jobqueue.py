@@ -0,0 +1,131 @@
+"""Crawling through a queue of jobs in the database, shared by many workers"""
+
+import logging
+import os
+import socket
+import threading
+
+from django.db import connection
+
+from comics.aggregator.command import Aggregator, log_errors
+from comics.aggregator.downloader import ReleaseDownloader
+from comics.aggregator.exceptions import (
+    CrawlerHTTPError, DownloaderHTTPError, ImageAlreadyExists,
+    NotHistoryCapable, ReleaseAlreadyExists)
+from comics.aggregator.hosts import circuit_breaker
+from comics.aggregator.imagehash import image_hash_index
+from comics.aggregator.models import CrawlJob
+from comics.comics import get_comic_module
+from comics.core.exceptions import ComicsError
+
+logger = logging.getLogger('comics.aggregator.jobqueue')
+
+# Number of seconds an idle worker waits before it looks for new jobs
+POLL_INTERVAL = 10
+
+
+class QueueingAggregator(Aggregator):
+    """Aggregator which queues a job per date instead of crawling it"""
+
+    def start(self):
+        for comic in self.config.comics:
+            self.identifier = comic.slug
+            self._queue_one_comic(comic)
+        logger.info('Queued %d crawl jobs', self.stats['jobs_queued'])
+
+    @log_errors
+    def _queue_one_comic(self, comic):
+        crawler = self._get_crawler(comic)
+        from_date, to_date = self._get_date_range(crawler)
+        plan = self._get_crawl_plan(crawler, from_date, to_date)
+        num_queued = CrawlJob.objects.enqueue(comic, list(plan))
+        self._add_stats(jobs_queued=num_queued)
+        logger.debug(
+            '%s: Queued %d crawl jobs from %s to %s', comic.slug, num_queued,
+            from_date, to_date)
+
+
+class JobWorker(object):
+    """Claims crawl jobs from the queue and runs them until stopped"""
+
+    # Errors which may go away if the job is retried
+    TRANSIENT_ERRORS = (CrawlerHTTPError, DownloaderHTTPError)
+
+    # Client error responses which may go away if the job is retried. Other
+    # 4xx responses, like 404, will be the same the next time.
+    TRANSIENT_CLIENT_ERROR_CODES = (408, 429)
+
+    # Errors which mean there is nothing more to do for the job
+    FINISHED_ERRORS = (
+        ReleaseAlreadyExists, NotHistoryCapable, ImageAlreadyExists)
+
+    def __init__(self, worker_id=None, exit_when_empty=False):
+        if worker_id is None:
+            worker_id = '%s:%d' % (socket.gethostname(), os.getpid())
+        self.worker_id = worker_id
+        self.exit_when_empty = exit_when_empty
+        self._stopped = threading.Event()
+        self._crawler = None
+
+    def start(self):
+        logger.info('Worker %s started', self.worker_id)
+        while not self._stopped.is_set():
+            job = CrawlJob.objects.claim(self.worker_id)
+            if job is not None:
+                self.run_job(job)
+            elif self.exit_when_empty and not CrawlJob.objects.filter(
+                    state=CrawlJob.PENDING).exists():
+                # Jobs waiting to be retried keep the worker running
+                break
+            else:
+                # Don't keep a connection open while idle, give hosts which
+                # failed a new chance when new jobs arrive, and see images
+                # saved by other workers
+                connection.close()
+                circuit_breaker.reset()
+                image_hash_index.reset()
+                self._stopped.wait(POLL_INTERVAL)
+        logger.info('Worker %s stopped', self.worker_id)
+
+    def stop(self):
+        self._stopped.set()
+
+    def run_job(self, job):
+        identifier = u'%s/%s' % (job.comic.slug, job.pub_date)
+        try:
+            crawler_release = self._get_crawler(job.comic).get_crawler_release(
+                job.pub_date)
+            if crawler_release:
+                ReleaseDownloader().download(crawler_release)
+                logger.info('%s: Release saved', identifier)
+        except self.FINISHED_ERRORS as error:
+            logger.info(error)
+            job.finish(unicode(error))
+        except self.TRANSIENT_ERRORS as error:
+            logger.info(error)
+            if self._is_transient(error):
+                job.retry(unicode(error))
+            else:
+                job.fail(unicode(error))
+        except ComicsError as error:
+            logger.info(error)
+            job.fail(unicode(error))
+        except Exception as error:
+            logger.exception(u'%s: %s', identifier, error)
+            job.fail(u'%s: %s' % (error.__class__.__name__, error))
+        else:
+            job.finish()
+
+    def _is_transient(self, error):
+        # The value is the status code if the server responded
+        status = error.value
+        if isinstance(status, int) and 400 <= status < 500:
+            return status in self.TRANSIENT_CLIENT_ERROR_CODES
+        return True
+
+    def _get_crawler(self, comic):
+        # Keep the crawler while running jobs for the same comic, so that
+        # fetched pages and feeds are reused across dates
+        if self._crawler is None or self._crawler.comic != comic:
+            self._crawler = get_comic_module(comic.slug).Crawler(comic)
+        return self._crawler
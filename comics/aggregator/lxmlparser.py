@@ -1,12 +1,41 @@
+import threading
+
+from lxml.cssselect import CSSSelector
 from lxml.html import fromstring
-import urllib2
 
 from comics.aggregator.exceptions import CrawlerError
+from comics.aggregator.httpclient import http_client
+
+# Max number of compiled selectors to keep per thread. Crawlers reuse the same
+# selectors for every date they crawl, but some build selectors from the date.
+MAX_COMPILED_SELECTORS = 1000
+
+_compiled_selectors = threading.local()
+
+
+def compile_selector(selector):
+    """Get a compiled CSS selector, translating it to XPath only once
+
+    lxml's XPath evaluators are not safe to share between threads, so the
+    compiled selectors are kept per thread.
+    """
+
+    cache = getattr(_compiled_selectors, 'cache', None)
+    if cache is None:
+        cache = _compiled_selectors.cache = {}
+    compiled = cache.get(selector)
+    if compiled is None:
+        if len(cache) >= MAX_COMPILED_SELECTORS:
+            cache.clear()
+        compiled = cache[selector] = CSSSelector(selector, translator='html')
+    return compiled
 
 
 class LxmlParser(object):
     def __init__(self, url=None, string=None, headers=None):
         self._retrieved_url = None
+        # Size of the parsed document, used for bounding the page cache
+        self.size = 0
 
         if url is not None:
             self.root = self._parse_url(url, headers)
@@ -48,8 +77,36 @@ class LxmlParser(object):
                 return []
             return default
 
+    def extract(self, selector, attrs, default=None, allow_multiple=False):
+        """Get several attributes of the element matching ``selector``
+
+        The element is only looked up once. Returns a dict with a value for
+        each name in ``attrs``, where the name ``'text'`` gives the text
+        content of the element. With ``allow_multiple``, a list with a dict
+        for each matching element is returned.
+        """
+
+        try:
+            if allow_multiple:
+                return [
+                    self._extract_values(match, attrs)
+                    for match in self._select(selector, allow_multiple)]
+            else:
+                return self._extract_values(self._select(selector), attrs)
+        except DoesNotExist:
+            if allow_multiple:
+                return []
+            return dict((attr, default) for attr in attrs)
+
+    def extract_many(self, selectors, default=None):
+        """Like :meth:`extract`, for a dict mapping selectors to attrs"""
+
+        return dict(
+            (selector, self.extract(selector, attrs, default))
+            for selector, attrs in selectors.items())
+
     def remove(self, selector):
-        for element in self.root.cssselect(selector):
+        for element in compile_selector(selector)(self.root):
             element.drop_tree()
 
     def url(self):
@@ -69,8 +126,17 @@ class LxmlParser(object):
                 return []
             return default
 
+    def _extract_values(self, element, attrs):
+        values = {}
+        for attr in attrs:
+            if attr == 'text':
+                values[attr] = self._decode(element.text_content())
+            else:
+                values[attr] = self._decode(element.get(attr))
+        return values
+
     def _select(self, selector, allow_multiple=False):
-        elements = self.root.cssselect(selector)
+        elements = compile_selector(selector)(self.root)
 
         if len(elements) == 0:
             raise DoesNotExist('Nothing matched the selector: %s' % selector)
@@ -84,15 +150,9 @@ class LxmlParser(object):
             return elements[0]
 
     def _parse_url(self, url, headers=None):
-        if headers is None:
-            handle = urllib2.urlopen(url)
-        else:
-            request = urllib2.Request(url, headers=headers)
-            handle = urllib2.urlopen(request)
-        content = handle.read()
-        self._retrieved_url = handle.geturl()
-        handle.close()
-        content = content.replace('\x00', '')
+        response = http_client.fetch(url, headers)
+        self._retrieved_url = response.geturl()
+        content = response.content.replace('\x00', '')
         root = self._parse_string(content)
         root.make_links_absolute(self._retrieved_url)
         return root
@@ -100,6 +160,7 @@ class LxmlParser(object):
     def _parse_string(self, string):
         if len(string.strip()) == 0:
             string = '<xml />'
+        self.size = len(string)
         return fromstring(string)
 
     def _decode(self, string):
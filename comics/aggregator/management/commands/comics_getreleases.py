@@ -1,4 +1,5 @@
 from comics.aggregator.command import Aggregator
+from comics.aggregator.daemon import AggregatorDaemon
 from comics.core.command_utils import ComicsBaseCommand, make_option
 
 
@@ -16,11 +17,37 @@ class Command(ComicsBaseCommand):
             '-t', '--to-date',
             dest='to_date', metavar='DATE', default=None,
             help='Last date to crawl [default: today]'),
+        make_option(
+            '-w', '--workers',
+            dest='workers', metavar='N', type='int', default=None,
+            help='Number of comics to crawl concurrently [default: 1]'),
+        make_option(
+            '--deadline',
+            dest='deadline', metavar='SECONDS', type='int', default=None,
+            help='Stop crawling when the run has taken this long, '
+            'not allowed with --daemon [default: no deadline]'),
+        make_option(
+            '-g', '--fill-gaps',
+            action='store_true', dest='fill_gaps', default=False,
+            help='Only crawl scheduled dates without a release, from the '
+            'latest release if no from date is given'),
+        make_option(
+            '-d', '--daemon',
+            action='store_true', dest='daemon', default=False,
+            help='Keep running, polling each comic more often around the '
+            'time it usually is released'),
+        make_option(
+            '-r', '--resume',
+            action='store_true', dest='resume', default=False,
+            help='Continue unfinished crawls of date ranges from where they '
+            'stopped, and crawl the dates which failed again'),
     )
 
     def handle(self, *args, **options):
         super(Command, self).handle(*args, **options)
         aggregator = Aggregator(optparse_options=options)
+        if aggregator.config.daemon:
+            aggregator = AggregatorDaemon(aggregator)
         try:
             aggregator.start()
         except KeyboardInterrupt:
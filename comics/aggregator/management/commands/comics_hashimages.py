@@ -0,0 +1,37 @@
+import logging
+
+from comics.aggregator.imagehash import get_image_hash
+from comics.core.command_utils import ComicsBaseCommand, make_option
+from comics.core.models import Image
+
+logger = logging.getLogger('comics.aggregator.hashimages')
+
+
+class Command(ComicsBaseCommand):
+    help = 'Computes the perceptual hash of images saved without one'
+
+    option_list = ComicsBaseCommand.option_list + (
+        make_option(
+            '-c', '--comic',
+            action='append', dest='comic_slugs', metavar='COMIC',
+            help='Comic to hash images of, repeat for multiple '
+            '[default: all]'),
+    )
+
+    def handle(self, *args, **options):
+        super(Command, self).handle(*args, **options)
+        images = Image.objects.filter(dhash='').select_related('comic')
+        if options.get('comic_slugs'):
+            images = images.filter(comic__slug__in=options['comic_slugs'])
+        num_hashed = 0
+        for image in images.iterator():
+            try:
+                image.file.open()
+                with image.file as image_file:
+                    dhash = get_image_hash(image_file)
+            except (IOError, SyntaxError) as error:
+                logger.warning(u'%s: %s', image, error)
+                continue
+            Image.objects.filter(pk=image.pk).update(dhash=dhash)
+            num_hashed += 1
+        logger.info('Hashed %d images', num_hashed)
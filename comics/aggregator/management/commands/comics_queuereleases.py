@@ -0,0 +1,29 @@
+from comics.aggregator.jobqueue import QueueingAggregator
+from comics.core.command_utils import ComicsBaseCommand, make_option
+
+
+class Command(ComicsBaseCommand):
+    option_list = ComicsBaseCommand.option_list + (
+        make_option(
+            '-c', '--comic',
+            action='append', dest='comic_slugs', metavar='COMIC',
+            help='Comic to queue, repeat for multiple [default: all]'),
+        make_option(
+            '-f', '--from-date',
+            dest='from_date', metavar='DATE', default=None,
+            help='First date to queue [default: today]'),
+        make_option(
+            '-t', '--to-date',
+            dest='to_date', metavar='DATE', default=None,
+            help='Last date to queue [default: today]'),
+        make_option(
+            '-g', '--fill-gaps',
+            action='store_true', dest='fill_gaps', default=False,
+            help='Only queue scheduled dates without a release, from the '
+            'latest release if no from date is given'),
+    )
+
+    def handle(self, *args, **options):
+        super(Command, self).handle(*args, **options)
+        aggregator = QueueingAggregator(optparse_options=options)
+        aggregator.start()
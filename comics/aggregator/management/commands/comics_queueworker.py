@@ -0,0 +1,26 @@
+from comics.aggregator.jobqueue import JobWorker
+from comics.core.command_utils import ComicsBaseCommand, make_option
+
+
+class Command(ComicsBaseCommand):
+    option_list = ComicsBaseCommand.option_list + (
+        make_option(
+            '-i', '--id',
+            dest='worker_id', metavar='ID', default=None,
+            help='Worker ID stored on claimed jobs [default: host:pid]'),
+        make_option(
+            '-e', '--exit-when-empty',
+            action='store_true', dest='exit_when_empty', default=False,
+            help='Exit when there are no more jobs, instead of waiting for '
+            'new jobs'),
+    )
+
+    def handle(self, *args, **options):
+        super(Command, self).handle(*args, **options)
+        worker = JobWorker(
+            worker_id=options.get('worker_id'),
+            exit_when_empty=options.get('exit_when_empty'))
+        try:
+            worker.start()
+        except KeyboardInterrupt:
+            worker.stop()
@@ -0,0 +1,160 @@
+import datetime
+import hashlib
+
+from django.conf import settings
+from django.db import connection, models, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+# Number of jobs to try claiming at a time when other workers are claiming
+# jobs at the same time
+CLAIM_CANDIDATES = 10
+
+
+class CrawlJobManager(models.Manager):
+    def enqueue(self, comic, pub_dates):
+        """Add jobs for the dates which don't already have a job"""
+
+        if not pub_dates:
+            return 0
+        existing_pub_dates = set(self.filter(
+            comic=comic,
+            pub_date__range=(min(pub_dates), max(pub_dates))).values_list(
+            'pub_date', flat=True))
+        jobs = [
+            self.model(comic=comic, pub_date=pub_date)
+            for pub_date in pub_dates if pub_date not in existing_pub_dates]
+        self.bulk_create(jobs, batch_size=500)
+        return len(jobs)
+
+    def claim(self, worker, lease_time=None, max_attempts=None):
+        """Atomically claim the oldest available job for ``worker``
+
+        The job is leased for ``lease_time`` seconds. Jobs whose lease
+        expires, e.g. because the worker died, may be claimed again until
+        they have been attempted ``max_attempts`` times. Jobs which are being
+        retried are not claimed before their ``not_before`` time. Returns None
+        if no job is available.
+        """
+
+        if lease_time is None:
+            lease_time = settings.COMICS_CRAWL_JOB_LEASE_TIME
+        if max_attempts is None:
+            max_attempts = settings.COMICS_CRAWL_JOB_MAX_ATTEMPTS
+        now = timezone.now()
+        lease_expires = now + datetime.timedelta(seconds=lease_time)
+
+        self._fail_expired(now, max_attempts)
+        if connection.vendor == 'postgresql':
+            job_id = self._claim_skip_locked(
+                worker, now, lease_expires, max_attempts)
+        else:
+            job_id = self._claim_compare_and_set(
+                worker, now, lease_expires, max_attempts)
+        if job_id is None:
+            return None
+        return self.select_related('comic').get(pk=job_id)
+
+    def _get_claimable(self, now, max_attempts):
+        return self.filter(attempts__lt=max_attempts).filter(
+            Q(state=self.model.PENDING, not_before__isnull=True) |
+            Q(state=self.model.PENDING, not_before__lte=now) |
+            Q(state=self.model.RUNNING, lease_expires__lt=now))
+
+    def _fail_expired(self, now, max_attempts):
+        self.filter(
+            state=self.model.RUNNING, lease_expires__lt=now,
+            attempts__gte=max_attempts).update(
+            state=self.model.FAILED, lease_expires=None,
+            error='Lease expired %d times' % max_attempts)
+
+    def _claim_skip_locked(self, worker, now, lease_expires, max_attempts):
+        # Rows locked by other workers claiming jobs are skipped instead of
+        # waited for, so that workers never block each other
+        table = self.model._meta.db_table
+        with transaction.atomic():
+            cursor = connection.cursor()
+            cursor.execute(
+                'UPDATE ' + table + ' SET state = %s, '
+                'attempts = attempts + 1, lease_expires = %s, worker = %s '
+                'WHERE id = (SELECT id FROM ' + table + ' '
+                'WHERE attempts < %s AND ('
+                '(state = %s AND (not_before IS NULL OR not_before <= %s)) '
+                'OR (state = %s AND lease_expires < %s)) '
+                'ORDER BY id LIMIT 1 FOR UPDATE SKIP LOCKED) '
+                'RETURNING id',
+                [self.model.RUNNING, lease_expires, worker, max_attempts,
+                 self.model.PENDING, now, self.model.RUNNING, now])
+            row = cursor.fetchone()
+        if row is None:
+            return None
+        return row[0]
+
+    def _claim_compare_and_set(
+            self, worker, now, lease_expires, max_attempts):
+        # The UPDATE only succeeds if the job is still claimable, so only one
+        # of several workers trying to claim the same job gets it
+        while True:
+            job_ids = list(self._get_claimable(now, max_attempts).order_by(
+                'id').values_list('id', flat=True)[:CLAIM_CANDIDATES])
+            if not job_ids:
+                return None
+            for job_id in job_ids:
+                num_claimed = self._get_claimable(now, max_attempts).filter(
+                    pk=job_id).update(
+                    state=self.model.RUNNING, attempts=F('attempts') + 1,
+                    lease_expires=lease_expires, worker=worker)
+                if num_claimed:
+                    return job_id
+
+
+def get_url_hash(url):
+    if isinstance(url, unicode):
+        url = url.encode('utf-8')
+    return hashlib.sha1(url).hexdigest()
+
+
+class ImageSourceManager(models.Manager):
+    def lookup(self, comic, url):
+        """The source of an earlier download from ``url``, or None"""
+
+        try:
+            return self.get(comic=comic, url_hash=get_url_hash(url))
+        except self.model.DoesNotExist:
+            return None
+
+    def record(self, comic, url, headers, checksum):
+        """Remember the validators and checksum of an image downloaded"""
+
+        try:
+            content_length = int(headers.get('content-length'))
+        except (TypeError, ValueError):
+            content_length = None
+        etag = headers.get('etag') or ''
+        if len(etag) > self.model._meta.get_field('etag').max_length:
+            etag = ''
+        source, _ = self.update_or_create(
+            comic=comic, url_hash=get_url_hash(url), defaults={
+                'url': url,
+                'checksum': checksum,
+                'etag': etag,
+                'last_modified': headers.get('last-modified') or '',
+                'content_length': content_length,
+            })
+        return source
+
+
+class CrawlProgressManager(models.Manager):
+    def start(self, comic, from_date, to_date):
+        """Start saving the progress of crawling a new date range"""
+
+        with transaction.atomic():
+            self.filter(comic=comic).delete()
+            return self.create(
+                comic=comic, from_date=from_date, to_date=to_date)
+
+    def get_unfinished(self, comic):
+        try:
+            return self.get(comic=comic, finished=False)
+        except self.model.DoesNotExist:
+            return None
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CrawlJob',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False,
+                    auto_created=True, primary_key=True)),
+                ('pub_date', models.DateField(
+                    verbose_name=b'publication date')),
+                ('state', models.CharField(default=b'pending', max_length=10,
+                    db_index=True, choices=[
+                        (b'pending', b'Pending'), (b'running', b'Running'),
+                        (b'done', b'Done'), (b'failed', b'Failed')])),
+                ('attempts', models.PositiveIntegerField(default=0,
+                    help_text=b'Number of times the job has been claimed by '
+                    b'a worker')),
+                ('lease_expires', models.DateTimeField(
+                    help_text=b'Time the job may be claimed by another '
+                    b'worker', null=True, blank=True)),
+                ('worker', models.CharField(
+                    help_text=b'Worker which last claimed the job',
+                    max_length=100, blank=True)),
+                ('error', models.TextField(blank=True)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('comic', models.ForeignKey(to='core.Comic')),
+            ],
+            options={
+                'db_table': 'comics_crawljob',
+            },
+            bases=(models.Model,),
+        ),
+        migrations.AlterUniqueTogether(
+            name='crawljob',
+            unique_together=set([('comic', 'pub_date')]),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+        ('aggregator', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageSource',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False,
+                    auto_created=True, primary_key=True)),
+                ('url', models.TextField(verbose_name=b'URL')),
+                ('url_hash', models.CharField(
+                    help_text=b'SHA-1 of the URL, for looking up the URL',
+                    max_length=40, verbose_name=b'URL hash')),
+                ('checksum', models.CharField(max_length=64)),
+                ('etag', models.CharField(max_length=255, verbose_name=b'ETag',
+                    blank=True)),
+                ('last_modified', models.CharField(max_length=64,
+                    blank=True)),
+                ('content_length', models.BigIntegerField(null=True,
+                    blank=True)),
+                ('last_fetched', models.DateTimeField(auto_now=True)),
+                ('comic', models.ForeignKey(to='core.Comic')),
+            ],
+            options={
+                'db_table': 'comics_imagesource',
+            },
+            bases=(models.Model,),
+        ),
+        migrations.AlterUniqueTogether(
+            name='imagesource',
+            unique_together=set([('comic', 'url_hash')]),
+        ),
+    ]
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+        ('aggregator', '0002_imagesource'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CrawlProgress',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False,
+                    auto_created=True, primary_key=True)),
+                ('from_date', models.DateField()),
+                ('to_date', models.DateField()),
+                ('last_pub_date', models.DateField(
+                    help_text=b'All dates in the range up to this date have '
+                    b'been crawled', null=True, blank=True)),
+                ('finished', models.BooleanField(default=False)),
+                ('started', models.DateTimeField(auto_now_add=True)),
+                ('updated', models.DateTimeField(auto_now=True)),
+                ('comic', models.OneToOneField(to='core.Comic')),
+            ],
+            options={
+                'db_table': 'comics_crawlprogress',
+                'verbose_name_plural': 'crawl progress',
+            },
+            bases=(models.Model,),
+        ),
+        migrations.CreateModel(
+            name='CrawlFailure',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False,
+                    auto_created=True, primary_key=True)),
+                ('pub_date', models.DateField(
+                    verbose_name=b'publication date')),
+                ('error', models.TextField()),
+                ('progress', models.ForeignKey(
+                    related_name='failures',
+                    to='aggregator.CrawlProgress')),
+            ],
+            options={
+                'db_table': 'comics_crawlfailure',
+            },
+            bases=(models.Model,),
+        ),
+        migrations.AlterUniqueTogether(
+            name='crawlfailure',
+            unique_together=set([('progress', 'pub_date')]),
+        ),
+    ]
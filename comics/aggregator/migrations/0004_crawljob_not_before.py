@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('aggregator', '0003_crawlprogress'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='crawljob',
+            name='not_before',
+            field=models.DateTimeField(
+                help_text=b'Time before which a retried job may not be '
+                b'claimed', null=True, blank=True),
+            preserve_default=True,
+        ),
+    ]
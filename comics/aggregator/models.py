@@ -0,0 +1,191 @@
+import datetime
+
+from django.conf import settings
+from django.db import models
+from django.utils import timezone
+
+from comics.aggregator.managers import (
+    CrawlJobManager, CrawlProgressManager, ImageSourceManager)
+from comics.core.models import Comic
+
+
+class CrawlJob(models.Model):
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATES = (
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    )
+
+    # Required fields
+    comic = models.ForeignKey(Comic)
+    pub_date = models.DateField(verbose_name='publication date')
+
+    # Automatically populated fields
+    state = models.CharField(
+        max_length=10, choices=STATES, default=PENDING, db_index=True)
+    attempts = models.PositiveIntegerField(
+        default=0,
+        help_text='Number of times the job has been claimed by a worker')
+    lease_expires = models.DateTimeField(
+        blank=True, null=True,
+        help_text='Time the job may be claimed by another worker')
+    not_before = models.DateTimeField(
+        blank=True, null=True,
+        help_text='Time before which a retried job may not be claimed')
+    worker = models.CharField(
+        max_length=100, blank=True,
+        help_text='Worker which last claimed the job')
+    error = models.TextField(blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+
+    objects = CrawlJobManager()
+
+    class Meta:
+        db_table = 'comics_crawljob'
+        unique_together = ('comic', 'pub_date')
+
+    def __unicode__(self):
+        return u'Crawl job %s/%s' % (self.comic.slug, self.pub_date)
+
+    def finish(self, error=''):
+        return self._set_state(self.DONE, error)
+
+    def fail(self, error):
+        return self._set_state(self.FAILED, error)
+
+    def retry(self, error):
+        if self.attempts >= settings.COMICS_CRAWL_JOB_MAX_ATTEMPTS:
+            return self.fail(error)
+        # The wait is doubled for each attempt, so that the job isn't claimed
+        # again before the error has had time to go away
+        backoff = settings.COMICS_CRAWL_JOB_RETRY_BACKOFF * 2 ** max(
+            self.attempts - 1, 0)
+        return self._set_state(
+            self.PENDING, error,
+            not_before=timezone.now() + datetime.timedelta(seconds=backoff))
+
+    def _set_state(self, state, error, not_before=None):
+        # Only update the job if it hasn't been claimed by another worker
+        # since we claimed it
+        self.state = state
+        self.error = error
+        self.lease_expires = None
+        self.not_before = not_before
+        return CrawlJob.objects.filter(
+            pk=self.pk, worker=self.worker, attempts=self.attempts).update(
+            state=self.state, error=self.error,
+            lease_expires=self.lease_expires,
+            not_before=self.not_before) == 1
+
+
+class ImageSource(models.Model):
+    """The URL an image was downloaded from, with its validators
+
+    Used for asking the server if the image at the URL has changed, instead of
+    downloading it again to learn its checksum.
+    """
+
+    # Required fields
+    comic = models.ForeignKey(Comic)
+    url = models.TextField(verbose_name='URL')
+    url_hash = models.CharField(
+        max_length=40, verbose_name='URL hash',
+        help_text='SHA-1 of the URL, for looking up the URL')
+    checksum = models.CharField(max_length=64)
+
+    # Optional fields
+    etag = models.CharField(max_length=255, blank=True, verbose_name='ETag')
+    last_modified = models.CharField(max_length=64, blank=True)
+    content_length = models.BigIntegerField(blank=True, null=True)
+
+    # Automatically populated fields
+    last_fetched = models.DateTimeField(auto_now=True)
+
+    objects = ImageSourceManager()
+
+    class Meta:
+        db_table = 'comics_imagesource'
+        unique_together = ('comic', 'url_hash')
+
+    def __unicode__(self):
+        return u'Image source %s/%s' % (self.comic.slug, self.url)
+
+    def get_conditional_headers(self):
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+    def is_unchanged(self, status, headers):
+        """Whether a response to a conditional request has the same image"""
+
+        if status == 304:
+            return True
+        # Some servers ignore conditional requests, but still send the same
+        # ETag for the same image
+        return bool(
+            self.etag and headers.get('etag') == self.etag and
+            self.content_length is not None and
+            headers.get('content-length') == str(self.content_length))
+
+
+class CrawlProgress(models.Model):
+    """How far the aggregator got when it last crawled a date range
+
+    Saved while crawling, so that an interrupted crawl can be resumed.
+    """
+
+    # Required fields
+    comic = models.OneToOneField(Comic)
+    from_date = models.DateField()
+    to_date = models.DateField()
+
+    # Automatically populated fields
+    last_pub_date = models.DateField(
+        blank=True, null=True,
+        help_text='All dates in the range up to this date have been crawled')
+    finished = models.BooleanField(default=False)
+    started = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True)
+
+    objects = CrawlProgressManager()
+
+    class Meta:
+        db_table = 'comics_crawlprogress'
+        verbose_name_plural = 'crawl progress'
+
+    def __unicode__(self):
+        return u'Crawl progress %s/%s..%s' % (
+            self.comic.slug, self.from_date, self.to_date)
+
+    def get_resume_date(self):
+        """The first date which has not been crawled, or has failed"""
+
+        if self.last_pub_date is None:
+            resume_date = self.from_date
+        else:
+            resume_date = self.last_pub_date + datetime.timedelta(days=1)
+        failed_dates = self.failures.values_list('pub_date', flat=True)
+        return min([resume_date] + list(failed_dates))
+
+
+class CrawlFailure(models.Model):
+    # Required fields
+    progress = models.ForeignKey(CrawlProgress, related_name='failures')
+    pub_date = models.DateField(verbose_name='publication date')
+    error = models.TextField()
+
+    class Meta:
+        db_table = 'comics_crawlfailure'
+        unique_together = ('progress', 'pub_date')
+
+    def __unicode__(self):
+        return u'Crawl failure %s/%s' % (
+            self.progress.comic.slug, self.pub_date)
@@ -0,0 +1,66 @@
+import collections
+import threading
+
+from django.conf import settings
+
+
+class PageCache(object):
+    """LRU cache of parsed pages, bounded by number of entries and bytes
+
+    The size of a page is approximated by the size of the document it was
+    parsed from, as given by the ``size`` attribute of the cached object.
+    """
+
+    def __init__(self, max_entries=None, max_bytes=None):
+        if max_entries is None:
+            max_entries = settings.COMICS_PAGE_CACHE_MAX_ENTRIES
+        if max_bytes is None:
+            max_bytes = settings.COMICS_PAGE_CACHE_MAX_BYTES
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._pages = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._pages)
+
+    def __contains__(self, url):
+        return url in self._pages
+
+    def get(self, url):
+        with self._lock:
+            page = self._pages.pop(url, None)
+            if page is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._pages[url] = page
+            return page
+
+    def set(self, url, page):
+        with self._lock:
+            if url in self._pages:
+                self.bytes -= self._get_size(self._pages.pop(url))
+            self._pages[url] = page
+            self.bytes += self._get_size(page)
+            self._evict()
+
+    def clear(self):
+        with self._lock:
+            self._pages.clear()
+            self.bytes = 0
+
+    def _evict(self):
+        # Always keep the most recently added page, even if it alone is above
+        # the byte budget, as the crawler is about to use it
+        while len(self._pages) > 1 and (
+                len(self._pages) > self.max_entries or
+                self.bytes > self.max_bytes):
+            _, page = self._pages.popitem(last=False)
+            self.bytes -= self._get_size(page)
+
+    def _get_size(self, page):
+        return getattr(page, 'size', 0)
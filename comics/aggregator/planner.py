@@ -0,0 +1,48 @@
+"""Plans which dates to crawl for a comic"""
+
+import datetime
+
+from comics.aggregator.utils import parse_schedule
+
+
+def date_range(from_date, to_date):
+    pub_date = from_date
+    while pub_date <= to_date:
+        yield pub_date
+        pub_date += datetime.timedelta(days=1)
+
+
+def get_weekday(date):
+    # Sunday is 0, as in SCHEDULE_DAYS
+    return date.isoweekday() % 7
+
+
+class CrawlPlan(object):
+    """The dates in a date range which should be crawled
+
+    Dates in ``existing_pub_dates`` are skipped. If ``schedule`` is given,
+    dates on weekdays the comic is not published are skipped too. Comics
+    without a schedule are crawled every day.
+    """
+
+    def __init__(
+            self, from_date, to_date, existing_pub_dates=None, schedule=None):
+        self.pub_dates = []
+        self.num_existing = 0
+        self.num_unscheduled = 0
+
+        weekdays = parse_schedule(schedule)
+        for pub_date in date_range(from_date, to_date):
+            if (existing_pub_dates is not None and
+                    pub_date in existing_pub_dates):
+                self.num_existing += 1
+            elif weekdays and get_weekday(pub_date) not in weekdays:
+                self.num_unscheduled += 1
+            else:
+                self.pub_dates.append(pub_date)
+
+    def __iter__(self):
+        return iter(self.pub_dates)
+
+    def __len__(self):
+        return len(self.pub_dates)
@@ -0,0 +1,81 @@
+"""Progress of crawling a date range, saved so that the crawl can be resumed"""
+
+import datetime
+import logging
+import time
+
+from django.conf import settings
+
+from comics.aggregator.httpclient import http_client
+from comics.aggregator.models import CrawlFailure, CrawlProgress
+
+logger = logging.getLogger('comics.aggregator.progress')
+
+
+class ProgressTracker(object):
+    """Saves checkpoints of crawling a date range, and reports the progress
+
+    The checkpoint is the last date which has been crawled with all earlier
+    dates in the range. It is saved, and the progress logged, every
+    ``COMICS_CRAWL_PROGRESS_INTERVAL`` seconds. Failed dates are saved when
+    they fail, so that they are crawled again when resuming.
+    """
+
+    def __init__(self, progress, num_dates):
+        self.progress = progress
+        self.num_dates = num_dates
+        self.num_done = 0
+        self._start_time = time.time()
+        self._start_bytes = http_client.bytes_read
+        self._last_saved = self._start_time
+        self._checkpoint = progress.last_pub_date
+
+    @classmethod
+    def start(cls, comic, from_date, to_date, num_dates):
+        return cls(
+            CrawlProgress.objects.start(comic, from_date, to_date), num_dates)
+
+    @classmethod
+    def resume(cls, progress, num_dates):
+        # The failed dates are crawled again
+        progress.failures.all().delete()
+        return cls(progress, num_dates)
+
+    def date_done(self):
+        self.num_done += 1
+
+    def advance(self, pub_date):
+        """Move the checkpoint to ``pub_date``"""
+
+        self._checkpoint = pub_date
+        if time.time() - self._last_saved >= (
+                settings.COMICS_CRAWL_PROGRESS_INTERVAL):
+            self.save()
+            logger.info(
+                '%s: %s', self.progress.comic.slug, self.get_report())
+
+    def fail(self, pub_date, error):
+        CrawlFailure.objects.get_or_create(
+            progress=self.progress, pub_date=pub_date,
+            defaults={'error': error})
+
+    def save(self, finished=False):
+        self._last_saved = time.time()
+        self.progress.last_pub_date = self._checkpoint
+        self.progress.finished = finished
+        self.progress.save()
+
+    def get_report(self):
+        elapsed = max(float(time.time() - self._start_time), 0.001)
+        dates_per_second = self.num_done / elapsed
+        bytes_per_second = (http_client.bytes_read - self._start_bytes) / (
+            elapsed)
+        report = '%d of %d dates (%.1f%%), %.2f dates/s, %.1f KB/s' % (
+            self.num_done, self.num_dates,
+            100.0 * self.num_done / max(self.num_dates, 1),
+            dates_per_second, bytes_per_second / 1024)
+        if dates_per_second > 0 and self.num_done < self.num_dates:
+            eta = datetime.timedelta(seconds=int(
+                (self.num_dates - self.num_done) / dates_per_second))
+            report += ', ETA %s' % eta
+        return report
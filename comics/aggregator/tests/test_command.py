@@ -1,12 +1,18 @@
 import datetime
+import threading
+import time
+from multiprocessing.pool import ThreadPool
+
 import mock
 
+from django.db import DatabaseError
 from django.test import TestCase
 
 from comics.aggregator import command
 from comics.aggregator.crawler import CrawlerRelease
-from comics.aggregator.exceptions import ComicsError
-from comics.core.models import Comic
+from comics.aggregator.exceptions import ComicsError, CrawlerHTTPError
+from comics.aggregator.models import CrawlProgress
+from comics.core.models import Comic, Release
 
 
 def create_comics():
@@ -62,6 +68,36 @@ class AggregatorConfigTestCase(TestCase):
         self.cc.to_date = datetime.date(2008, 3, 10)
         self.assertRaises(ComicsError, self.cc._validate_dates)
 
+    def test_set_workers(self):
+        self.cc.set_workers('4')
+        self.assertEquals(4, self.cc.workers)
+
+    def test_set_workers_default(self):
+        self.cc.set_workers(None)
+        self.assertEquals(1, self.cc.workers)
+
+    def test_set_workers_invalid(self):
+        self.assertRaises(ComicsError, self.cc.set_workers, 0)
+
+    def test_set_deadline(self):
+        self.cc.set_deadline('600')
+        self.assertEquals(600, self.cc.deadline)
+
+    def test_set_deadline_invalid(self):
+        self.assertRaises(ComicsError, self.cc.set_deadline, 0)
+
+    def test_set_deadline_when_running_as_daemon_is_invalid(self):
+        self.cc.daemon = True
+        self.assertRaises(ComicsError, self.cc.set_deadline, 600)
+
+    def test_set_resume(self):
+        self.cc.set_resume(True)
+        self.assertTrue(self.cc.resume)
+
+    def test_set_resume_with_dates_is_invalid(self):
+        self.cc.from_date = datetime.date(2008, 3, 11)
+        self.assertRaises(ComicsError, self.cc.set_resume, True)
+
     def test_get_comic_by_slug_valid(self):
         expected = Comic.objects.get(slug='xkcd')
         result = self.cc._get_comic_by_slug('xkcd')
@@ -96,10 +132,10 @@ class ComicAggregatorTestCase(TestCase):
         self.aggregator = command.Aggregator(config)
         self.aggregator.identifier = 'slug'
 
-        self.comic = mock.Mock()
-        self.comic.slug = 'slug'
+        self.comic = Comic.objects.get(slug='xkcd')
         self.crawler_mock = mock.Mock()
         self.crawler_mock.comic = self.comic
+        self.crawler_mock.time_budget = None
         self.downloader_mock = mock.Mock()
 
     def test_init(self):
@@ -177,3 +213,309 @@ class ComicAggregatorTestCase(TestCase):
 
     def test_start(self):
         pass  # TODO
+
+    def test_get_existing_pub_dates(self):
+        comic = Comic.objects.get(slug='xkcd')
+        for day in (1, 3, 10):
+            Release.objects.create(
+                comic=comic, pub_date=datetime.date(2008, 3, day))
+
+        with self.assertNumQueries(1):
+            result = self.aggregator._get_existing_pub_dates(
+                comic, datetime.date(2008, 3, 1), datetime.date(2008, 3, 5))
+
+        self.assertEquals(
+            set([datetime.date(2008, 3, 1), datetime.date(2008, 3, 3)]),
+            result)
+
+    def test_aggregate_one_comic_skips_existing_dates(self):
+        self.crawler_mock.multiple_releases_per_day = False
+        self.crawler_mock.get_crawler_release.return_value = None
+        self.aggregator._get_crawler = lambda comic: self.crawler_mock
+        self.aggregator._get_valid_date = lambda crawler, date: (
+            datetime.date(2008, 3, 1) if date is None else date)
+        self.aggregator.config.to_date = datetime.date(2008, 3, 3)
+        self.aggregator._get_existing_pub_dates = mock.Mock(
+            return_value=set([datetime.date(2008, 3, 2)]))
+
+        self.aggregator._aggregate_one_comic(self.comic)
+
+        self.assertEqual(
+            [mock.call(datetime.date(2008, 3, 1)),
+             mock.call(datetime.date(2008, 3, 3))],
+            self.crawler_mock.get_crawler_release.call_args_list)
+        self.assertEqual(1, self.aggregator.stats['dates_skipped'])
+
+    def test_fill_gaps_crawls_missing_scheduled_dates_since_latest(self):
+        comic = Comic.objects.get(slug='xkcd')
+        Release.objects.create(comic=comic, pub_date=datetime.date(2014, 6, 2))
+        Release.objects.create(comic=comic, pub_date=datetime.date(2014, 6, 4))
+        self.crawler_mock.comic = comic
+        self.crawler_mock.multiple_releases_per_day = False
+        self.crawler_mock.schedule = 'Mo,We,Fr'
+        self.crawler_mock.get_crawler_release.return_value = None
+        self.aggregator._get_crawler = lambda comic: self.crawler_mock
+        self.aggregator._get_valid_date = lambda crawler, date: (
+            datetime.date(2014, 6, 9) if date is None else date)
+        self.aggregator.config.set_fill_gaps(True)
+
+        self.aggregator._aggregate_one_comic(comic)
+
+        self.assertEqual(
+            [mock.call(datetime.date(2014, 6, 6)),
+             mock.call(datetime.date(2014, 6, 9))],
+            self.crawler_mock.get_crawler_release.call_args_list)
+        self.assertEqual(1, self.aggregator.stats['dates_skipped'])
+        self.assertEqual(3, self.aggregator.stats['dates_unscheduled'])
+
+    def test_prefetched_releases_are_downloaded_in_order(self):
+        releases = [
+            CrawlerRelease(self.comic, datetime.date(2008, 3, day))
+            for day in (1, 2, 3)]
+        self.crawler_mock.multiple_releases_per_day = True
+        self.crawler_mock.get_crawler_release.side_effect = releases
+        self.aggregator._get_crawler = lambda comic: self.crawler_mock
+        self.aggregator._get_valid_date = lambda crawler, date: (
+            datetime.date(2008, 3, 1) if date is None else date)
+        self.aggregator.config.to_date = datetime.date(2008, 3, 3)
+        self.aggregator._get_downloader = lambda: self.downloader_mock
+        self.aggregator._prefetcher = mock.Mock()
+
+        with self.settings(COMICS_IMAGE_PREFETCH_THREADS=2):
+            self.aggregator._aggregate_one_comic(self.comic)
+
+        self.assertEqual(3, self.aggregator._prefetcher.prefetch.call_count)
+        self.assertEqual(
+            [call[0][0] for call in
+             self.downloader_mock.download.call_args_list],
+            releases)
+
+    def test_dates_are_prefetched_ahead_of_crawling(self):
+        events = []
+        self.crawler_mock.multiple_releases_per_day = True
+        self.crawler_mock.prefetch.side_effect = lambda pub_date: (
+            events.append(('prefetch', pub_date)))
+        self.crawler_mock.get_crawler_release.side_effect = lambda pub_date: (
+            events.append(('crawl', pub_date)))
+        self.aggregator._get_crawler = lambda comic: self.crawler_mock
+        self.aggregator._get_valid_date = lambda crawler, date: (
+            datetime.date(2008, 3, 1) if date is None else date)
+        self.aggregator.config.to_date = datetime.date(2008, 3, 3)
+        self.aggregator._crawl_prefetcher = ThreadPool(2)
+        self.addCleanup(self.aggregator.stop)
+
+        with self.settings(COMICS_CRAWLER_PREFETCH_DATES=2):
+            self.aggregator._aggregate_one_comic(self.comic)
+
+        pub_dates = [datetime.date(2008, 3, day) for day in (1, 2, 3)]
+        self.assertEqual(
+            [pub_date for (event, pub_date) in events if event == 'crawl'],
+            pub_dates)
+        for pub_date in pub_dates:
+            self.assertLess(
+                events.index(('prefetch', pub_date)),
+                events.index(('crawl', pub_date)))
+
+    def test_date_range_is_prepared_from_first_to_last_planned_date(self):
+        self.crawler_mock.multiple_releases_per_day = True
+        self.crawler_mock.get_crawler_release.return_value = None
+        self.aggregator._get_crawler = lambda comic: self.crawler_mock
+        self.aggregator._get_valid_date = lambda crawler, date: (
+            datetime.date(2008, 3, 1) if date is None else date)
+        self.aggregator.config.to_date = datetime.date(2008, 3, 3)
+
+        self.aggregator._aggregate_one_comic(self.comic)
+
+        self.crawler_mock.prepare_range.assert_called_once_with(
+            datetime.date(2008, 3, 1), datetime.date(2008, 3, 3))
+        self.assertEqual(3, self.crawler_mock.get_crawler_release.call_count)
+
+    def test_failed_prepare_range_falls_back_to_crawling_each_date(self):
+        self.crawler_mock.multiple_releases_per_day = True
+        self.crawler_mock.prepare_range.side_effect = ComicsError('Failed')
+        self.crawler_mock.get_crawler_release.return_value = None
+        self.aggregator._get_crawler = lambda comic: self.crawler_mock
+        self.aggregator._get_valid_date = lambda crawler, date: (
+            datetime.date(2008, 3, 1) if date is None else date)
+        self.aggregator.config.to_date = datetime.date(2008, 3, 3)
+
+        self.aggregator._aggregate_one_comic(self.comic)
+
+        self.assertEqual(3, self.crawler_mock.get_crawler_release.call_count)
+
+    def test_single_date_is_not_prepared_as_range(self):
+        self.crawler_mock.multiple_releases_per_day = True
+        self.crawler_mock.get_crawler_release.return_value = None
+        self.aggregator._get_crawler = lambda comic: self.crawler_mock
+        self.aggregator._get_valid_date = lambda crawler, date: (
+            datetime.date(2008, 3, 1))
+
+        self.aggregator._aggregate_one_comic(self.comic)
+
+        self.assertEqual(0, self.crawler_mock.prepare_range.call_count)
+
+    def test_failed_prefetch_is_ignored(self):
+        self.crawler_mock.prefetch.side_effect = Exception('Failed')
+
+        self.aggregator._prefetch_one_date(
+            self.crawler_mock, datetime.date(2008, 3, 1))
+
+    def test_crawling_stops_when_out_of_time(self):
+        self.crawler_mock.multiple_releases_per_day = True
+        self.crawler_mock.get_crawler_release.return_value = None
+        self.crawler_mock.time_budget = 60
+        self.aggregator._get_crawler = lambda comic: self.crawler_mock
+        self.aggregator._get_valid_date = lambda crawler, date: (
+            datetime.date(2008, 3, 1) if date is None else date)
+        self.aggregator.config.to_date = datetime.date(2008, 3, 3)
+        with mock.patch('comics.aggregator.command.time') as time:
+            time.time.side_effect = [1000, 1000, 1030, 1061]
+            self.aggregator._aggregate_one_comic(self.comic)
+
+        self.assertEqual(2, self.crawler_mock.get_crawler_release.call_count)
+        self.assertEqual(1, self.aggregator.stats['comics_out_of_time'])
+
+    def test_deadline_limits_time_budget(self):
+        self.crawler_mock.time_budget = 60
+        self.aggregator._deadline = 1010
+
+        with mock.patch('comics.aggregator.command.time') as time:
+            time.time.return_value = 1000
+            self.assertEqual(
+                1010, self.aggregator._get_stop_time(self.crawler_mock))
+
+    def test_comics_are_crawled_without_time_limit_by_default(self):
+        self.crawler_mock.time_budget = None
+
+        self.assertIsNone(self.aggregator._get_stop_time(self.crawler_mock))
+
+    def test_date_range_progress_and_failures_are_saved(self):
+        failure = CrawlerHTTPError('xkcd/2008-03-02', 500)
+        self.crawler_mock.multiple_releases_per_day = True
+        self.crawler_mock.get_crawler_release.side_effect = [
+            None, failure, None]
+        self.aggregator._get_crawler = lambda comic: self.crawler_mock
+        self.aggregator._get_valid_date = lambda crawler, date: (
+            datetime.date(2008, 3, 1) if date is None else date)
+        self.aggregator.config.to_date = datetime.date(2008, 3, 3)
+
+        self.aggregator._aggregate_one_comic(self.comic)
+
+        progress = CrawlProgress.objects.get(comic=self.comic)
+        self.assertTrue(progress.finished)
+        self.assertEqual(datetime.date(2008, 3, 3), progress.last_pub_date)
+        self.assertEqual(
+            [datetime.date(2008, 3, 2)],
+            [f.pub_date for f in progress.failures.all()])
+
+    def test_failures_with_non_ascii_messages_are_saved(self):
+        failure = CrawlerHTTPError(u'xkcd/2008-03-02', u'Fant ikke \xf8')
+        self.crawler_mock.multiple_releases_per_day = True
+        self.crawler_mock.get_crawler_release.side_effect = [
+            None, failure, None]
+        self.aggregator._get_crawler = lambda comic: self.crawler_mock
+        self.aggregator._get_valid_date = lambda crawler, date: (
+            datetime.date(2008, 3, 1) if date is None else date)
+        self.aggregator.config.to_date = datetime.date(2008, 3, 3)
+
+        self.aggregator._aggregate_one_comic(self.comic)
+
+        failure = CrawlProgress.objects.get(comic=self.comic).failures.get()
+        self.assertIn(u'Fant ikke \xf8', failure.error)
+
+    def test_failing_to_save_a_failed_date_does_not_stop_crawling(self):
+        self.crawler_mock.multiple_releases_per_day = True
+        self.crawler_mock.get_crawler_release.side_effect = [
+            None, CrawlerHTTPError('xkcd/2008-03-02', 500), None]
+        self.aggregator._get_crawler = lambda comic: self.crawler_mock
+        self.aggregator._get_valid_date = lambda crawler, date: (
+            datetime.date(2008, 3, 1) if date is None else date)
+        self.aggregator.config.to_date = datetime.date(2008, 3, 3)
+
+        with mock.patch.object(
+                command.ProgressTracker, 'fail',
+                side_effect=DatabaseError('Failed')):
+            self.aggregator._aggregate_one_comic(self.comic)
+
+        self.assertEqual(3, self.crawler_mock.get_crawler_release.call_count)
+        self.assertTrue(CrawlProgress.objects.get(comic=self.comic).finished)
+
+    def test_interrupted_date_range_is_resumed(self):
+        self.crawler_mock.multiple_releases_per_day = True
+        self.crawler_mock.get_crawler_release.side_effect = [
+            None, KeyboardInterrupt]
+        self.aggregator._get_crawler = lambda comic: self.crawler_mock
+        self.aggregator._get_valid_date = lambda crawler, date: (
+            datetime.date(2008, 3, 1) if date is None else date)
+        self.aggregator.config.to_date = datetime.date(2008, 3, 3)
+
+        with self.assertRaises(KeyboardInterrupt):
+            self.aggregator._aggregate_one_comic(self.comic)
+
+        progress = CrawlProgress.objects.get(comic=self.comic)
+        self.assertFalse(progress.finished)
+        self.assertEqual(datetime.date(2008, 3, 1), progress.last_pub_date)
+
+        self.crawler_mock.get_crawler_release.reset_mock()
+        self.crawler_mock.get_crawler_release.side_effect = None
+        self.crawler_mock.get_crawler_release.return_value = None
+        self.aggregator.config.to_date = None
+        self.aggregator.config.set_resume(True)
+        self.aggregator._aggregate_one_comic(self.comic)
+
+        self.assertEqual(
+            [mock.call(datetime.date(2008, 3, 2)),
+             mock.call(datetime.date(2008, 3, 3))],
+            self.crawler_mock.get_crawler_release.call_args_list)
+        self.assertTrue(CrawlProgress.objects.get(comic=self.comic).finished)
+
+    def test_resume_skips_comics_without_unfinished_crawl(self):
+        self.aggregator._get_crawler = lambda comic: self.crawler_mock
+        self.aggregator.config.set_resume(True)
+
+        self.aggregator._aggregate_one_comic(self.comic)
+
+        self.assertEqual(0, self.crawler_mock.get_crawler_release.call_count)
+
+    def test_workers_aggregate_every_selected_comic(self):
+        aggregated = []
+        lock = threading.Lock()
+
+        def aggregate_one_comic(comic):
+            with lock:
+                aggregated.append(
+                    (comic.slug, self.aggregator.identifier,
+                     threading.current_thread().name))
+
+        self.aggregator._aggregate_one_comic = aggregate_one_comic
+        self.aggregator.config.workers = 3
+        self.aggregator.aggregate(self.aggregator.config.comics)
+
+        slugs = sorted(comic.slug for comic in self.aggregator.config.comics)
+        self.assertEqual(slugs, sorted(slug for slug, _, _ in aggregated))
+        for slug, identifier, thread_name in aggregated:
+            self.assertEqual(slug, identifier)
+            self.assertNotEqual(
+                threading.current_thread().name, thread_name)
+        self.assertIsNone(self.aggregator._pool)
+
+    def test_stop_waits_for_the_workers_to_finish(self):
+        finished = []
+
+        def aggregate_one_comic(comic):
+            # As if crawling until stopped, then saving the progress
+            self.aggregator._stopped.wait(5)
+            time.sleep(0.1)
+            finished.append(comic.slug)
+
+        self.aggregator._aggregate_one_comic = aggregate_one_comic
+        self.aggregator.config.workers = 2
+        # As if interrupted while waiting for the workers
+        with mock.patch.object(
+                command.Aggregator, '_wait_for_workers',
+                side_effect=KeyboardInterrupt):
+            with self.assertRaises(KeyboardInterrupt):
+                self.aggregator.aggregate(self.aggregator.config.comics)
+        self.aggregator.stop()
+
+        self.assertEqual(['sinfest', 'xkcd'], sorted(finished))
@@ -1,10 +1,17 @@
 import datetime
 
+import mock
 import pytz
 
+from django.test import TestCase
 from django.utils import unittest
 
 from comics.aggregator import crawler
+from comics.aggregator.exceptions import (
+    CrawlerHTTPError, ReleaseAlreadyExists)
+from comics.aggregator.httpclient import HttpClientError
+from comics.aggregator.models import ImageSource
+from comics.core.models import Comic, Release
 
 
 class CurrentDateWhenLocalTZIsUTCTest(unittest.TestCase):
@@ -50,3 +57,171 @@ class CurrentDateWhenLocalTZIsESTTest(CurrentDateWhenLocalTZIsUTCTest):
     time_zone_local = 'America/New_York'
     time_zone_ahead = 'Europe/Moscow'
     time_zone_behind = 'America/Los_Angeles'
+
+
+class DateToCrawlTest(unittest.TestCase):
+    def setUp(self):
+        self.comic = mock.Mock()
+        self.comic.slug = 'slug'
+        self.crawler = crawler.CrawlerBase(self.comic)
+        self.crawler.history_capable_date = '2001-01-01'
+
+    def test_known_existing_date_is_not_queried(self):
+        self.crawler.existing_pub_dates = set([datetime.date(2001, 2, 3)])
+
+        self.assertRaises(
+            ReleaseAlreadyExists, self.crawler._get_date_to_crawl,
+            datetime.date(2001, 2, 3))
+        self.assertEqual(
+            datetime.date(2001, 2, 4),
+            self.crawler._get_date_to_crawl(datetime.date(2001, 2, 4)))
+        self.assertEqual(0, self.comic.release_set.filter.call_count)
+
+
+class RangeCrawler(crawler.CrawlerBase):
+    history_capable_date = '2001-01-01'
+    multiple_releases_per_day = True
+
+    def crawl(self, pub_date):
+        return crawler.CrawlerImage('http://example.com/single.png')
+
+    def crawl_range(self, from_date, to_date):
+        for day in (1, 3, 10):
+            yield (
+                datetime.date(2001, 2, day),
+                crawler.CrawlerImage('http://example.com/%d.png' % day))
+
+
+class PrepareRangeTest(unittest.TestCase):
+    def setUp(self):
+        self.comic = mock.Mock()
+        self.comic.slug = 'slug'
+
+    def test_range_results_are_used_for_dates_in_range(self):
+        range_crawler = RangeCrawler(self.comic)
+        self.assertTrue(range_crawler.prepare_range(
+            datetime.date(2001, 2, 1), datetime.date(2001, 2, 5)))
+
+        release = range_crawler.get_crawler_release(datetime.date(2001, 2, 3))
+        self.assertEqual(release.images[0].url, 'http://example.com/3.png')
+        self.assertIsNone(
+            range_crawler.get_crawler_release(datetime.date(2001, 2, 2)))
+        release = range_crawler.get_crawler_release(datetime.date(2001, 2, 6))
+        self.assertEqual(
+            release.images[0].url, 'http://example.com/single.png')
+
+    def test_crawler_without_crawl_range_crawls_each_date(self):
+        base_crawler = crawler.CrawlerBase(self.comic)
+
+        self.assertFalse(base_crawler.prepare_range(
+            datetime.date(2001, 2, 1), datetime.date(2001, 2, 5)))
+
+    def test_http_errors_are_wrapped(self):
+        range_crawler = RangeCrawler(self.comic)
+        range_crawler.crawl_range = mock.Mock(
+            side_effect=HttpClientError(500))
+
+        self.assertRaises(
+            CrawlerHTTPError, range_crawler.prepare_range,
+            datetime.date(2001, 2, 1), datetime.date(2001, 2, 5))
+
+
+class TemplateCrawlerTest(unittest.TestCase):
+    def setUp(self):
+        patcher = mock.patch('comics.aggregator.crawler.http_client')
+        self.http_client = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.comic = mock.Mock()
+        self.comic.slug = 'slug'
+        self.crawler = crawler.TemplateCrawlerBase(self.comic)
+        # As if the comic had no releases
+        self.crawler._image_url_confirmed = False
+        self.pub_date = datetime.date(2001, 2, 3)
+
+    def test_crawler_without_templates_raises_clear_error(self):
+        with self.assertRaisesRegexp(NotImplementedError, 'image_url'):
+            self.crawler.crawl(self.pub_date)
+
+    def test_image_url_is_formatted_with_date(self):
+        self.crawler.image_url = 'http://example.com/%Y/%m-%d.png'
+
+        image = self.crawler.crawl(self.pub_date)
+
+        self.assertEqual(image.url, 'http://example.com/2001/02-03.png')
+        self.http_client.open.assert_called_once_with(
+            'http://example.com/2001/02-03.png', {}, method='HEAD')
+
+    def test_missing_image_gives_no_release(self):
+        self.crawler.image_url = 'http://example.com/%Y-%m-%d.png'
+        self.http_client.open.side_effect = HttpClientError(404)
+
+        self.assertIsNone(self.crawler.crawl(self.pub_date))
+
+    def test_image_is_assumed_to_exist_if_head_is_unsupported(self):
+        self.crawler.image_url = 'http://example.com/%Y-%m-%d.png'
+        self.http_client.open.side_effect = HttpClientError(405)
+
+        self.assertIsNotNone(self.crawler.crawl(self.pub_date))
+
+    def test_prefetched_probe_is_not_repeated(self):
+        self.crawler.image_url = 'http://example.com/%Y-%m-%d.png'
+
+        self.crawler.prefetch(self.pub_date)
+        image = self.crawler.crawl(self.pub_date)
+
+        self.assertEqual(image.url, 'http://example.com/2001-02-03.png')
+        self.assertEqual(self.http_client.open.call_count, 1)
+
+    def test_image_is_found_on_page_from_template(self):
+        self.crawler.page_url = 'http://example.com/%Y/%m/%d/'
+        self.crawler.image_selector = 'img.strip'
+        page = mock.Mock()
+        page.src.return_value = 'http://example.com/strip.png'
+        self.crawler.parse_page = mock.Mock(return_value=page)
+
+        image = self.crawler.crawl(self.pub_date)
+
+        self.crawler.parse_page.assert_called_once_with(
+            'http://example.com/2001/02/03/')
+        page.src.assert_called_once_with('img.strip')
+        self.assertEqual(image.url, 'http://example.com/strip.png')
+
+    def test_prefetched_page_is_cached(self):
+        self.crawler.page_url = 'http://example.com/%Y/%m/%d/'
+        with mock.patch('comics.aggregator.crawler.LxmlParser') as parser:
+            self.crawler.prefetch(self.pub_date)
+            self.crawler.prefetch(self.pub_date)
+
+        self.assertEqual(parser.call_count, 1)
+        self.assertIn('http://example.com/2001/02/03/', self.crawler.pages)
+
+
+class TemplateCrawlerConfirmedImageUrlTest(TestCase):
+    def setUp(self):
+        patcher = mock.patch('comics.aggregator.crawler.http_client')
+        self.http_client = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.comic = Comic.objects.create(slug='slug')
+        self.crawler = crawler.TemplateCrawlerBase(self.comic)
+        self.crawler.image_url = 'http://example.com/%Y-%m-%d.png'
+        Release.objects.create(
+            comic=self.comic, pub_date=datetime.date(2001, 2, 2))
+
+    def test_image_is_not_probed_if_latest_release_used_image_url(self):
+        ImageSource.objects.record(
+            self.comic, 'http://example.com/2001-02-02.png', {}, 'abc')
+
+        image = self.crawler.crawl(datetime.date(2001, 2, 3))
+        self.crawler.prefetch(datetime.date(2001, 2, 4))
+
+        self.assertEqual(image.url, 'http://example.com/2001-02-03.png')
+        self.assertEqual(self.http_client.open.call_count, 0)
+
+    def test_image_is_probed_if_latest_release_used_other_url(self):
+        ImageSource.objects.record(
+            self.comic, 'http://example.com/other.png', {}, 'abc')
+
+        self.crawler.crawl(datetime.date(2001, 2, 3))
+
+        self.http_client.open.assert_called_once_with(
+            'http://example.com/2001-02-03.png', {}, method='HEAD')
@@ -0,0 +1,112 @@
+import datetime
+
+import mock
+import pytz
+
+from django.test import TestCase
+from django.test.utils import override_settings
+from django.utils import unittest
+
+from comics.aggregator import daemon
+from comics.core.models import Comic, Release
+
+OSLO = pytz.timezone('Europe/Oslo')
+
+
+def oslo_time(*args):
+    return OSLO.localize(datetime.datetime(*args)).astimezone(pytz.utc)
+
+
+class ReleaseWindowTest(unittest.TestCase):
+    def test_window_is_learned_from_fetch_times(self):
+        releases = [
+            (datetime.date(2014, 6, day), oslo_time(2014, 6, day, 6, minute))
+            for day, minute in zip(range(1, 11), range(0, 50, 5))]
+
+        window = daemon.ReleaseWindow.learn(releases, 'Europe/Oslo')
+
+        self.assertEqual(
+            window.start, datetime.timedelta(hours=6, minutes=5 - 30))
+        self.assertEqual(
+            window.end, datetime.timedelta(hours=6, minutes=45 + 30))
+        self.assertEqual(
+            window.get_times(datetime.date(2014, 7, 1), 'Europe/Oslo'),
+            (oslo_time(2014, 7, 1, 5, 35), oslo_time(2014, 7, 1, 7, 15)))
+
+    def test_backfilled_releases_are_ignored(self):
+        releases = [
+            (datetime.date(2010, 1, day), oslo_time(2014, 6, 1, 6))
+            for day in range(1, 11)]
+
+        self.assertIsNone(daemon.ReleaseWindow.learn(releases, 'UTC'))
+
+
+@override_settings(
+    COMICS_DAEMON_ACTIVE_INTERVAL=600,
+    COMICS_DAEMON_IDLE_INTERVAL=6 * 3600,
+    COMICS_DAEMON_DEFAULT_INTERVAL=3600)
+class AggregatorDaemonTest(TestCase):
+    def setUp(self):
+        self.comic = Comic.objects.create(slug='xkcd')
+        crawler = mock.Mock()
+        crawler.time_zone = 'Europe/Oslo'
+        crawler.schedule = 'Mo,We,Fr'
+        patcher = mock.patch('comics.aggregator.daemon.get_comic_module')
+        patcher.start().return_value.Crawler.return_value = crawler
+        self.addCleanup(patcher.stop)
+        self.daemon = daemon.AggregatorDaemon(mock.Mock())
+
+    def create_releases(self, first_date, num_releases):
+        # Releases fetched around 06:00 every Monday, Wednesday and Friday
+        pub_date = first_date
+        while num_releases:
+            if pub_date.isoweekday() in (1, 3, 5):
+                release = Release.objects.create(
+                    comic=self.comic, pub_date=pub_date)
+                Release.objects.filter(pk=release.pk).update(
+                    fetched=oslo_time(
+                        pub_date.year, pub_date.month, pub_date.day, 6))
+                num_releases -= 1
+            pub_date += datetime.timedelta(days=1)
+
+    def test_comic_without_history_is_polled_at_default_interval(self):
+        current_time = oslo_time(2014, 6, 2, 12)
+
+        self.assertEqual(
+            self.daemon.get_next_poll_time(self.comic, current_time),
+            current_time + datetime.timedelta(hours=1))
+
+    def test_comic_is_polled_often_within_window(self):
+        self.create_releases(datetime.date(2014, 5, 1), 10)
+        current_time = oslo_time(2014, 6, 2, 6)
+
+        self.assertEqual(
+            self.daemon.get_next_poll_time(self.comic, current_time),
+            current_time + datetime.timedelta(minutes=10))
+
+    def test_comic_is_polled_at_start_of_next_window(self):
+        self.create_releases(datetime.date(2014, 5, 1), 10)
+        current_time = oslo_time(2014, 6, 2, 3)
+
+        self.assertEqual(
+            self.daemon.get_next_poll_time(self.comic, current_time),
+            oslo_time(2014, 6, 2, 5, 30))
+
+    def test_comic_is_polled_rarely_outside_window(self):
+        # The latest release is from Monday 2014-06-02
+        self.create_releases(datetime.date(2014, 5, 12), 10)
+        current_time = oslo_time(2014, 6, 2, 8)
+
+        self.assertEqual(
+            self.daemon.get_next_poll_time(self.comic, current_time),
+            current_time + datetime.timedelta(hours=6))
+
+    def test_due_comics_are_popped(self):
+        current_time = oslo_time(2014, 6, 2, 6)
+        self.daemon._queue = [
+            (current_time, 1, 'a'),
+            (current_time + datetime.timedelta(hours=1), 2, 'b')]
+
+        with mock.patch.object(daemon, 'now', return_value=current_time):
+            self.assertEqual(self.daemon._pop_due_comics(), ['a'])
+        self.assertEqual(len(self.daemon._queue), 1)
@@ -0,0 +1,452 @@
+import hashlib
+import os
+import shutil
+import StringIO
+import tempfile
+
+import mock
+
+try:
+    from PIL import Image as PILImage
+except ImportError:
+    import Image as PILImage  # noqa
+
+from django.conf import settings
+from django.test import TestCase
+from django.test.utils import override_settings
+from django.utils import unittest
+
+from comics.aggregator.downloader import (
+    FetchedImage, ImageDownloader, ImagePrefetcher, ReleaseDownloader)
+from comics.aggregator.exceptions import (
+    DownloaderHTTPError, ImageIsBlacklisted, ImageIsCorrupt, ImageTooLarge,
+    ImageTypeError)
+from comics.aggregator.httpclient import HttpClientError
+from comics.aggregator.imagehash import image_hash_index
+from comics.aggregator.models import ImageSource
+from comics.core.models import Comic, Image, image_storage
+
+PNG_DATA = '\x89PNG\r\n\x1a\n' + 'x' * 200000
+
+
+def use_temp_media_root(test_case):
+    # The incoming directory is next to the media root, as by default
+    base_path = tempfile.mkdtemp()
+    test_case.addCleanup(shutil.rmtree, base_path)
+    media_root = os.path.join(base_path, 'media')
+    os.mkdir(media_root)
+    for attr in ('base_location', 'location'):
+        patcher = mock.patch.object(image_storage, attr, media_root)
+        patcher.start()
+        test_case.addCleanup(patcher.stop)
+    settings_override = override_settings(
+        COMICS_INCOMING_DIR=os.path.join(base_path, 'incoming'))
+    settings_override.enable()
+    test_case.addCleanup(settings_override.disable)
+    return media_root
+
+
+def create_http_file(data, headers=None, status=200):
+    http_file = mock.MagicMock()
+    http_file.__enter__.return_value = http_file
+    http_file.status = status
+    http_file.headers = headers or {}
+    http_file.read.side_effect = StringIO.StringIO(data).read
+    return http_file
+
+
+class ImageDownloaderDownloadImageTest(unittest.TestCase):
+    def setUp(self):
+        patcher = mock.patch('comics.aggregator.downloader.http_client')
+        self.http_client = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.media_root = use_temp_media_root(self)
+        self.downloader = ImageDownloader(mock.Mock())
+        self.downloader.identifier = 'slug/2001-02-03'
+
+    def test_image_is_written_to_temp_file_and_hashed(self):
+        self.http_client.open.return_value = create_http_file(PNG_DATA)
+
+        fetched_image = self.downloader._download_image(
+            'http://example.com/image.png', {})
+
+        self.assertEqual(fetched_image.image_file.read(), PNG_DATA)
+        self.assertEqual(
+            os.path.dirname(fetched_image.image_file.name),
+            settings.COMICS_INCOMING_DIR)
+        self.assertFalse(os.path.exists(
+            os.path.join(self.media_root, '.incoming')))
+        self.assertEqual(
+            fetched_image.checksum, hashlib.sha256(PNG_DATA).hexdigest())
+        fetched_image.close()
+
+    def test_conditional_request_is_made_for_known_source(self):
+        http_file = create_http_file('', status=304)
+        self.http_client.open.return_value = http_file
+        source = ImageSource(
+            checksum='abc', etag='"123"',
+            last_modified='Sat, 03 Feb 2001 00:00:00 GMT')
+
+        fetched_image = self.downloader._download_image(
+            'http://example.com/image.png', {'Referer': 'x'}, source)
+
+        self.http_client.open.assert_called_once_with(
+            'http://example.com/image.png', {
+                'Referer': 'x',
+                'If-None-Match': '"123"',
+                'If-Modified-Since': 'Sat, 03 Feb 2001 00:00:00 GMT',
+            })
+        self.assertTrue(fetched_image.unchanged)
+        self.assertEqual(fetched_image.checksum, 'abc')
+        self.assertEqual(http_file.read.call_count, 0)
+
+    def test_same_etag_and_length_is_unchanged_without_304(self):
+        self.http_client.open.return_value = create_http_file(
+            PNG_DATA, {'etag': '"123"', 'content-length': '200008'})
+        source = ImageSource(
+            checksum='abc', etag='"123"', content_length=200008)
+
+        fetched_image = self.downloader._download_image(
+            'http://example.com/image.png', {}, source)
+
+        self.assertTrue(fetched_image.unchanged)
+        self.assertEqual(fetched_image.checksum, 'abc')
+
+    def test_changed_image_is_downloaded_for_known_source(self):
+        self.http_client.open.return_value = create_http_file(
+            PNG_DATA, {'etag': '"456"', 'content-length': '200008'})
+        source = ImageSource(
+            checksum='abc', etag='"123"', content_length=200008)
+
+        fetched_image = self.downloader._download_image(
+            'http://example.com/image.png', {}, source)
+
+        self.assertFalse(fetched_image.unchanged)
+        self.assertEqual(
+            fetched_image.checksum, hashlib.sha256(PNG_DATA).hexdigest())
+        self.assertEqual(fetched_image.headers['etag'], '"456"')
+        fetched_image.close()
+
+    def test_non_image_content_type_is_rejected(self):
+        self.http_client.open.return_value = create_http_file(
+            '<html></html>', {'content-type': 'text/html; charset=utf-8'})
+
+        self.assertRaises(
+            ImageTypeError, self.downloader._download_image,
+            'http://example.com/image.png', {})
+
+    def test_non_image_data_is_rejected(self):
+        self.http_client.open.return_value = create_http_file(
+            '<html></html>', {'content-type': 'image/png'})
+
+        self.assertRaises(
+            ImageTypeError, self.downloader._download_image,
+            'http://example.com/image.png', {})
+
+    @override_settings(COMICS_MAX_IMAGE_SIZE=1000)
+    def test_too_large_content_length_is_rejected(self):
+        http_file = create_http_file(PNG_DATA, {'content-length': '200008'})
+        self.http_client.open.return_value = http_file
+
+        self.assertRaises(
+            ImageTooLarge, self.downloader._download_image,
+            'http://example.com/image.png', {})
+        self.assertEqual(http_file.read.call_count, 0)
+
+    @override_settings(COMICS_MAX_IMAGE_SIZE=100000)
+    def test_too_large_image_is_rejected_while_streaming(self):
+        self.http_client.open.return_value = create_http_file(PNG_DATA)
+
+        self.assertRaises(
+            ImageTooLarge, self.downloader._download_image,
+            'http://example.com/image.png', {})
+
+    def test_http_errors_are_wrapped(self):
+        self.http_client.open.side_effect = HttpClientError(404)
+
+        self.assertRaises(
+            DownloaderHTTPError, self.downloader._download_image,
+            'http://example.com/image.png', {})
+
+
+class ImagePrefetcherTest(TestCase):
+    def setUp(self):
+        patcher = mock.patch('comics.aggregator.downloader.http_client')
+        self.http_client = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.media_root = use_temp_media_root(self)
+        self.prefetcher = ImagePrefetcher(2)
+        self.addCleanup(self.prefetcher.close)
+        self.crawler_release = mock.Mock()
+        self.crawler_release.comic = Comic.objects.create(slug='xkcd')
+        self.crawler_release.identifier = 'xkcd/2001-02-03'
+        self.crawler_release.images = [mock.Mock(), mock.Mock()]
+        self.crawler_release.images[0].url = 'http://example.com/a.png'
+        self.crawler_release.images[1].url = 'http://example.com/b.png'
+        for crawler_image in self.crawler_release.images:
+            crawler_image.request_headers = {}
+
+    def test_images_are_fetched_in_the_background(self):
+        self.http_client.open.side_effect = lambda url, headers: (
+            create_http_file(PNG_DATA))
+
+        prefetched = self.prefetcher.prefetch(self.crawler_release)
+        fetched_images = prefetched.get_fetched_images()
+
+        self.assertEqual(len(fetched_images), 2)
+        for fetched_image in fetched_images:
+            self.assertEqual(fetched_image.image_file.read(), PNG_DATA)
+            self.assertEqual(
+                fetched_image.checksum, hashlib.sha256(PNG_DATA).hexdigest())
+            fetched_image.close()
+
+    def test_fetched_images_are_removed_if_another_image_fails(self):
+        def open(url, headers):
+            if url == 'http://example.com/missing.png':
+                raise HttpClientError(404)
+            return create_http_file(PNG_DATA)
+        self.http_client.open.side_effect = open
+        self.crawler_release.images[0].url = 'http://example.com/ok.png'
+        self.crawler_release.images[1].url = 'http://example.com/missing.png'
+
+        prefetched = self.prefetcher.prefetch(self.crawler_release)
+
+        self.assertRaises(DownloaderHTTPError, prefetched.get_fetched_images)
+        self.assertEqual(os.listdir(settings.COMICS_INCOMING_DIR), [])
+
+
+class ReleaseDownloaderTest(unittest.TestCase):
+    def test_fetched_images_are_closed_if_storing_fails(self):
+        downloader = ReleaseDownloader()
+        crawler_release = mock.Mock()
+        crawler_release.images = [mock.Mock(), mock.Mock()]
+        fetched_images = [
+            FetchedImage('abc', mock.MagicMock()),
+            FetchedImage('def', mock.MagicMock())]
+
+        with mock.patch.object(
+                ImageDownloader, 'store', side_effect=ImageIsCorrupt('x')):
+            self.assertRaises(
+                ImageIsCorrupt, downloader._download_images,
+                crawler_release, fetched_images)
+
+        for fetched_image in fetched_images:
+            self.assertEqual(fetched_image.image_file.close.call_count, 1)
+
+
+def create_image_file(width=20, height=10, format='PNG'):
+    image_file = tempfile.TemporaryFile()
+    PILImage.new('RGB', (width, height)).save(image_file, format)
+    image_file.seek(0)
+    return image_file
+
+
+class ImageDownloaderValidateImageTest(unittest.TestCase):
+    def setUp(self):
+        self.downloader = ImageDownloader(mock.Mock())
+        self.downloader.identifier = 'slug/2001-02-03'
+
+    def test_valid_image_gives_format_and_size(self):
+        with create_image_file(20, 10) as image_file:
+            image = self.downloader._validate_image(image_file)
+
+            self.assertEqual(image.format, 'PNG')
+            self.assertEqual(image.size, (20, 10))
+            self.assertEqual(image_file.tell(), 0)
+
+    def test_corrupt_image_is_rejected(self):
+        with create_image_file() as image_file:
+            data = image_file.read()
+            image_file.seek(0)
+            image_file.write(data[:30] + 'x' * (len(data) - 30))
+            image_file.seek(0)
+
+            self.assertRaises(
+                ImageIsCorrupt, self.downloader._validate_image, image_file)
+
+    @override_settings(COMICS_MAX_IMAGE_PIXELS=100)
+    def test_image_with_too_many_pixels_is_rejected(self):
+        with create_image_file(20, 10) as image_file:
+            self.assertRaises(
+                ImageTooLarge, self.downloader._validate_image, image_file)
+
+
+class ImageDownloaderCreateNewImageTest(TestCase):
+    def setUp(self):
+        self.media_root = use_temp_media_root(self)
+        self.comic = Comic.objects.create(slug='xkcd')
+        self.downloader = ImageDownloader(mock.Mock())
+
+    def test_image_is_saved_with_known_size(self):
+        with create_image_file(20, 10) as image_file:
+            with mock.patch('django.core.files.images.get_image_dimensions') \
+                    as get_image_dimensions:
+                image = self.downloader._create_new_image(
+                    comic=self.comic, title=u'Title', text=None,
+                    image_file=image_file, file_name='abc.png',
+                    checksum='abc', width=20, height=10)
+
+        self.assertEqual(get_image_dimensions.call_count, 0)
+        self.assertEqual(image.file.name, 'xkcd/a/abc.png')
+        self.assertEqual((image.width, image.height), (20, 10))
+        self.assertEqual(image.title, u'Title')
+        self.assertTrue(os.path.exists(
+            os.path.join(self.media_root, 'xkcd/a/abc.png')))
+
+    def test_downloaded_file_is_linked_into_place(self):
+        incoming_dir = self.downloader._get_incoming_dir()
+        with tempfile.NamedTemporaryFile(dir=incoming_dir) as image_file:
+            image_file.write('foo')
+            image_file.flush()
+            image = self.downloader._create_new_image(
+                comic=self.comic, title=None, text=None,
+                image_file=image_file, file_name='abc.png',
+                checksum='abc', width=20, height=10)
+
+            path = os.path.join(self.media_root, 'xkcd/a/abc.png')
+            self.assertEqual(image.file.name, 'xkcd/a/abc.png')
+            self.assertTrue(os.path.samefile(image_file.name, path))
+        self.assertEqual(open(path).read(), 'foo')
+        self.assertEqual(os.stat(path).st_mode & 0777, 0664)
+
+    def test_existing_file_with_same_name_is_replaced(self):
+        path = os.path.join(self.media_root, 'xkcd/a/abc.png')
+        os.makedirs(os.path.dirname(path))
+        with open(path, 'w') as fh:
+            fh.write('partial')
+        incoming_dir = self.downloader._get_incoming_dir()
+        with tempfile.NamedTemporaryFile(dir=incoming_dir) as image_file:
+            image_file.write('foo')
+            image_file.flush()
+            image = self.downloader._create_new_image(
+                comic=self.comic, title=None, text=None,
+                image_file=image_file, file_name='abc.png',
+                checksum='abc', width=20, height=10)
+
+        self.assertEqual(image.file.name, 'xkcd/a/abc.png')
+        self.assertEqual(open(path).read(), 'foo')
+        self.assertEqual(os.listdir(os.path.dirname(path)), ['abc.png'])
+
+
+class ImageDownloaderStoreTest(TestCase):
+    def setUp(self):
+        self.media_root = use_temp_media_root(self)
+        self.comic = Comic.objects.create(slug='xkcd')
+        self.crawler_release = mock.Mock()
+        self.crawler_release.comic = self.comic
+        self.crawler_release.identifier = 'xkcd/2001-02-03'
+        self.crawler_release.has_rerun_releases = True
+        self.crawler_image = mock.Mock()
+        self.crawler_image.url = 'http://example.com/image.png'
+        self.crawler_image.request_headers = {}
+        self.downloader = ImageDownloader(self.crawler_release)
+        image_hash_index.reset()
+        self.addCleanup(image_hash_index.reset)
+
+    def store_image_file(self, image_file):
+        checksum = hashlib.sha256(image_file.read()).hexdigest()
+        image_file.seek(0)
+        return self.downloader.store(
+            self.crawler_image, FetchedImage(checksum, image_file))
+
+    def test_source_of_stored_image_is_recorded(self):
+        with create_image_file() as image_file:
+            checksum = hashlib.sha256(image_file.read()).hexdigest()
+            image_file.seek(0)
+            image = self.downloader.store(
+                self.crawler_image, FetchedImage(checksum, image_file, {
+                    'etag': '"123"', 'content-length': '100'}))
+
+        source = ImageSource.objects.lookup(
+            self.comic, 'http://example.com/image.png')
+        self.assertEqual(source.checksum, image.checksum)
+        self.assertEqual(source.etag, '"123"')
+        self.assertEqual(source.content_length, 100)
+
+    def test_unchanged_image_resolves_to_existing_image(self):
+        image = Image.objects.create(
+            comic=self.comic, checksum='abc', width=20, height=10)
+
+        with mock.patch.object(self.downloader, '_download_image') \
+                as download_image:
+            stored_image = self.downloader.store(
+                self.crawler_image, FetchedImage('abc'))
+
+        self.assertEqual(stored_image, image)
+        self.assertEqual(download_image.call_count, 0)
+
+    def test_unchanged_image_without_existing_image_is_downloaded(self):
+        with create_image_file() as image_file:
+            checksum = hashlib.sha256(image_file.read()).hexdigest()
+            image_file.seek(0)
+            with mock.patch.object(
+                    self.downloader, '_download_image',
+                    return_value=FetchedImage(checksum, image_file)) \
+                    as download_image:
+                image = self.downloader.store(
+                    self.crawler_image, FetchedImage('abc'))
+
+        download_image.assert_called_once_with(
+            'http://example.com/image.png', {})
+        self.assertEqual(image.checksum, checksum)
+
+    def test_image_is_saved_with_perceptual_hash(self):
+        with create_image_file() as image_file:
+            image = self.store_image_file(image_file)
+
+        self.assertEqual(image.dhash, '0000000000000000')
+
+    def test_similar_image_is_reused_for_comic_with_reruns(self):
+        image = Image.objects.create(
+            comic=self.comic, checksum='abc', width=40, height=20,
+            dhash='0000000000000001')
+
+        with create_image_file() as image_file:
+            stored_image = self.store_image_file(image_file)
+
+        self.assertEqual(stored_image, image)
+        self.assertEqual(Image.objects.count(), 1)
+        self.assertEqual(ImageSource.objects.lookup(
+            self.comic, 'http://example.com/image.png').checksum, 'abc')
+
+    def test_similar_image_is_saved_for_comic_without_reruns(self):
+        self.crawler_release.has_rerun_releases = False
+        Image.objects.create(
+            comic=self.comic, checksum='abc', width=40, height=20,
+            dhash='0000000000000001')
+
+        with create_image_file() as image_file:
+            self.store_image_file(image_file)
+
+        self.assertEqual(Image.objects.count(), 2)
+
+    @override_settings(COMICS_IMAGE_HASH_BLACKLIST=('0000000000000003',))
+    def test_image_similar_to_blacklisted_hash_is_rejected(self):
+        with create_image_file() as image_file:
+            self.assertRaises(
+                ImageIsBlacklisted, self.store_image_file, image_file)
+
+        self.assertEqual(Image.objects.count(), 0)
+
+
+class ImageSourceManagerTest(TestCase):
+    def setUp(self):
+        self.comic = Comic.objects.create(slug='xkcd')
+
+    def test_unknown_url_gives_none(self):
+        self.assertIsNone(ImageSource.objects.lookup(
+            self.comic, 'http://example.com/image.png'))
+
+    def test_record_replaces_earlier_source_for_url(self):
+        url = u'http://example.com/\xe6\xf8\xe5.png'
+        ImageSource.objects.record(self.comic, url, {'etag': '"1"'}, 'abc')
+        ImageSource.objects.record(
+            self.comic, url, {'last-modified': 'x'}, 'def')
+
+        source = ImageSource.objects.lookup(self.comic, url)
+        self.assertEqual(ImageSource.objects.count(), 1)
+        self.assertEqual(source.url, url)
+        self.assertEqual(source.checksum, 'def')
+        self.assertEqual(source.etag, '')
+        self.assertEqual(source.last_modified, 'x')
+        self.assertIsNone(source.content_length)
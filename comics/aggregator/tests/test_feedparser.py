@@ -0,0 +1,80 @@
+import datetime
+
+import mock
+
+from django.utils import unittest
+
+from comics.aggregator.feedparser import FeedParser
+
+FEED = '''<?xml version="1.0" encoding="utf-8"?>
+<rss version="2.0">
+<channel>
+  <title>Example</title>
+  <item>
+    <title>Second</title>
+    <pubDate>Tue, 02 Jan 2024 10:00:00 GMT</pubDate>
+    <description>&lt;img src="http://example.com/2.png" /&gt;</description>
+  </item>
+  <item>
+    <title>First</title>
+    <pubDate>Mon, 01 Jan 2024 10:00:00 GMT</pubDate>
+    <description>&lt;img src="http://example.com/1.png" /&gt;</description>
+  </item>
+  <item>
+    <title>Also first</title>
+    <pubDate>Mon, 01 Jan 2024 12:00:00 GMT</pubDate>
+  </item>
+</channel>
+</rss>
+'''
+
+
+class FeedParserTest(unittest.TestCase):
+    def setUp(self):
+        patcher = mock.patch('comics.aggregator.feedparser.http_client')
+        http_client = patcher.start()
+        self.addCleanup(patcher.stop)
+        response = http_client.fetch.return_value
+        response.content = FEED
+        response.headers = {}
+        response.geturl.return_value = 'http://example.com/rss.xml'
+        http_client.load_parsed.return_value = None
+        self.feed = FeedParser('http://example.com/rss.xml')
+
+    def test_for_date_returns_entries_in_feed_order(self):
+        entries = self.feed.for_date(datetime.date(2024, 1, 1))
+
+        self.assertEqual(
+            [entry.title for entry in entries], ['First', 'Also first'])
+
+    def test_for_date_without_entries_returns_empty_list(self):
+        self.assertEqual(self.feed.for_date(datetime.date(2024, 1, 3)), [])
+
+    def test_for_date_range_returns_entries_by_date(self):
+        entries_by_date = self.feed.for_date_range(
+            datetime.date(2023, 12, 31), datetime.date(2024, 1, 1))
+
+        self.assertEqual(
+            [(date, [entry.title for entry in entries])
+             for date, entries in entries_by_date],
+            [(datetime.date(2024, 1, 1), ['First', 'Also first'])])
+
+    def test_all_returns_all_entries(self):
+        self.assertEqual(len(self.feed.all()), 3)
+
+    def test_entry_summary_is_parsed_on_first_access(self):
+        entry = self.feed.for_date(datetime.date(2024, 1, 2))[0]
+
+        with mock.patch.object(entry, 'html', wraps=entry.html) as html:
+            first_url = entry.summary.src('img')
+            second_url = entry.summary.src('img')
+
+        self.assertEqual(first_url, 'http://example.com/2.png')
+        self.assertEqual(second_url, 'http://example.com/2.png')
+
+        self.assertEqual(html.call_count, 1)
+
+    def test_entry_without_content_raises_attribute_error(self):
+        entry = self.feed.for_date(datetime.date(2024, 1, 2))[0]
+
+        self.assertRaises(AttributeError, getattr, entry, 'content0')
@@ -0,0 +1,84 @@
+import os
+import shutil
+import tempfile
+import time
+
+import mock
+
+from django.utils import unittest
+
+from comics.aggregator.httpcache import HttpCache
+
+
+class HttpCacheTest(unittest.TestCase):
+    url = 'http://example.com/feed.xml'
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache = HttpCache(self.directory)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_get_unknown_url_returns_none(self):
+        self.assertIsNone(self.cache.get(self.url))
+
+    def test_stored_entry_has_validators_and_body(self):
+        self.cache.store(
+            self.url, {'etag': '"abc"', 'last-modified': 'Yesterday'}, 'foo')
+
+        entry = self.cache.get(self.url)
+
+        self.assertEqual(entry.read_body(), 'foo')
+        self.assertEqual(entry.get_conditional_headers(), {
+            'If-None-Match': '"abc"',
+            'If-Modified-Since': 'Yesterday',
+        })
+
+    def test_entry_without_validators_has_no_conditional_headers(self):
+        self.cache.store(self.url, {}, 'foo')
+
+        self.assertEqual(
+            self.cache.get(self.url).get_conditional_headers(), {})
+
+    def test_store_returns_checksum_of_body(self):
+        checksum = self.cache.store(self.url, {}, '')
+
+        self.assertEqual(
+            checksum,
+            'e3b0c44298fc1c149afbf4c8996fb92427ae41e4649b934ca495991b7852b855')
+
+    def test_parsed_object_is_only_loaded_for_same_checksum(self):
+        self.cache.store_parsed(self.url, 'abc', {'entries': []})
+
+        self.assertEqual(
+            self.cache.load_parsed(self.url, 'abc'), {'entries': []})
+        self.assertIsNone(self.cache.load_parsed(self.url, 'def'))
+
+    def test_prune_removes_unused_entries(self):
+        self.cache.store(self.url, {}, 'foo')
+        self.cache.store('http://example.com/other', {}, 'bar')
+        old = time.time() - 3600
+        os.utime(self.cache._get_path(
+            self.cache._get_key(self.url), '.json'), (old, old))
+
+        self.assertEqual(self.cache.prune(60), 1)
+        self.assertIsNone(self.cache.get(self.url))
+        self.assertIsNotNone(self.cache.get('http://example.com/other'))
+
+    def test_prune_is_skipped_if_recently_pruned(self):
+        self.cache.store(self.url, {}, 'foo')
+        self.cache.prune(60)
+        old = time.time() - 3600
+        os.utime(self.cache._get_path(
+            self.cache._get_key(self.url), '.json'), (old, old))
+
+        with mock.patch('os.walk') as walk:
+            self.assertEqual(self.cache.prune(60), 0)
+        self.assertEqual(0, walk.call_count)
+        self.assertEqual(self.cache.prune(60, interval=0), 1)
+
+    def test_prune_without_cache_directory_does_nothing(self):
+        cache = HttpCache(os.path.join(self.directory, 'missing'))
+
+        self.assertEqual(cache.prune(60), 0)
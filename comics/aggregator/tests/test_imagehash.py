@@ -0,0 +1,111 @@
+import random
+import StringIO
+
+try:
+    from PIL import Image as PILImage
+except ImportError:
+    import Image as PILImage  # noqa
+
+from django.test import TestCase
+from django.utils import unittest
+
+from comics.aggregator.imagehash import (
+    BKTree, ImageHashIndex, get_distance, get_image_hash, parse_hash)
+from comics.core.models import Comic, Image
+
+
+def create_image(seed, size=(200, 100)):
+    # Smooth random shapes, so that the image doesn't look like noise
+    rng = random.Random(seed)
+    image = PILImage.new('L', (9, 8))
+    image.putdata([rng.randint(0, 255) for _ in range(72)])
+    return image.resize(size, PILImage.BILINEAR).convert('RGB')
+
+
+def save_image(image, format='PNG', **kwargs):
+    image_file = StringIO.StringIO()
+    image.save(image_file, format, **kwargs)
+    image_file.seek(0)
+    return image_file
+
+
+class GetImageHashTest(unittest.TestCase):
+    def get_distance(self, image_file_a, image_file_b):
+        return get_distance(
+            parse_hash(get_image_hash(image_file_a)),
+            parse_hash(get_image_hash(image_file_b)))
+
+    def test_reencoded_and_resized_image_is_close(self):
+        image = create_image(1)
+        resized_image = image.resize((300, 150), PILImage.ANTIALIAS)
+
+        self.assertLessEqual(self.get_distance(
+            save_image(image),
+            save_image(resized_image, 'JPEG', quality=60)), 4)
+
+    def test_different_images_are_far_apart(self):
+        self.assertGreater(self.get_distance(
+            save_image(create_image(1)), save_image(create_image(2))), 10)
+
+    def test_hash_is_hex_string(self):
+        image_hash = get_image_hash(save_image(create_image(1)))
+
+        self.assertEqual(len(image_hash), 16)
+        int(image_hash, 16)
+
+
+class BKTreeTest(unittest.TestCase):
+    def test_finds_same_values_as_linear_search(self):
+        rng = random.Random(1)
+        keys = [rng.getrandbits(64) for _ in range(500)]
+        tree = BKTree()
+        for i, key in enumerate(keys):
+            tree.add(key, i)
+        query = keys[42] ^ 0b1011
+
+        expected = sorted(
+            (get_distance(query, key), i) for i, key in enumerate(keys)
+            if get_distance(query, key) <= 12)
+        self.assertEqual(tree.find(query, 12), expected)
+        self.assertEqual(tree.find(query, 3), [(3, 42)])
+
+    def test_values_with_same_key_are_all_found(self):
+        tree = BKTree()
+        tree.add(5, 'a')
+        tree.add(5, 'b')
+
+        self.assertEqual(tree.find(4, 1), [(1, 'a'), (1, 'b')])
+
+    def test_empty_tree_finds_nothing(self):
+        self.assertEqual(BKTree().find(0, 64), [])
+
+
+class ImageHashIndexTest(TestCase):
+    def setUp(self):
+        self.comic = Comic.objects.create(slug='xkcd')
+        self.other_comic = Comic.objects.create(slug='other')
+        self.index = ImageHashIndex()
+
+    def create_image(self, comic, dhash):
+        return Image.objects.create(
+            comic=comic, checksum='abc', width=20, height=10, dhash=dhash)
+
+    def test_finds_images_of_the_comic_within_distance(self):
+        close = self.create_image(self.comic, '00000000000000ff')
+        self.create_image(self.comic, 'ffffffffffffffff')
+        self.create_image(self.comic, '')
+        self.create_image(self.other_comic, '00000000000000ff')
+
+        self.assertEqual(
+            self.index.find(self.comic, '00000000000000fc', 4), [close.pk])
+
+    def test_added_images_are_found_without_reloading(self):
+        self.assertEqual(
+            self.index.find(self.comic, '0000000000000000', 4), [])
+        image = self.create_image(self.comic, '0000000000000001')
+        self.index.add(self.comic, image.dhash, image.pk)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                self.index.find(self.comic, '0000000000000000', 4),
+                [image.pk])
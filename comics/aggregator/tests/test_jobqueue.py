@@ -0,0 +1,207 @@
+import datetime
+
+import mock
+
+from django.test import TestCase
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from comics.aggregator import command
+from comics.aggregator.exceptions import (
+    CrawlerHTTPError, ImageURLNotFound, ReleaseAlreadyExists)
+from comics.aggregator.jobqueue import JobWorker, QueueingAggregator
+from comics.aggregator.models import CrawlJob
+from comics.core.models import Comic, Release
+
+
+def create_jobs(comic, *days):
+    CrawlJob.objects.enqueue(
+        comic, [datetime.date(2014, 6, day) for day in days])
+
+
+@override_settings(
+    COMICS_CRAWL_JOB_LEASE_TIME=600, COMICS_CRAWL_JOB_MAX_ATTEMPTS=2)
+class CrawlJobManagerTest(TestCase):
+    def setUp(self):
+        self.comic = Comic.objects.create(slug='xkcd')
+
+    def test_enqueue_skips_dates_with_jobs(self):
+        create_jobs(self.comic, 1, 2)
+
+        num_queued = CrawlJob.objects.enqueue(
+            self.comic, [datetime.date(2014, 6, day) for day in (2, 3)])
+
+        self.assertEqual(num_queued, 1)
+        self.assertEqual(CrawlJob.objects.count(), 3)
+
+    def test_claim_leases_oldest_pending_job(self):
+        create_jobs(self.comic, 1, 2)
+
+        job = CrawlJob.objects.claim('a')
+
+        self.assertEqual(job.pub_date, datetime.date(2014, 6, 1))
+        self.assertEqual(job.state, CrawlJob.RUNNING)
+        self.assertEqual(job.attempts, 1)
+        self.assertEqual(job.worker, 'a')
+        self.assertGreater(job.lease_expires, timezone.now())
+
+    def test_claimed_job_is_not_claimed_again(self):
+        create_jobs(self.comic, 1)
+
+        self.assertIsNotNone(CrawlJob.objects.claim('a'))
+        self.assertIsNone(CrawlJob.objects.claim('b'))
+
+    def test_job_with_expired_lease_is_claimed_again(self):
+        create_jobs(self.comic, 1)
+        CrawlJob.objects.claim('a', lease_time=-1)
+
+        job = CrawlJob.objects.claim('b')
+
+        self.assertEqual(job.worker, 'b')
+        self.assertEqual(job.attempts, 2)
+
+    def test_job_is_failed_when_lease_expires_too_many_times(self):
+        create_jobs(self.comic, 1)
+        CrawlJob.objects.claim('a', lease_time=-1)
+        CrawlJob.objects.claim('b', lease_time=-1)
+
+        self.assertIsNone(CrawlJob.objects.claim('c'))
+        self.assertEqual(CrawlJob.objects.get().state, CrawlJob.FAILED)
+
+    def test_job_reclaimed_by_other_worker_is_not_finished(self):
+        create_jobs(self.comic, 1)
+        job = CrawlJob.objects.claim('a', lease_time=-1)
+        CrawlJob.objects.claim('b')
+
+        self.assertFalse(job.finish())
+        self.assertEqual(CrawlJob.objects.get().state, CrawlJob.RUNNING)
+
+    def test_retried_job_is_not_claimed_before_backoff(self):
+        create_jobs(self.comic, 1)
+        job = CrawlJob.objects.claim('a')
+        before = timezone.now()
+        job.retry('Timeout')
+
+        self.assertIsNone(CrawlJob.objects.claim('a'))
+        job = CrawlJob.objects.get()
+        self.assertEqual(job.state, CrawlJob.PENDING)
+        self.assertGreaterEqual(
+            job.not_before, before + datetime.timedelta(seconds=60))
+
+    @override_settings(COMICS_CRAWL_JOB_MAX_ATTEMPTS=5)
+    def test_retry_backoff_is_doubled_for_each_attempt(self):
+        create_jobs(self.comic, 1)
+        CrawlJob.objects.update(attempts=2)
+        job = CrawlJob.objects.claim('a')
+        before = timezone.now()
+        job.retry('Timeout')
+
+        self.assertGreaterEqual(
+            CrawlJob.objects.get().not_before,
+            before + datetime.timedelta(seconds=4 * 60))
+
+    @override_settings(COMICS_CRAWL_JOB_RETRY_BACKOFF=0)
+    def test_retry_fails_job_after_max_attempts(self):
+        create_jobs(self.comic, 1)
+        job = CrawlJob.objects.claim('a')
+        job.retry('Timeout')
+
+        job = CrawlJob.objects.claim('a')
+        job.retry('Timeout')
+
+        job = CrawlJob.objects.get()
+        self.assertEqual(job.state, CrawlJob.FAILED)
+        self.assertEqual(job.error, 'Timeout')
+
+
+class JobWorkerTest(TestCase):
+    def setUp(self):
+        self.comic = Comic.objects.create(slug='xkcd')
+        create_jobs(self.comic, 1)
+        self.job = CrawlJob.objects.claim('a')
+        self.worker = JobWorker('a')
+        self.crawler = mock.Mock()
+        self.crawler.comic = self.comic
+        self.worker._crawler = self.crawler
+
+    def run_job(self, error=None):
+        self.crawler.get_crawler_release.side_effect = error
+        self.crawler.get_crawler_release.return_value = None
+        self.worker.run_job(self.job)
+        return CrawlJob.objects.get()
+
+    def test_successful_job_is_done(self):
+        self.assertEqual(self.run_job().state, CrawlJob.DONE)
+
+    def test_job_with_existing_release_is_done(self):
+        job = self.run_job(ReleaseAlreadyExists('xkcd/2014-06-01'))
+
+        self.assertEqual(job.state, CrawlJob.DONE)
+
+    def test_job_with_http_error_is_retried(self):
+        job = self.run_job(CrawlerHTTPError('xkcd/2014-06-01', 'Timeout'))
+
+        self.assertEqual(job.state, CrawlJob.PENDING)
+        self.assertIn('Timeout', job.error)
+
+    def test_job_with_rate_limit_response_is_retried(self):
+        job = self.run_job(CrawlerHTTPError('xkcd/2014-06-01', 429))
+
+        self.assertEqual(job.state, CrawlJob.PENDING)
+
+    def test_job_with_not_found_response_is_failed(self):
+        job = self.run_job(CrawlerHTTPError('xkcd/2014-06-01', 404))
+
+        self.assertEqual(job.state, CrawlJob.FAILED)
+
+    def test_worker_exiting_when_empty_waits_for_retried_jobs(self):
+        self.job.retry('Timeout')
+        self.worker.exit_when_empty = True
+        self.worker._stopped.wait = mock.Mock(
+            side_effect=lambda timeout: self.worker.stop())
+
+        with mock.patch('comics.aggregator.jobqueue.connection'):
+            self.worker.start()
+
+        self.assertEqual(1, self.worker._stopped.wait.call_count)
+
+    def test_job_with_non_ascii_error_is_retried(self):
+        job = self.run_job(
+            CrawlerHTTPError(u'xkcd/2014-06-01', u'Fant ikke bl\xe5b\xe6r'))
+
+        self.assertEqual(job.state, CrawlJob.PENDING)
+        self.assertIn(u'Fant ikke bl\xe5b\xe6r', job.error)
+
+    def test_job_with_crawler_error_is_failed(self):
+        job = self.run_job(ImageURLNotFound('xkcd/2014-06-01'))
+
+        self.assertEqual(job.state, CrawlJob.FAILED)
+
+    def test_job_with_unexpected_error_is_failed(self):
+        job = self.run_job(ValueError('Oops'))
+
+        self.assertEqual(job.state, CrawlJob.FAILED)
+        self.assertEqual(job.error, 'ValueError: Oops')
+
+
+class QueueingAggregatorTest(TestCase):
+    def test_jobs_are_queued_for_dates_without_release(self):
+        comic = Comic.objects.create(slug='xkcd')
+        Release.objects.create(comic=comic, pub_date=datetime.date(2014, 6, 2))
+        config = command.AggregatorConfig()
+        config.comics = [comic]
+        config.set_date_interval('2014-06-01', '2014-06-03')
+        aggregator = QueueingAggregator(config)
+        crawler = mock.Mock()
+        crawler.comic = comic
+        crawler.multiple_releases_per_day = False
+        aggregator._get_crawler = lambda comic: crawler
+        aggregator._get_valid_date = lambda crawler, date: date
+
+        aggregator.start()
+
+        self.assertEqual(
+            [datetime.date(2014, 6, 1), datetime.date(2014, 6, 3)],
+            list(CrawlJob.objects.order_by('pub_date').values_list(
+                'pub_date', flat=True)))
+        self.assertEqual(aggregator.stats['jobs_queued'], 2)
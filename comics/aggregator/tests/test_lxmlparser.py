@@ -0,0 +1,67 @@
+from django.utils import unittest
+
+from comics.aggregator import lxmlparser
+from comics.aggregator.lxmlparser import LxmlParser
+
+HTML = '''
+<html><body>
+<h1>Today's strip</h1>
+<img class="strip" src="http://example.com/strip.png" alt="Alt" title="Title">
+<img class="ad" src="http://example.com/ad1.png">
+<img class="ad" src="http://example.com/ad2.png">
+</body></html>
+'''
+
+
+class CompileSelectorTest(unittest.TestCase):
+    def test_compiled_selector_is_reused(self):
+        self.assertIs(
+            lxmlparser.compile_selector('img.strip'),
+            lxmlparser.compile_selector('img.strip'))
+
+
+class LxmlParserTest(unittest.TestCase):
+    def setUp(self):
+        self.page = LxmlParser(string=HTML)
+
+    def test_extract_gets_multiple_attributes_and_text(self):
+        self.assertEqual(
+            self.page.extract('img.strip', ['src', 'alt', 'title']), {
+                'src': 'http://example.com/strip.png',
+                'alt': 'Alt',
+                'title': 'Title',
+            })
+        self.assertEqual(
+            self.page.extract('h1', ['text']), {'text': "Today's strip"})
+
+    def test_extract_without_match_returns_defaults(self):
+        self.assertEqual(
+            self.page.extract('img.missing', ['src', 'alt'], default=''),
+            {'src': '', 'alt': ''})
+
+    def test_extract_with_allow_multiple_returns_list(self):
+        self.assertEqual(
+            self.page.extract('img.ad', ['src'], allow_multiple=True), [
+                {'src': 'http://example.com/ad1.png'},
+                {'src': 'http://example.com/ad2.png'},
+            ])
+
+    def test_extract_multiple_matches_raises_error(self):
+        self.assertRaises(
+            lxmlparser.MultipleElementsReturned,
+            self.page.extract, 'img.ad', ['src'])
+
+    def test_extract_many(self):
+        self.assertEqual(
+            self.page.extract_many({
+                'img.strip': ['src'],
+                'h1': ['text'],
+            }), {
+                'img.strip': {'src': 'http://example.com/strip.png'},
+                'h1': {'text': "Today's strip"},
+            })
+
+    def test_remove(self):
+        self.page.remove('img.ad')
+
+        self.assertEqual(self.page.src('img.ad', allow_multiple=True), [])
@@ -0,0 +1,59 @@
+import mock
+
+from django.utils import unittest
+
+from comics.aggregator.pagecache import PageCache
+
+
+def create_page(size):
+    page = mock.Mock()
+    page.size = size
+    return page
+
+
+class PageCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.cache = PageCache(max_entries=2, max_bytes=100)
+
+    def test_get_missing_page_counts_a_miss(self):
+        self.assertIsNone(self.cache.get('http://example.com/'))
+        self.assertEqual(self.cache.misses, 1)
+        self.assertEqual(self.cache.hits, 0)
+
+    def test_get_cached_page_counts_a_hit(self):
+        page = create_page(10)
+        self.cache.set('http://example.com/', page)
+
+        self.assertIs(self.cache.get('http://example.com/'), page)
+        self.assertEqual(self.cache.hits, 1)
+
+    def test_least_recently_used_page_is_evicted_above_max_entries(self):
+        self.cache.set('a', create_page(10))
+        self.cache.set('b', create_page(10))
+        self.cache.get('a')
+        self.cache.set('c', create_page(10))
+
+        self.assertIn('a', self.cache)
+        self.assertNotIn('b', self.cache)
+        self.assertIn('c', self.cache)
+        self.assertEqual(self.cache.bytes, 20)
+
+    def test_pages_are_evicted_above_max_bytes(self):
+        self.cache.set('a', create_page(60))
+        self.cache.set('b', create_page(60))
+
+        self.assertNotIn('a', self.cache)
+        self.assertEqual(self.cache.bytes, 60)
+
+    def test_page_larger_than_max_bytes_is_kept_alone(self):
+        self.cache.set('a', create_page(10))
+        self.cache.set('b', create_page(1000))
+
+        self.assertEqual(len(self.cache), 1)
+        self.assertIn('b', self.cache)
+
+    def test_replacing_page_updates_byte_count(self):
+        self.cache.set('a', create_page(10))
+        self.cache.set('a', create_page(30))
+
+        self.assertEqual(self.cache.bytes, 30)
@@ -0,0 +1,49 @@
+import datetime
+
+from django.utils import unittest
+
+from comics.aggregator.planner import CrawlPlan, get_weekday
+
+
+class GetWeekdayTest(unittest.TestCase):
+    def test_sunday_is_zero(self):
+        self.assertEqual(get_weekday(datetime.date(2014, 6, 1)), 0)
+        self.assertEqual(get_weekday(datetime.date(2014, 6, 7)), 6)
+
+
+class CrawlPlanTest(unittest.TestCase):
+    def setUp(self):
+        # Monday 2014-06-02 to Sunday 2014-06-08
+        self.from_date = datetime.date(2014, 6, 2)
+        self.to_date = datetime.date(2014, 6, 8)
+
+    def test_all_dates_are_planned_by_default(self):
+        plan = CrawlPlan(self.from_date, self.to_date)
+
+        self.assertEqual(len(plan), 7)
+        self.assertEqual(list(plan)[0], self.from_date)
+        self.assertEqual(list(plan)[-1], self.to_date)
+
+    def test_existing_dates_are_skipped(self):
+        existing = set([datetime.date(2014, 6, 3), datetime.date(2014, 6, 5)])
+
+        plan = CrawlPlan(self.from_date, self.to_date, existing)
+
+        self.assertEqual(len(plan), 5)
+        self.assertEqual(plan.num_existing, 2)
+        self.assertFalse(existing & set(plan))
+
+    def test_unscheduled_dates_are_skipped(self):
+        existing = set([datetime.date(2014, 6, 4)])
+
+        plan = CrawlPlan(self.from_date, self.to_date, existing, 'Mo,We,Fr')
+
+        self.assertEqual(
+            list(plan), [datetime.date(2014, 6, 2), datetime.date(2014, 6, 6)])
+        self.assertEqual(plan.num_existing, 1)
+        self.assertEqual(plan.num_unscheduled, 4)
+
+    def test_comic_without_schedule_is_planned_every_day(self):
+        plan = CrawlPlan(self.from_date, self.to_date, set(), None)
+
+        self.assertEqual(len(plan), 7)
@@ -0,0 +1,95 @@
+import datetime
+
+import mock
+
+from django.test import TestCase
+
+from comics.aggregator.models import CrawlFailure, CrawlProgress
+from comics.aggregator.progress import ProgressTracker
+from comics.core.models import Comic
+
+
+class CrawlProgressTest(TestCase):
+    def setUp(self):
+        self.comic = Comic.objects.create(slug='xkcd')
+        self.progress = CrawlProgress.objects.start(
+            self.comic, datetime.date(2008, 3, 1), datetime.date(2008, 3, 31))
+
+    def test_resumes_from_first_date_if_nothing_crawled(self):
+        self.assertEqual(
+            datetime.date(2008, 3, 1), self.progress.get_resume_date())
+
+    def test_resumes_from_date_after_last_crawled(self):
+        self.progress.last_pub_date = datetime.date(2008, 3, 10)
+
+        self.assertEqual(
+            datetime.date(2008, 3, 11), self.progress.get_resume_date())
+
+    def test_resumes_from_earliest_failed_date(self):
+        self.progress.last_pub_date = datetime.date(2008, 3, 10)
+        self.progress.save()
+        CrawlFailure.objects.create(
+            progress=self.progress, pub_date=datetime.date(2008, 3, 4),
+            error='Timeout')
+
+        self.assertEqual(
+            datetime.date(2008, 3, 4), self.progress.get_resume_date())
+
+    def test_starting_replaces_earlier_progress(self):
+        CrawlProgress.objects.start(
+            self.comic, datetime.date(2009, 1, 1), datetime.date(2009, 1, 31))
+
+        progress = CrawlProgress.objects.get_unfinished(self.comic)
+        self.assertEqual(datetime.date(2009, 1, 1), progress.from_date)
+        self.assertEqual(1, CrawlProgress.objects.count())
+
+    def test_finished_progress_is_not_unfinished(self):
+        self.progress.finished = True
+        self.progress.save()
+
+        self.assertIsNone(CrawlProgress.objects.get_unfinished(self.comic))
+
+
+class ProgressTrackerTest(TestCase):
+    def setUp(self):
+        self.comic = Comic.objects.create(slug='xkcd')
+        time_patcher = mock.patch('comics.aggregator.progress.time')
+        self.time = time_patcher.start()
+        self.addCleanup(time_patcher.stop)
+        self.time.time.return_value = 1000
+        self.tracker = ProgressTracker.start(
+            self.comic, datetime.date(2008, 3, 1),
+            datetime.date(2008, 3, 31), 31)
+
+    def get_progress(self):
+        return CrawlProgress.objects.get(comic=self.comic)
+
+    def test_checkpoint_is_saved_after_interval(self):
+        self.tracker.advance(datetime.date(2008, 3, 1))
+        self.assertIsNone(self.get_progress().last_pub_date)
+
+        self.time.time.return_value = 1061
+        with self.settings(COMICS_CRAWL_PROGRESS_INTERVAL=60):
+            self.tracker.advance(datetime.date(2008, 3, 2))
+
+        self.assertEqual(
+            datetime.date(2008, 3, 2), self.get_progress().last_pub_date)
+
+    def test_failures_are_saved_and_cleared_when_resuming(self):
+        self.tracker.fail(datetime.date(2008, 3, 4), 'Timeout')
+        self.tracker.fail(datetime.date(2008, 3, 4), 'Timeout')
+        progress = self.get_progress()
+        self.assertEqual(1, progress.failures.count())
+
+        ProgressTracker.resume(progress, 28)
+
+        self.assertEqual(0, progress.failures.count())
+
+    def test_report_has_rate_and_eta(self):
+        for _ in range(10):
+            self.tracker.date_done()
+        self.time.time.return_value = 1020
+
+        self.assertEqual(
+            '10 of 31 dates (32.3%), 0.50 dates/s, 0.0 KB/s, ETA 0:00:42',
+            self.tracker.get_report())
@@ -6,6 +6,11 @@ SCHEDULE_DAYS = ['Su', 'Mo', 'Tu', 'We', 'Th', 'Fr', 'Sa']
 def get_comic_schedule(comic):
     module = get_comic_module(comic.slug)
     schedule = module.Crawler(comic).schedule
+    return parse_schedule(schedule)
+
+
+def parse_schedule(schedule):
+    """Weekday numbers, with Sunday as 0, in a schedule like ``'Mo,We,Fr'``"""
 
     if not schedule:
         return []
@@ -10,6 +10,7 @@ from comics.api.authentication import (
     SecretKeyAuthentication, MultiAuthentication)
 from comics.core.models import Comic, Release, Image
 from comics.accounts.models import Subscription
+from comics.accounts.subscriptions import get_subscribed_comic_ids
 
 
 class UsersAuthorization(ReadOnlyAuthorization):
@@ -80,11 +81,11 @@ class ImagesResource(ModelResource):
 class ReleasesAuthorization(ReadOnlyAuthorization):
     def read_list(self, object_list, bundle):
         if bundle.request.GET.get('subscribed') == 'true':
-            return object_list.filter(
-                comic__userprofile__user=bundle.request.user)
+            return object_list.filter(comic_id__in=get_subscribed_comic_ids(
+                bundle.request.user))
         elif bundle.request.GET.get('subscribed') == 'false':
-            return object_list.exclude(
-                comic__userprofile__user=bundle.request.user)
+            return object_list.exclude(comic_id__in=get_subscribed_comic_ids(
+                bundle.request.user))
         else:
             return object_list
 
@@ -94,7 +95,9 @@ class ReleasesResource(ModelResource):
     images = fields.ToManyField(ImagesResource, 'images', full=True)
 
     class Meta:
-        queryset = Release.objects.select_related().order_by('-fetched')
+        queryset = (
+            Release.objects.with_ordered_images().select_related()
+            .order_by('-fetched'))
         resource_name = 'releases'
         authentication = SecretKeyAuthentication()
         authorization = ReleasesAuthorization()
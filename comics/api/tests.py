@@ -2,8 +2,10 @@ import base64
 import json
 
 from django.contrib.auth.models import User
+from django.db import connection
 from django.test.client import Client
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 
 from comics.accounts.models import Subscription
 from comics.core.models import Comic
@@ -288,6 +290,17 @@ class ReleasesResourceTestCase(TestCase):
             image['checksum'],
             '76a1407a2730b000d51ccf764c689c8930fdd3580e01f62f70cbe73d8be17e9c')
 
+    def test_images_of_all_releases_are_fetched_in_one_query(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                '/api/v1/releases/', HTTP_AUTHORIZATION='Key s3cretk3y')
+
+        self.assertEquals(response.status_code, 200)
+        image_queries = [
+            query for query in queries.captured_queries
+            if 'FROM "comics_image"' in query['sql']]
+        self.assertEquals(len(image_queries), 1)
+
     def test_subscribed_filter(self):
         create_subscriptions(self.user)
 
@@ -0,0 +1,58 @@
+"""Aggregates over the dates before or after a date
+
+They let the dates next to the one viewed be found in the same query as the
+first and last dates, e.g.::
+
+    Release.objects.aggregate(
+        first=Min('pub_date'), previous=MaxBefore('pub_date', day))
+"""
+
+from django.db.models import Aggregate
+from django.db.models.sql.aggregates import Aggregate as SQLAggregate
+
+
+class SQLConditionalAggregate(SQLAggregate):
+    sql_function = None
+    sql_template = (
+        '%(function)s(CASE WHEN %(field)s %(operator)s %%s '
+        'THEN %(field)s END)')
+
+    def __init__(self, col, value, **extra):
+        super(SQLConditionalAggregate, self).__init__(col, **extra)
+        self.value = value
+
+    def as_sql(self, qn, connection):
+        sql, params = super(SQLConditionalAggregate, self).as_sql(
+            qn, connection)
+        return sql, list(params) + [
+            connection.ops.value_to_db_date(self.value)]
+
+
+class ConditionalAggregate(Aggregate):
+    sql_function = None
+    operator = None
+
+    def __init__(self, lookup, value):
+        super(ConditionalAggregate, self).__init__(lookup)
+        self.value = value
+
+    def add_to_query(self, query, alias, col, source, is_summary):
+        query.aggregates[alias] = SQLConditionalAggregate(
+            col, self.value, source=source, is_summary=is_summary,
+            function=self.sql_function, operator=self.operator)
+
+
+class MaxBefore(ConditionalAggregate):
+    """The latest date before ``value``"""
+
+    name = 'MaxBefore'
+    sql_function = 'MAX'
+    operator = '<'
+
+
+class MinFrom(ConditionalAggregate):
+    """The earliest date at or after ``value``"""
+
+    name = 'MinFrom'
+    sql_function = 'MIN'
+    operator = '>='
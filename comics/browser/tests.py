@@ -0,0 +1,241 @@
+import datetime
+import json
+
+import mock
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from comics.accounts.models import Subscription
+from comics.browser.views import MyComicsLatestView
+from comics.core.models import Comic, Image, Release
+
+
+def create_user():
+    return User.objects.create_user('alice', 'alice@example.com', 'secret')
+
+
+def create_releases(comic, num_releases):
+    fetched = timezone.now() - datetime.timedelta(days=num_releases)
+    releases = []
+    for day in range(num_releases):
+        release = Release.objects.create(
+            comic=comic, pub_date=datetime.date(2014, 1, 1) +
+            datetime.timedelta(days=day))
+        # Two releases at a time are fetched at the same time
+        Release.objects.filter(pk=release.pk).update(
+            fetched=fetched + datetime.timedelta(days=day // 2))
+        releases.append(release)
+    return releases
+
+
+class ReleaseViewTestCase(TestCase):
+    def setUp(self):
+        self.user = create_user()
+        self.comic = Comic.objects.create(slug='xkcd')
+        Subscription.objects.create(
+            userprofile=self.user.comics_profile, comic=self.comic)
+        self.releases = create_releases(self.comic, 7)
+        self.client.login(username='alice', password='secret')
+
+    def get_page(self, url):
+        response = self.client.get(url)
+        self.assertEqual(200, response.status_code)
+        return response.context
+
+
+class MyComicsLatestViewTestCase(ReleaseViewTestCase):
+    def setUp(self):
+        super(MyComicsLatestViewTestCase, self).setUp()
+        patcher = mock.patch.object(MyComicsLatestView, 'paginate_by', 3)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def get_release_ids(self, context):
+        return [release.id for release in context['object_list']]
+
+    def get_ids(self, *indexes):
+        return [self.releases[index].id for index in indexes]
+
+    def test_newest_page_links_to_older_pages(self):
+        context = self.get_page('/my/')
+
+        self.assertEqual(self.get_ids(6, 5, 4), self.get_release_ids(context))
+        self.assertEqual('/my/oldest/', context['first_url'])
+        self.assertEqual(
+            '/my/older/%d/' % self.releases[4].id, context['prev_url'])
+        self.assertIsNone(context['next_url'])
+        self.assertIsNone(context['last_url'])
+
+    def test_pages_are_found_by_seeking_in_both_directions(self):
+        context = self.get_page('/my/older/%d/' % self.releases[4].id)
+        self.assertEqual(self.get_ids(3, 2, 1), self.get_release_ids(context))
+        self.assertEqual('/my/', context['last_url'])
+
+        context = self.get_page(context['prev_url'])
+        self.assertEqual(self.get_ids(0), self.get_release_ids(context))
+        self.assertIsNone(context['prev_url'])
+        self.assertIsNone(context['first_url'])
+
+        context = self.get_page(context['next_url'])
+        self.assertEqual(self.get_ids(3, 2, 1), self.get_release_ids(context))
+
+    def test_oldest_page_has_the_oldest_releases(self):
+        context = self.get_page('/my/oldest/')
+
+        self.assertEqual(self.get_ids(2, 1, 0), self.get_release_ids(context))
+        self.assertIsNone(context['prev_url'])
+        self.assertEqual(
+            '/my/newer/%d/' % self.releases[2].id, context['next_url'])
+
+    def test_page_numbers_still_work(self):
+        context = self.get_page('/my/page2/')
+
+        self.assertEqual(self.get_ids(3, 2, 1), self.get_release_ids(context))
+        self.assertEqual(
+            '/my/older/%d/' % self.releases[1].id, context['prev_url'])
+
+    def test_newest_page_without_releases(self):
+        Release.objects.all().delete()
+
+        context = self.get_page('/my/')
+
+        self.assertEqual([], self.get_release_ids(context))
+        self.assertIsNone(context['prev_url'])
+        self.assertIsNone(context['next_url'])
+
+    def test_releases_are_filtered_on_subscribed_comic_ids(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.get_page('/my/')
+
+        for query in queries.captured_queries:
+            if 'FROM "comics_release"' in query['sql']:
+                self.assertNotIn('comics_user_profile', query['sql'])
+
+    def test_pages_neither_count_nor_skip_releases(self):
+        url = '/my/older/%d/' % self.releases[2].id
+        with CaptureQueriesContext(connection) as queries:
+            self.get_page(url)
+
+        for query in queries.captured_queries:
+            self.assertNotIn('COUNT(', query['sql'])
+            self.assertNotIn('OFFSET', query['sql'])
+
+
+class MyComicsNumReleasesSinceViewTestCase(ReleaseViewTestCase):
+    def get_json(self, url):
+        response = self.client.get(url)
+        self.assertEqual(200, response.status_code)
+        return json.loads(response.content)
+
+    def test_counts_releases_fetched_since_the_given_release(self):
+        data = self.get_json(
+            '/my/num-releases-since/%d/' % self.releases[3].id)
+
+        self.assertEqual(self.releases[3].id, data['since_release_id'])
+        self.assertEqual(3, data['num_releases'])
+
+    def test_poll_only_counts_releases(self):
+        url = '/my/num-releases-since/%d/' % self.releases[4].id
+        with CaptureQueriesContext(connection) as queries:
+            self.get_json(url)
+
+        release_queries = [
+            query['sql'] for query in queries.captured_queries
+            if 'FROM "comics_release"' in query['sql']]
+        self.assertEqual(2, len(release_queries))
+        self.assertIn('COUNT(', release_queries[1])
+        for query in queries.captured_queries:
+            self.assertNotIn('comics_release_images', query['sql'])
+            self.assertNotIn('comics_image', query['sql'])
+
+
+class ReleaseDateViewsTestCase(ReleaseViewTestCase):
+    def setUp(self):
+        super(ReleaseDateViewsTestCase, self).setUp()
+        # Releases from 2014-01-01 to 2014-01-07 except 2014-01-04, and on
+        # 2014-03-10
+        self.releases.append(Release.objects.create(
+            comic=self.comic, pub_date=datetime.date(2014, 3, 10)))
+        self.releases[3].delete()
+
+    def test_day_view_links_to_days_with_releases(self):
+        context = self.get_page('/my/2014/1/3/')
+
+        self.assertEqual('/my/2014/1/1/', context['first_url'])
+        self.assertEqual('/my/2014/1/2/', context['prev_url'])
+        self.assertEqual('/my/2014/1/5/', context['next_url'])
+        self.assertEqual('/my/2014/3/10/', context['last_url'])
+        self.assertEqual('/my/2014/3/10/', context['day_url'])
+
+    def test_one_comic_day_view_links_to_days_with_releases(self):
+        context = self.get_page('/xkcd/2014/1/7/')
+
+        self.assertEqual('/xkcd/2014/1/1/', context['first_url'])
+        self.assertEqual('/xkcd/2014/1/6/', context['prev_url'])
+        self.assertEqual('/xkcd/2014/3/10/', context['next_url'])
+        self.assertEqual('/xkcd/2014/3/10/', context['last_url'])
+        self.assertIsNone(context['today_url'])
+
+    def test_month_view_links_to_months_with_releases(self):
+        context = self.get_page('/my/2014/3/')
+        self.assertEqual('/my/2014/1/', context['prev_url'])
+        self.assertIsNone(context['next_url'])
+
+        context = self.get_page('/xkcd/2014/1/')
+        self.assertIsNone(context['prev_url'])
+        self.assertEqual('/xkcd/2014/3/', context['next_url'])
+
+    def test_day_view_finds_all_dates_to_link_to_in_one_query(self):
+        for url in ('/my/2014/1/3/', '/xkcd/2014/1/3/'):
+            with CaptureQueriesContext(connection) as queries:
+                self.get_page(url)
+
+            date_queries = [
+                query['sql'] for query in queries.captured_queries
+                if 'MAX(' in query['sql'] or
+                '"pub_date" DESC' in query['sql']]
+            self.assertEqual(1, len(date_queries), date_queries)
+
+
+class ReleaseImagesTestCase(ReleaseViewTestCase):
+    def setUp(self):
+        super(ReleaseImagesTestCase, self).setUp()
+        for release in self.releases:
+            for checksum in ('b', 'a'):
+                release.images.add(Image.objects.create(
+                    comic=self.comic, file='xkcd/%s/%s.png' % (
+                        checksum, checksum),
+                    checksum=checksum, width=20, height=10))
+
+    def assertImagesFetchedInOneQuery(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+
+        self.assertEqual(200, response.status_code)
+        image_queries = [
+            query for query in queries.captured_queries
+            if 'FROM "comics_image"' in query['sql']]
+        self.assertEqual(1, len(image_queries))
+
+    def test_release_lists_fetch_images_in_one_query(self):
+        self.assertImagesFetchedInOneQuery('/my/')
+        self.assertImagesFetchedInOneQuery('/my/2014/1/')
+        self.assertImagesFetchedInOneQuery('/xkcd/2014/1/3/')
+
+    def test_feeds_fetch_images_in_one_query(self):
+        key = self.user.comics_profile.secret_key
+        self.assertImagesFetchedInOneQuery('/my/feed/?key=%s' % key)
+        self.assertImagesFetchedInOneQuery('/xkcd/feed/?key=%s' % key)
+
+    def test_prefetched_images_are_ordered_by_id(self):
+        release = Release.objects.with_ordered_images().get(
+            pk=self.releases[0].pk)
+
+        with self.assertNumQueries(0):
+            images = release.get_ordered_images()
+
+        self.assertEqual(['b', 'a'], [image.checksum for image in images])
@@ -27,6 +27,15 @@ urlpatterns = patterns(
     url(r'^my/page(?P<page>[0-9]+)/$',
         views.MyComicsLatestView.as_view(),
         name='mycomics_latest_page_n'),
+    url(r'^my/older/(?P<release_id>\d+)/$',
+        views.MyComicsLatestView.as_view(), {'direction': 'older'},
+        name='mycomics_latest_older'),
+    url(r'^my/newer/(?P<release_id>\d+)/$',
+        views.MyComicsLatestView.as_view(), {'direction': 'newer'},
+        name='mycomics_latest_newer'),
+    url(r'^my/oldest/$',
+        views.MyComicsLatestView.as_view(), {'direction': 'oldest'},
+        name='mycomics_latest_oldest'),
     url(r'^my/%s/$' % (YEAR,),
         views.MyComicsYearView.as_view(),
         name='mycomics_year'),
@@ -5,22 +5,27 @@ from django.conf import settings
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
 from django.core.urlresolvers import reverse
-from django.http import HttpResponse
+from django.db.models import Max, Min, Q
+from django.http import Http404, HttpResponse
 from django.shortcuts import get_object_or_404, render
 from django.utils import timezone
 from django.utils.decorators import method_decorator
 from django.views.generic import (
-    TemplateView, ListView, RedirectView,
+    View, TemplateView, ListView, RedirectView,
     DayArchiveView, TodayArchiveView, MonthArchiveView)
 
-from comics.core.models import Comic, Release
+from comics.accounts.subscriptions import (
+    get_subscribed_comic_ids, get_subscribed_comics)
+from comics.browser.aggregates import MaxBefore, MinFrom
+from comics.core.models import Release
+from comics.core.registry import comic_registry
 
 
 @login_required
 def comics_list(request):
     return render(request, 'browser/comics_list.html', {
         'active': {'comics_list': True},
-        'my_comics': request.user.comics_profile.comics.all(),
+        'my_comics': get_subscribed_comics(request.user),
     })
 
 
@@ -43,12 +48,16 @@ class ComicMixin(object):
     @property
     def comic(self):
         if not hasattr(self, '_comic'):
-            self._comic = get_object_or_404(
-                Comic, slug=self.kwargs['comic_slug'])
+            self._comic = comic_registry.get_by_slug(self.kwargs['comic_slug'])
+            if self._comic is None:
+                raise Http404
         return self._comic
 
     def get_my_comics(self):
-        return self.get_user().comics_profile.comics.all()
+        return get_subscribed_comics(self.get_user())
+
+    def get_my_comic_ids(self):
+        return get_subscribed_comic_ids(self.get_user())
 
 
 class ReleaseMixin(LoginRequiredMixin, ComicMixin):
@@ -92,6 +101,30 @@ class ReleaseMixin(LoginRequiredMixin, ComicMixin):
             'last_url': self.get_last_url(),
         }
 
+    def get_pub_date_bounds(self, start=None, end=None):
+        """The first and last publication dates, the closest dates before
+        ``start`` and from ``end``, and the first date from today, found with
+        a single query"""
+
+        if not hasattr(self, '_pub_date_bounds'):
+            self._pub_date_bounds = {}
+        if (start, end) not in self._pub_date_bounds:
+            aggregates = {
+                'first': Min('pub_date'),
+                'last': Max('pub_date'),
+                'today': MinFrom('pub_date', datetime.date.today()),
+            }
+            if start is not None:
+                aggregates['previous'] = MaxBefore('pub_date', start)
+            if end is not None:
+                aggregates['next'] = MinFrom('pub_date', end)
+            self._pub_date_bounds[(start, end)] = (
+                self.get_queryset().aggregate(**aggregates))
+        return self._pub_date_bounds[(start, end)]
+
+    def get_current_bounds(self):
+        return self.get_pub_date_bounds()
+
     def get_object_type(self):
         return None
 
@@ -152,7 +185,35 @@ class ReleaseDateMixin(ReleaseMixin):
     month_format = '%m'
 
 
-class ReleaseDayArchiveView(ReleaseDateMixin, DayArchiveView):
+class ReleaseDayMixin(object):
+    """Things common for all views of a single day"""
+
+    def _get_day_bounds(self, date):
+        return self.get_pub_date_bounds(
+            date, date + datetime.timedelta(days=1))
+
+    def get_current_bounds(self):
+        return self._get_day_bounds(self.context['day'])
+
+    def get_previous_day(self, date):
+        if self.get_allow_empty():
+            return super(ReleaseDayMixin, self).get_previous_day(date)
+        return self._get_day_bounds(date)['previous']
+
+    def get_next_day(self, date):
+        if self.get_allow_empty():
+            return super(ReleaseDayMixin, self).get_next_day(date)
+        return self._get_day_bounds(date)['next']
+
+    def get_previous_month(self, date):
+        # Day views don't link to other months, so don't look them up
+        return None
+
+    def get_next_month(self, date):
+        return None
+
+
+class ReleaseDayArchiveView(ReleaseDayMixin, ReleaseDateMixin, DayArchiveView):
     """Things common for all *day* views"""
 
     def get_view_type(self):
@@ -162,7 +223,8 @@ class ReleaseDayArchiveView(ReleaseDateMixin, DayArchiveView):
         return self.context['day'].strftime('%A %d %B %Y').replace(' 0', ' ')
 
 
-class ReleaseTodayArchiveView(ReleaseDateMixin, TodayArchiveView):
+class ReleaseTodayArchiveView(
+        ReleaseDayMixin, ReleaseDateMixin, TodayArchiveView):
     """Things common for all *today* views"""
 
     def get_view_type(self):
@@ -175,6 +237,23 @@ class ReleaseTodayArchiveView(ReleaseDateMixin, TodayArchiveView):
 class ReleaseMonthArchiveView(ReleaseDateMixin, MonthArchiveView):
     """Things common for all *month* views"""
 
+    def _get_month_bounds(self, date):
+        return self.get_pub_date_bounds(
+            self._get_current_month(date), self._get_next_month(date))
+
+    def get_current_bounds(self):
+        return self._get_month_bounds(self.context['month'])
+
+    def get_previous_month(self, date):
+        previous_date = self._get_month_bounds(date)['previous']
+        if previous_date is not None:
+            return self._get_current_month(previous_date)
+
+    def get_next_month(self, date):
+        next_date = self._get_month_bounds(date)['next']
+        if next_date is not None:
+            return self._get_current_month(next_date)
+
     def get_view_type(self):
         return 'month'
 
@@ -228,8 +307,8 @@ class MyComicsMixin(object):
     """Things common for all views of *my comics*"""
 
     def get_queryset(self):
-        return Release.objects.select_related().filter(
-            comic__in=self.get_my_comics()).order_by('pub_date')
+        return Release.objects.with_ordered_images().select_related().filter(
+            comic_id__in=self.get_my_comic_ids()).order_by('pub_date')
 
     def get_object_type(self):
         return 'mycomics'
@@ -243,32 +322,22 @@ class MyComicsMixin(object):
     def get_today_url(self):
         return reverse('mycomics_today')
 
-    def _get_last_pub_date(self):
-        if not hasattr(self, '_last_pub_date'):
-            self._last_pub_date = self.get_queryset().values_list(
-                'pub_date', flat=True).order_by('-pub_date')[0]
-        return self._last_pub_date
-
     def get_day_url(self):
-        try:
-            last_date = self._get_last_pub_date()
+        last_date = self.get_current_bounds()['last']
+        if last_date is not None:
             return reverse('mycomics_day', kwargs={
                 'year': last_date.year,
                 'month': last_date.month,
                 'day': last_date.day,
             })
-        except IndexError:
-            pass
 
     def get_month_url(self):
-        try:
-            last_month = self._get_last_pub_date()
+        last_month = self.get_current_bounds()['last']
+        if last_month is not None:
             return reverse('mycomics_month', kwargs={
                 'year': last_month.year,
                 'month': last_month.month,
             })
-        except IndexError:
-            pass
 
     def get_feed_url(self):
         return '%s?key=%s' % (
@@ -286,50 +355,119 @@ class MyComicsHome(LoginRequiredMixin, RedirectView):
         return reverse('mycomics_latest')
 
 
+class ReleasePage(object):
+    """A page of releases found by seeking from a release next to the page"""
+
+    def __init__(self, releases, has_older, has_newer, cursor=None):
+        self.object_list = releases
+        self.has_older = has_older
+        self.has_newer = has_newer
+        # The pages next to an empty page seek from the same release
+        if releases:
+            self.oldest_id = releases[-1].id
+            self.newest_id = releases[0].id
+        elif cursor is not None:
+            self.oldest_id = self.newest_id = cursor.id
+        else:
+            self.oldest_id = self.newest_id = None
+
+
 class MyComicsLatestView(MyComicsMixin, ReleaseLatestView):
-    """View of the latest releases from my comics"""
+    """View of the latest releases from my comics
+
+    Instead of counting and skipping releases, pages are found by seeking from
+    the release next to the page, ordered by ``(fetched, id)``, so that deep
+    pages are as fast as the first.
+    """
 
     paginate_by = settings.COMICS_MAX_RELEASES_PER_PAGE
 
     def get_queryset(self):
         releases = super(MyComicsLatestView, self).get_queryset()
-        return releases.order_by('-fetched')
+        return releases.order_by('-fetched', '-id')
+
+    def paginate_queryset(self, queryset, page_size):
+        direction = self.kwargs.get('direction')
+        if direction == 'older':
+            cursor = self._get_cursor()
+            releases, has_older = self._seek(
+                self._filter_older(queryset, cursor), page_size)
+            has_newer = self._filter_newer(queryset, cursor).exists()
+        elif direction == 'newer':
+            cursor = self._get_cursor()
+            releases, has_newer = self._seek(
+                self._filter_newer(queryset, cursor).reverse(), page_size)
+            releases.reverse()
+            has_older = self._filter_older(queryset, cursor).exists()
+        elif direction == 'oldest':
+            cursor = None
+            releases, has_newer = self._seek(queryset.reverse(), page_size)
+            releases.reverse()
+            has_older = False
+        elif 'page' in self.kwargs:
+            # Page numbers are kept for old links, without counting releases
+            cursor = None
+            offset = (max(int(self.kwargs['page']), 1) - 1) * page_size
+            releases, has_older = self._seek(queryset[offset:], page_size)
+            has_newer = offset > 0
+        else:
+            cursor = None
+            releases, has_older = self._seek(queryset, page_size)
+            has_newer = False
+        page = ReleasePage(releases, has_older, has_newer, cursor)
+        return (None, page, releases, has_older or has_newer)
+
+    def _get_cursor(self):
+        releases = Release.objects.only('id', 'fetched')
+        return get_object_or_404(releases, id=self.kwargs['release_id'])
+
+    def _seek(self, releases, page_size):
+        # Gets one release more than the page, to tell if there are more
+        releases = list(releases[:page_size + 1])
+        return releases[:page_size], len(releases) > page_size
+
+    def _filter_older(self, releases, cursor):
+        return releases.filter(
+            Q(fetched__lt=cursor.fetched) |
+            Q(fetched=cursor.fetched, id__lt=cursor.id))
+
+    def _filter_newer(self, releases, cursor):
+        return releases.filter(
+            Q(fetched__gt=cursor.fetched) |
+            Q(fetched=cursor.fetched, id__gt=cursor.id))
 
     def get_first_url(self):
-        page = self.context['page_obj']
-        if page.number != page.paginator.num_pages:
-            return reverse(
-                'mycomics_latest_page_n',
-                kwargs={'page': page.paginator.num_pages})
+        if self.context['page_obj'].has_older:
+            return reverse('mycomics_latest_oldest')
 
     def get_prev_url(self):
         page = self.context['page_obj']
-        if page.has_next():
+        if page.has_older:
             return reverse(
-                'mycomics_latest_page_n',
-                kwargs={'page': page.next_page_number()})
+                'mycomics_latest_older', kwargs={'release_id': page.oldest_id})
 
     def get_next_url(self):
         page = self.context['page_obj']
-        if page.has_previous():
+        if page.has_newer:
             return reverse(
-                'mycomics_latest_page_n',
-                kwargs={'page': page.previous_page_number()})
+                'mycomics_latest_newer', kwargs={'release_id': page.newest_id})
 
     def get_last_url(self):
-        page = self.context['page_obj']
-        if page.number != 1:
-            return reverse('mycomics_latest_page_n', kwargs={'page': 1})
+        if self.context['page_obj'].has_newer:
+            return reverse('mycomics_latest')
+
 
+class MyComicsNumReleasesSinceView(LoginRequiredMixin, ComicMixin, View):
+    """Number of releases from my comics since a given release, as JSON"""
 
-class MyComicsNumReleasesSinceView(MyComicsLatestView):
     def get_num_releases_since(self):
         last_release_seen = get_object_or_404(
             Release, id=self.kwargs['release_id'])
-        releases = super(MyComicsNumReleasesSinceView, self).get_queryset()
-        return releases.filter(fetched__gt=last_release_seen.fetched).count()
+        return Release.objects.filter(
+            comic_id__in=self.get_my_comic_ids(),
+            fetched__gt=last_release_seen.fetched).count()
 
-    def render_to_response(self, context, **kwargs):
+    def get(self, request, *args, **kwargs):
         data = json.dumps({
             'since_release_id': int(self.kwargs['release_id']),
             'num_releases': self.get_num_releases_since(),
@@ -342,17 +480,13 @@ class MyComicsDayView(MyComicsMixin, ReleaseDayArchiveView):
     """View of releases from my comics for a given day"""
 
     def get_first_url(self):
-        try:
-            first_date = self.get_queryset().values_list(
-                'pub_date', flat=True).order_by('pub_date')[0]
-            if first_date < self.context['day']:
-                return reverse('mycomics_day', kwargs={
-                    'year': first_date.year,
-                    'month': first_date.month,
-                    'day': first_date.day,
-                })
-        except IndexError:
-            pass
+        first_date = self.get_current_bounds()['first']
+        if first_date is not None and first_date < self.context['day']:
+            return reverse('mycomics_day', kwargs={
+                'year': first_date.year,
+                'month': first_date.month,
+                'day': first_date.day,
+            })
 
     def get_prev_url(self):
         prev_date = self.get_previous_day(self.context['day'])
@@ -373,17 +507,13 @@ class MyComicsDayView(MyComicsMixin, ReleaseDayArchiveView):
             })
 
     def get_last_url(self):
-        try:
-            last_date = self.get_queryset().values_list(
-                'pub_date', flat=True).order_by('-pub_date')[0]
-            if last_date > self.context['day']:
-                return reverse('mycomics_day', kwargs={
-                    'year': last_date.year,
-                    'month': last_date.month,
-                    'day': last_date.day,
-                })
-        except IndexError:
-            pass
+        last_date = self.get_current_bounds()['last']
+        if last_date is not None and last_date > self.context['day']:
+            return reverse('mycomics_day', kwargs={
+                'year': last_date.year,
+                'month': last_date.month,
+                'day': last_date.day,
+            })
 
 
 class MyComicsTodayView(MyComicsMixin, ReleaseTodayArchiveView):
@@ -405,16 +535,12 @@ class MyComicsMonthView(MyComicsMixin, ReleaseMonthArchiveView):
     """View of releases from my comics for a given month"""
 
     def get_first_url(self):
-        try:
-            first_month = self.get_queryset().values_list(
-                'pub_date', flat=True).order_by('pub_date')[0]
-            if first_month < self.context['month']:
-                return reverse('mycomics_month', kwargs={
-                    'year': first_month.year,
-                    'month': first_month.month,
-                })
-        except IndexError:
-            pass
+        first_month = self.get_current_bounds()['first']
+        if first_month is not None and first_month < self.context['month']:
+            return reverse('mycomics_month', kwargs={
+                'year': first_month.year,
+                'month': first_month.month,
+            })
 
     def get_prev_url(self):
         prev_month = self.context['previous_month']
@@ -433,16 +559,12 @@ class MyComicsMonthView(MyComicsMixin, ReleaseMonthArchiveView):
             })
 
     def get_last_url(self):
-        try:
-            last_month = self.get_queryset().values_list(
-                'pub_date', flat=True).order_by('-pub_date')[0]
-            if last_month > self.context['month']:
-                return reverse('mycomics_month', kwargs={
-                    'year': last_month.year,
-                    'month': last_month.month,
-                })
-        except IndexError:
-            pass
+        last_month = self.get_current_bounds()['last']
+        if last_month is not None and last_month > self.context['month']:
+            return reverse('mycomics_month', kwargs={
+                'year': last_month.year,
+                'month': last_month.month,
+            })
 
 
 class MyComicsYearView(LoginRequiredMixin, RedirectView):
@@ -470,7 +592,7 @@ class OneComicMixin(object):
 
     def get_queryset(self):
         return (
-            Release.objects.select_related()
+            Release.objects.with_ordered_images().select_related()
             .filter(comic=self.comic)
             .order_by('pub_date'))
 
@@ -483,40 +605,30 @@ class OneComicMixin(object):
     def get_latest_url(self):
         return reverse('comic_latest', kwargs={'comic_slug': self.comic.slug})
 
-    def _get_recent_pub_dates(self):
-        if not hasattr(self, '_recent_pub_dates'):
-            self._recent_pub_dates = self.get_queryset().values_list(
-                'pub_date', flat=True).order_by('-pub_date')[:2]
-        return self._recent_pub_dates
-
     def get_today_url(self):
-        if datetime.date.today() in self._get_recent_pub_dates():
+        if self.get_current_bounds()['today'] == datetime.date.today():
             return reverse(
                 'comic_today',
                 kwargs={'comic_slug': self.comic.slug})
 
     def get_day_url(self):
-        try:
-            last_pub_date = self._get_recent_pub_dates()[0]
+        last_pub_date = self.get_current_bounds()['last']
+        if last_pub_date is not None:
             return reverse('comic_day', kwargs={
                 'comic_slug': self.comic.slug,
                 'year': last_pub_date.year,
                 'month': last_pub_date.month,
                 'day': last_pub_date.day,
             })
-        except IndexError:
-            pass
 
     def get_month_url(self):
-        try:
-            last_pub_date = self._get_recent_pub_dates()[0]
+        last_pub_date = self.get_current_bounds()['last']
+        if last_pub_date is not None:
             return reverse('comic_month', kwargs={
                 'comic_slug': self.comic.slug,
                 'year': last_pub_date.year,
                 'month': last_pub_date.month,
             })
-        except IndexError:
-            pass
 
     def get_feed_url(self):
         return '%s?key=%s' % (
@@ -527,18 +639,14 @@ class OneComicMixin(object):
         return 'Comics from %s' % self.comic.name
 
     def get_first_url(self):
-        try:
-            first_date = self.get_queryset().values_list(
-                'pub_date', flat=True).order_by('pub_date')[0]
-            if first_date < self.get_current_day():
-                return reverse('comic_day', kwargs={
-                    'comic_slug': self.comic.slug,
-                    'year': first_date.year,
-                    'month': first_date.month,
-                    'day': first_date.day,
-                })
-        except IndexError:
-            pass
+        first_date = self.get_current_bounds()['first']
+        if first_date is not None and first_date < self.get_current_day():
+            return reverse('comic_day', kwargs={
+                'comic_slug': self.comic.slug,
+                'year': first_date.year,
+                'month': first_date.month,
+                'day': first_date.day,
+            })
 
     def get_prev_url(self):
         prev_date = self.get_previous_day(self.get_current_day())
@@ -561,17 +669,15 @@ class OneComicMixin(object):
             })
 
     def get_last_url(self):
-        try:
-            last_pub_date = self._get_recent_pub_dates()[0]
-            if last_pub_date > self.get_current_day():
-                return reverse('comic_day', kwargs={
-                    'comic_slug': self.comic.slug,
-                    'year': last_pub_date.year,
-                    'month': last_pub_date.month,
-                    'day': last_pub_date.day,
-                })
-        except IndexError:
-            pass
+        last_pub_date = self.get_current_bounds()['last']
+        if (last_pub_date is not None and
+                last_pub_date > self.get_current_day()):
+            return reverse('comic_day', kwargs={
+                'comic_slug': self.comic.slug,
+                'year': last_pub_date.year,
+                'month': last_pub_date.month,
+                'day': last_pub_date.day,
+            })
 
 
 class OneComicLatestView(OneComicMixin, ReleaseLatestView):
@@ -583,6 +689,12 @@ class OneComicLatestView(OneComicMixin, ReleaseLatestView):
         releases = super(OneComicLatestView, self).get_queryset()
         return releases.order_by('-fetched')
 
+    def _get_recent_pub_dates(self):
+        if not hasattr(self, '_recent_pub_dates'):
+            self._recent_pub_dates = list(self.get_queryset().values_list(
+                'pub_date', flat=True).order_by('-pub_date')[:2])
+        return self._recent_pub_dates
+
     def get_current_day(self):
         try:
             return self._get_recent_pub_dates()[0]
@@ -617,17 +729,13 @@ class OneComicMonthView(OneComicMixin, ReleaseMonthArchiveView):
     """View of the releases from a single comic for a given month"""
 
     def get_first_url(self):
-        try:
-            first_month = self.get_queryset().values_list(
-                'pub_date', flat=True).order_by('pub_date')[0]
-            if first_month < self.context['month']:
-                return reverse('comic_month', kwargs={
-                    'comic_slug': self.comic.slug,
-                    'year': first_month.year,
-                    'month': first_month.month,
-                })
-        except IndexError:
-            pass
+        first_month = self.get_current_bounds()['first']
+        if first_month is not None and first_month < self.context['month']:
+            return reverse('comic_month', kwargs={
+                'comic_slug': self.comic.slug,
+                'year': first_month.year,
+                'month': first_month.month,
+            })
 
     def get_prev_url(self):
         prev_month = self.context['previous_month']
@@ -648,16 +756,14 @@ class OneComicMonthView(OneComicMixin, ReleaseMonthArchiveView):
             })
 
     def get_last_url(self):
-        try:
-            last_pub_date = self._get_recent_pub_dates()[0]
-            if last_pub_date > self.context['month']:
-                return reverse('comic_month', kwargs={
-                    'comic_slug': self.comic.slug,
-                    'year': last_pub_date.year,
-                    'month': last_pub_date.month,
-                })
-        except IndexError:
-            pass
+        last_pub_date = self.get_current_bounds()['last']
+        if (last_pub_date is not None and
+                last_pub_date > self.context['month']):
+            return reverse('comic_month', kwargs={
+                'comic_slug': self.comic.slug,
+                'year': last_pub_date.year,
+                'month': last_pub_date.month,
+            })
 
 
 class OneComicYearView(LoginRequiredMixin, RedirectView):
@@ -1,4 +1,4 @@
-from comics.aggregator.crawler import CrawlerBase, CrawlerImage
+from comics.aggregator.crawler import TemplateCrawlerBase
 from comics.core.comic_data import ComicDataBase
 
 
@@ -10,13 +10,9 @@ class ComicData(ComicDataBase):
     rights = 'Scott Adams'
 
 
-class Crawler(CrawlerBase):
+class Crawler(TemplateCrawlerBase):
     history_capable_date = '1989-04-16'
     schedule = 'Mo,Tu,We,Th,Fr,Sa,Su'
     time_zone = 'US/Mountain'
-
-    def crawl(self, pub_date):
-        page = self.parse_page(
-            pub_date.strftime('http://dilbert.com/strips/comic/%Y-%m-%d/'))
-        url = page.src('img[src$=".strip.zoom.gif"]')
-        return CrawlerImage(url)
+    page_url = 'http://dilbert.com/strips/comic/%Y-%m-%d/'
+    image_selector = 'img[src$=".strip.zoom.gif"]'
@@ -1,4 +1,4 @@
-from comics.aggregator.crawler import CrawlerBase, CrawlerImage
+from comics.aggregator.crawler import TemplateCrawlerBase
 from comics.core.comic_data import ComicDataBase
 
 
@@ -9,12 +9,8 @@ class ComicData(ComicDataBase):
     rights = 'Nils Axle Kanten'
 
 
-class Crawler(CrawlerBase):
+class Crawler(TemplateCrawlerBase):
     history_capable_date = '2013-01-15'
     schedule = 'Mo,Tu,We,Th,Fr,Sa,Su'
     time_zone = 'Europe/Oslo'
-
-    def crawl(self, pub_date):
-        url = 'http://heltnormalt.no/img/hjalmar/%s.jpg' % (
-            pub_date.strftime('%Y/%m/%d'))
-        return CrawlerImage(url)
+    image_url = 'http://heltnormalt.no/img/hjalmar/%Y/%m/%d.jpg'
@@ -18,35 +18,7 @@ class Crawler(CrawlerBase):
     # ID with only a loose date-mapping and re-using names (which you're not
     # allowed to do in HTML, but he's an ass like that)
     def crawl(self, pub_date):
-        date_to_index_page = self.parse_page(
-            'http://www.digitalpimponline.com/strips.php?title=movie')
-
-        # Go through all IDs in the document, checking to see if the date is
-        # the date we want in the option drop-down
-        possible_ids = date_to_index_page.value(
-            'select[name="id"] option', allow_multiple=True)
-        the_id = None
-
-        if possible_ids is None:
-            return
-
-        # (cheap conversion to a set to eliminate the duplicate IDs from
-        # different parts of the HTML to save time...)
-        for possible_id in set(possible_ids):
-            # We're going to get two results back.  One is the potential date,
-            # the other is the title.  I can't think of a good way to enforce
-            # that we get the real value first, then the title, so we're just
-            # going to parse it again later.
-            possible_date_and_title = date_to_index_page.text(
-                'option[value="%s"]' % possible_id, allow_multiple=True)
-            for the_date in possible_date_and_title:
-                # Make sure we strip off the leading '0' on %d: Joe doesn't
-                # include them.  We can't use a regex due to the speed
-                # penalty of ~500+ regex comparisons
-                if the_date == pub_date.strftime('%B %d, %Y').replace(
-                        ' 0', ' ', 1):
-                    the_id = possible_id
-                    break
+        the_id = self.get_ids_by_date().get(pub_date)
 
         # Make sure we got an ID...
         if the_id is None:
@@ -78,3 +50,23 @@ class Crawler(CrawlerBase):
                 title = possible_title
 
         return CrawlerImage(url, title)
+
+    def get_ids_by_date(self):
+        # The index page has a drop-down with the date of every ID, and one
+        # with the title of every ID. Map the dates to IDs in one pass over
+        # the options, and keep the map while crawling the following dates.
+        if getattr(self, '_ids_by_date', None) is None:
+            date_to_index_page = self.parse_page(
+                'http://www.digitalpimponline.com/strips.php?title=movie')
+            self._ids_by_date = {}
+            for option in date_to_index_page.extract(
+                    'select[name="id"] option', ['value', 'text'],
+                    allow_multiple=True):
+                try:
+                    the_date = self.string_to_date(
+                        option['text'].strip(), '%B %d, %Y')
+                except (AttributeError, ValueError):
+                    # It's a title
+                    continue
+                self._ids_by_date.setdefault(the_date, option['value'])
+        return self._ids_by_date
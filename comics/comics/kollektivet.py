@@ -1,6 +1,6 @@
 # encoding: utf-8
 
-from comics.aggregator.crawler import CrawlerBase, CrawlerImage
+from comics.aggregator.crawler import TemplateCrawlerBase
 from comics.core.comic_data import ComicDataBase
 
 
@@ -11,12 +11,8 @@ class ComicData(ComicDataBase):
     rights = 'Torbjørn Lien'
 
 
-class Crawler(CrawlerBase):
+class Crawler(TemplateCrawlerBase):
     history_capable_date = '2013-05-01'
     schedule = 'Mo,Tu,We,Th,Fr,Sa'
     time_zone = 'Europe/Oslo'
-
-    def crawl(self, pub_date):
-        url = 'http://heltnormalt.no/img/kollektivet/%s.jpg' % (
-            pub_date.strftime('%Y/%m/%d'))
-        return CrawlerImage(url)
+    image_url = 'http://heltnormalt.no/img/kollektivet/%Y/%m/%d.jpg'
@@ -18,7 +18,15 @@ class Crawler(CrawlerBase):
     def crawl(self, pub_date):
         feed = self.parse_feed('http://www.xkcd.com/rss.xml')
         for entry in feed.for_date(pub_date):
-            url = entry.summary.src('img[src*="/comics/"]')
-            title = entry.title
-            text = entry.summary.alt('img[src*="/comics/"]')
-            return CrawlerImage(url, title, text)
+            return self.crawl_entry(entry)
+
+    def crawl_range(self, from_date, to_date):
+        feed = self.parse_feed('http://www.xkcd.com/rss.xml')
+        for pub_date, entries in feed.for_date_range(from_date, to_date):
+            yield pub_date, self.crawl_entry(entries[0])
+
+    def crawl_entry(self, entry):
+        url = entry.summary.src('img[src*="/comics/"]')
+        title = entry.title
+        text = entry.summary.alt('img[src*="/comics/"]')
+        return CrawlerImage(url, title, text)
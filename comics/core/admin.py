@@ -56,7 +56,7 @@ class ImageAdmin(admin.ModelAdmin):
     list_filter = ['fetched', 'comic']
     date_hierarchy = 'fetched'
     readonly_fields = (
-        'comic', 'file', 'checksum', 'height', 'width', 'fetched')
+        'comic', 'file', 'checksum', 'dhash', 'height', 'width', 'fetched')
     inlines = (ReleaseImageInline,)
 
     def has_add_permission(self, request):
@@ -1,6 +1,6 @@
 from django.conf import settings
 
-from comics.core.models import Comic
+from comics.core.registry import comic_registry
 
 
 def site_settings(request):
@@ -12,5 +12,5 @@ def site_settings(request):
 
 def all_comics(request):
     return {
-        'all_comics': Comic.objects.sort_by_name(),
+        'all_comics': comic_registry.all(),
     }
@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models import Prefetch
 
 
 class ComicManager(models.Manager):
@@ -7,3 +8,12 @@ class ComicManager(models.Manager):
         qs = qs.extra(select={'lower_name': 'LOWER(name)'})
         qs = qs.extra(order_by=['lower_name'])
         return qs
+
+
+class ReleaseManager(models.Manager):
+    def with_ordered_images(self):
+        """Releases with their images fetched in one query for all of them"""
+
+        from comics.core.models import Image
+        return self.get_queryset().prefetch_related(
+            Prefetch('images', queryset=Image.objects.order_by('id')))
@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='image',
+            name='dhash',
+            field=models.CharField(
+                help_text=b'Perceptual hash for finding images which look '
+                b'the same', max_length=16, verbose_name=b'difference hash',
+                default='', blank=True),
+            preserve_default=False,
+        ),
+    ]
@@ -5,9 +5,11 @@ from django.conf import settings
 from django.core.files.storage import FileSystemStorage
 from django.core.urlresolvers import reverse
 from django.db import models
+from django.dispatch import receiver
 from django.utils import timezone
 
-from comics.core.managers import ComicManager
+from comics.core.managers import ComicManager, ReleaseManager
+from comics.core.registry import comic_registry
 
 
 class Comic(models.Model):
@@ -71,6 +73,12 @@ class Comic(models.Model):
         return self.added > some_time_ago
 
 
+@receiver(models.signals.post_save, sender=Comic)
+@receiver(models.signals.post_delete, sender=Comic)
+def invalidate_comic_registry(sender, **kwargs):
+    comic_registry.invalidate()
+
+
 class Release(models.Model):
     # Required fields
     comic = models.ForeignKey(Comic)
@@ -80,6 +88,8 @@ class Release(models.Model):
     # Automatically populated fields
     fetched = models.DateTimeField(auto_now_add=True, db_index=True)
 
+    objects = ReleaseManager()
+
     class Meta:
         db_table = 'comics_release'
         get_latest_by = 'pub_date'
@@ -97,7 +107,11 @@ class Release(models.Model):
 
     def get_ordered_images(self):
         if not getattr(self, '_ordered_images', []):
-            self._ordered_images = list(self.images.order_by('id'))
+            if 'images' in getattr(self, '_prefetched_objects_cache', {}):
+                self._ordered_images = sorted(
+                    self.images.all(), key=lambda image: image.id)
+            else:
+                self._ordered_images = list(self.images.order_by('id'))
         return self._ordered_images
 
 
@@ -123,6 +137,9 @@ class Image(models.Model):
     # Optional fields
     title = models.CharField(max_length=255, blank=True)
     text = models.TextField(blank=True)
+    dhash = models.CharField(
+        max_length=16, blank=True, verbose_name='difference hash',
+        help_text='Perceptual hash for finding images which look the same')
 
     # Automatically populated fields
     fetched = models.DateTimeField(auto_now_add=True)
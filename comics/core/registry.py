@@ -0,0 +1,77 @@
+"""Registry of all comics, loaded once per process
+
+The comics only change when ``comics_addcomics`` runs, or when they are edited
+in the admin, so the views and context processors read them from here instead
+of querying for them on every request. Saving or deleting a comic stores a new
+version in the cache, which makes every process sharing that cache reload the
+comics the next time they are used. With a per-process cache, like the default
+local memory cache, only the current process notices, and the others must be
+restarted.
+"""
+
+import threading
+import uuid
+
+from django.core.cache import cache
+
+VERSION_KEY = 'comics.core.registry.version'
+
+
+class ComicRegistry(object):
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Forget the loaded comics, without telling other processes"""
+
+        self._version = None
+        self._comics = []
+        self._by_id = {}
+        self._by_slug = {}
+
+    def invalidate(self):
+        """Make every process sharing the cache reload the comics"""
+
+        cache.set(VERSION_KEY, uuid.uuid4().hex, None)
+        self.reset()
+
+    def all(self):
+        """All comics, sorted by name"""
+
+        self._load()
+        return self._comics
+
+    def get_by_id(self, comic_id):
+        self._load()
+        return self._by_id.get(int(comic_id))
+
+    def get_by_slug(self, slug):
+        self._load()
+        return self._by_slug.get(slug)
+
+    def _get_version(self):
+        version = cache.get(VERSION_KEY)
+        if version is None:
+            # The cache was cleared, so the comics may have changed
+            version = uuid.uuid4().hex
+            if not cache.add(VERSION_KEY, version, None):
+                version = cache.get(VERSION_KEY) or version
+        return version
+
+    def _load(self):
+        from comics.core.models import Comic
+        version = self._get_version()
+        if version == self._version:
+            return
+        with self._lock:
+            if version == self._version:
+                return
+            comics = list(Comic.objects.sort_by_name())
+            self._by_id = dict((comic.id, comic) for comic in comics)
+            self._by_slug = dict((comic.slug, comic) for comic in comics)
+            self._comics = comics
+            self._version = version
+
+
+comic_registry = ComicRegistry()
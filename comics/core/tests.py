@@ -0,0 +1,37 @@
+from django.test import TestCase
+
+from comics.core.models import Comic
+from comics.core.registry import ComicRegistry
+
+
+class ComicRegistryTestCase(TestCase):
+    def setUp(self):
+        Comic.objects.create(slug='xkcd', name='xkcd')
+        Comic.objects.create(slug='abstrusegoose', name='Abstruse Goose')
+        self.registry = ComicRegistry()
+
+    def test_comics_are_sorted_by_name(self):
+        self.assertEqual(
+            ['abstrusegoose', 'xkcd'],
+            [comic.slug for comic in self.registry.all()])
+
+    def test_comics_are_only_loaded_once(self):
+        self.registry.all()
+
+        with self.assertNumQueries(0):
+            comic = self.registry.get_by_slug('xkcd')
+            self.assertEqual(comic, self.registry.get_by_id(comic.id))
+            self.assertIsNone(self.registry.get_by_slug('unknown'))
+
+    def test_saved_and_deleted_comics_are_seen_by_all_registries(self):
+        other_registry = ComicRegistry()
+        self.registry.all()
+        other_registry.all()
+
+        Comic.objects.create(slug='geekandpoke', name='Geek and Poke')
+        Comic.objects.get(slug='xkcd').delete()
+
+        for registry in (self.registry, other_registry):
+            self.assertEqual(
+                ['abstrusegoose', 'geekandpoke'],
+                [comic.slug for comic in registry.all()])
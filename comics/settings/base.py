@@ -237,6 +237,23 @@ COMICS_IMAGE_BLACKLIST = (
     'e90e3718487c99190426b3b38639670d4a3ee39c1e7319b9b781740b0c7a53bf',
 )
 
+#: Maximum size in bytes of images the aggregator downloads
+COMICS_MAX_IMAGE_SIZE = 20 * 1024 * 1024
+
+#: Maximum number of pixels in images the aggregator accepts, to protect
+#: against decompression bombs
+COMICS_MAX_IMAGE_PIXELS = 50 * 1000 * 1000
+
+#: Maximum number of bits the perceptual hashes of two images may differ by
+#: for the images to be considered the same. Used for reusing the earlier
+#: image of reruns which have been re-encoded or resized, and for rejecting
+#: images which look like those in ``COMICS_IMAGE_HASH_BLACKLIST``.
+COMICS_IMAGE_HASH_MAX_DISTANCE = 4
+
+#: Perceptual hashes of blacklisted images, e.g. placeholders which are
+#: published in many sizes. The hash of a saved image is shown in the admin.
+COMICS_IMAGE_HASH_BLACKLIST = ()
+
 #: Comics log file path on disk
 COMICS_LOG_FILENAME = os.path.join(BASE_PATH, 'comics.log')
 
@@ -250,3 +267,86 @@ COMICS_BROWSER_REFRESH_INTERVAL = 60
 
 #: Number of days a new comic on the site is labeled as new
 COMICS_NUM_DAYS_COMIC_IS_NEW = 7
+
+#: Maximum number of simultaneous requests the aggregator sends to a single
+#: host when crawling with multiple workers
+COMICS_MAX_REQUESTS_PER_HOST = 2
+
+#: Number of times the aggregator retries requests which failed with network
+#: errors or server errors which may be temporary
+COMICS_HTTP_MAX_RETRIES = 2
+
+#: Number of seconds to wait before the first retry of a failed request. The
+#: wait is doubled for each following retry.
+COMICS_HTTP_RETRY_BACKOFF = 1
+
+#: Number of requests in a row to a host which may fail before the aggregator
+#: skips the host for the rest of the crawl
+COMICS_HOST_MAX_FAILURES = 3
+
+#: Maximum number of seconds the aggregator spends crawling a single comic in
+#: one run, unless the crawler sets its own ``time_budget``, e.g. ``10 * 60``.
+#: If :class:`None`, comics are crawled without a time limit.
+COMICS_CRAWLER_TIME_BUDGET = None
+
+#: Maximum number of parsed pages each crawler keeps cached while crawling
+#: multiple dates
+COMICS_PAGE_CACHE_MAX_ENTRIES = 50
+
+#: Approximate maximum number of bytes of parsed pages each crawler keeps
+#: cached while crawling multiple dates
+COMICS_PAGE_CACHE_MAX_BYTES = 16 * 1024 * 1024
+
+#: Number of threads the aggregator downloads images in while it crawls the
+#: following dates. Set to 0 to download each release before crawling the next.
+COMICS_IMAGE_PREFETCH_THREADS = 4
+
+#: Number of dates ahead of the date being crawled that the aggregator lets
+#: crawlers fetch pages for in background threads, for crawlers which support
+#: it. Set to 0 to fetch the pages of each date when it is crawled.
+COMICS_CRAWLER_PREFETCH_DATES = 4
+
+#: Number of seconds between each time the aggregator saves how far it has
+#: crawled a date range, and logs the progress, so that ``comics_getreleases
+#: --resume`` can continue an interrupted crawl close to where it stopped.
+COMICS_CRAWL_PROGRESS_INTERVAL = 60
+
+#: Path on disk to where the aggregator caches fetched pages and feeds, so
+#: that it can make conditional requests and skip parsing unchanged feeds. Set
+#: to :class:`None` to disable the cache.
+COMICS_HTTP_CACHE_DIR = os.path.join(BASE_PATH, 'cache', 'http')
+
+#: Number of days an entry is kept in the HTTP cache after it was last used
+COMICS_HTTP_CACHE_MAX_AGE = 14
+
+#: Path on disk to where the aggregator downloads images before they are
+#: validated. It should be on the same filesystem as ``MEDIA_ROOT``, so that
+#: saved images can be linked into place instead of copied, but not below it,
+#: where it would be served by the web server. Set to :class:`None` to use the
+#: system's temporary directory.
+COMICS_INCOMING_DIR = os.path.join(BASE_PATH, 'incoming')
+
+#: Number of seconds between each poll of a comic when running the aggregator
+#: as a daemon and the comic is within its usual release window
+COMICS_DAEMON_ACTIVE_INTERVAL = 10 * 60
+
+#: Maximum number of seconds between each poll of a comic when running the
+#: aggregator as a daemon and the comic is outside its usual release window
+COMICS_DAEMON_IDLE_INTERVAL = 6 * 60 * 60
+
+#: Number of seconds between each poll of a comic when running the aggregator
+#: as a daemon and the comic has too few releases to learn its release window
+COMICS_DAEMON_DEFAULT_INTERVAL = 60 * 60
+
+#: Number of seconds a worker may spend on a queued crawl job before other
+#: workers may claim it
+COMICS_CRAWL_JOB_LEASE_TIME = 10 * 60
+
+#: Number of times a queued crawl job is attempted before it is marked as
+#: failed
+COMICS_CRAWL_JOB_MAX_ATTEMPTS = 3
+
+#: Number of seconds to wait before a queued crawl job which failed with a
+#: transient error may be attempted again. The wait is doubled for each
+#: following retry.
+COMICS_CRAWL_JOB_RETRY_BACKOFF = 60